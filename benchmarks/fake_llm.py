@@ -0,0 +1,157 @@
+import json
+import time
+import zlib
+import asyncio
+from typing import Any, Dict, Iterator, AsyncIterator, List, Optional, Sequence
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+
+"""
+FAKE CHAT MODEL
+
+Deterministic stand-in for the agent and tooling LLMs. Behavior depends on whether tools were bound:
+
+- without tools (the query writer inside `simple_datasource_qa`) it returns a VDS JSON payload
+- with tools (the agent) it calls the first tool with the latest user message, then answers once a tool result
+  is available
+
+Latency is modelled as time to first token plus a fixed rate of tokens per second, so streaming benchmarks
+see realistic token arrival.
+"""
+
+DEFAULT_VDS_PAYLOAD = {
+    "fields": [
+        {"fieldCaption": "Region", "sortDirection": "DESC", "sortPriority": 1},
+        {"fieldCaption": "Sales", "function": "SUM"},
+        {"fieldCaption": "Profit", "function": "SUM"},
+        {"fieldCaption": "Discount", "function": "AVG"}
+    ]
+}
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Args:
+        first_token_ms (float): latency before the first token.
+        tokens_per_second (float): generation speed after the first token, 0 returns all tokens at once.
+        answer_tokens (int): number of tokens in final agent answers.
+        vds_payload (Any): query, or list of queries in planner mode, returned when acting as the query writer.
+    """
+
+    first_token_ms: float = 300
+    tokens_per_second: float = 0
+    answer_tokens: int = 60
+    vds_payload: Any = DEFAULT_VDS_PAYLOAD
+    bound_tools: List[Dict[str, Any]] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "FakeChatModel":
+        return self.model_copy(update={"bound_tools": [convert_to_openai_tool(tool) for tool in tools]})
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        if not self.bound_tools:
+            return AIMessage(content=json.dumps(self.vds_payload))
+
+        last = messages[-1]
+        if isinstance(last, ToolMessage):
+            words = ["Results"] + [f"token{i}" for i in range(self.answer_tokens - 1)]
+            return AIMessage(content=" ".join(words))
+
+        user_message = next(
+            (message.content for message in reversed(messages) if isinstance(message, HumanMessage)),
+            ""
+        )
+        tool_name = self.bound_tools[0]["function"]["name"]
+        return AIMessage(
+            content="",
+            tool_calls=[{
+                "name": tool_name,
+                "args": {"user_input": user_message},
+                "id": f"call_{zlib.crc32(f'{tool_name}:{user_message}:{len(messages)}'.encode())}",
+                "type": "tool_call"
+            }]
+        )
+
+    def _token_delays(self, message: AIMessage):
+        tokens = message.content.split(" ") if message.content else [""]
+        delay = 1 / self.tokens_per_second if self.tokens_per_second else 0
+        for index, token in enumerate(tokens):
+            yield (self.first_token_ms / 1000 if index == 0 else delay), (token if index == 0 else " " + token)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        message = self._respond(messages)
+        time.sleep(sum(delay for delay, _ in self._token_delays(message)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        message = self._respond(messages)
+        await asyncio.sleep(sum(delay for delay, _ in self._token_delays(message)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, message: AIMessage):
+        for index, (delay, token) in enumerate(self._token_delays(message)):
+            chunk = AIMessageChunk(content=token)
+            if index == 0 and message.tool_calls:
+                chunk = AIMessageChunk(content="", tool_call_chunks=[{
+                    "name": call["name"],
+                    "args": json.dumps(call["args"]),
+                    "id": call["id"],
+                    "index": position
+                } for position, call in enumerate(message.tool_calls)])
+            yield delay, ChatGenerationChunk(message=chunk)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        for delay, chunk in self._chunks(self._respond(messages)):
+            time.sleep(delay)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        for delay, chunk in self._chunks(self._respond(messages)):
+            await asyncio.sleep(delay)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def fake_select_model(**model_settings: Any):
+    """
+    Returns a replacement for `select_model` that ignores provider settings and builds `FakeChatModel`s, patch
+    it over `experimental.utilities.models.select_model` before importing tools or agents
+    """
+    def select_model(provider: str = "openai", model_name: str = "gpt-4o-mini", temperature: float = 0.2):
+        return FakeChatModel(**model_settings)
+    return select_model
@@ -0,0 +1,242 @@
+import json
+import random
+import asyncio
+import threading
+from typing import Dict, Optional
+
+from aiohttp import web
+
+
+"""
+FAKE TABLEAU SERVER
+
+Local stand-in for the Tableau endpoints used by the tools in this project so that benchmarks run without network
+access or credentials:
+
+    POST /api/{version}/auth/signin                       REST API sign in (Connected App JWT)
+    POST /api/metadata/graphql                            Metadata API (publishedDatasources)
+    POST /api/v1/vizql-data-service/read-metadata         VDS field metadata
+    POST /api/v1/vizql-data-service/query-datasource      VDS queries
+
+Latency is configurable per endpoint and payload sizes are controlled by the number of fields in the data source
+and the number of rows returned per query. Responses are deterministic for a given seed.
+"""
+
+ENDPOINTS = ("signin", "graphql", "read_metadata", "query")
+
+DEFAULT_LATENCY_MS = {
+    "signin": 150,
+    "graphql": 250,
+    "read_metadata": 200,
+    "query": 400,
+}
+
+DIMENSIONS = ["Region", "State", "City", "Category", "Sub-Category", "Segment", "Ship Mode", "Customer Name"]
+MEASURES = ["Sales", "Profit", "Discount", "Quantity"]
+DIMENSION_MEMBERS = {
+    "Region": ["Central", "East", "South", "West"],
+    "Category": ["Furniture", "Office Supplies", "Technology"],
+    "Segment": ["Consumer", "Corporate", "Home Office"],
+    "Ship Mode": ["First Class", "Same Day", "Second Class", "Standard Class"],
+}
+
+
+def _field_names(field_count: int):
+    names = ["Order Date"] + DIMENSIONS + MEASURES
+    extra = max(0, field_count - len(names))
+    return names[:field_count] + [f"Measure {i}" for i in range(extra)]
+
+
+def _data_type(name: str) -> str:
+    if name == "Order Date":
+        return "DATE"
+    if name in MEASURES or name.startswith("Measure"):
+        return "REAL"
+    return "STRING"
+
+
+class FakeTableauServer:
+    """
+    Runs the fake Tableau endpoints on a background thread with its own event loop, the tools in this project use
+    blocking `requests` calls so the server must not share their thread.
+
+        with FakeTableauServer(latency_ms={"query": 50}, rows=200) as server:
+            os.environ["TABLEAU_DOMAIN"] = server.url
+
+    Args:
+        latency_ms (Dict[str, float]): latency per endpoint, keys are `signin`, `graphql`, `read_metadata` and `query`.
+        jitter (float): random variation applied to latencies as a fraction, 0.1 means +/- 10%.
+        fields (int): number of fields in the published data source.
+        rows (int): number of rows returned by each VDS query.
+        max_response_rows (Optional[int]): VDS queries returning more rows after SET filters fail as too large.
+        seed (int): seed for latency jitter and generated values.
+    """
+
+    def __init__(
+        self,
+        latency_ms: Optional[Dict[str, float]] = None,
+        jitter: float = 0.1,
+        fields: int = 13,
+        rows: int = 50,
+        max_response_rows: Optional[int] = None,
+        seed: int = 7,
+        host: str = "127.0.0.1",
+        port: int = 0
+    ):
+        self.latency_ms = {**DEFAULT_LATENCY_MS, **(latency_ms or {})}
+        self.jitter = jitter
+        self.fields = _field_names(fields)
+        self.rows = rows
+        self.max_response_rows = max_response_rows
+        self.host = host
+        self.port = port
+        self.requests = {endpoint: 0 for endpoint in ENDPOINTS}
+        self._random = random.Random(seed)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def _delay(self, endpoint: str):
+        self.requests[endpoint] += 1
+        latency = self.latency_ms[endpoint]
+        if self.jitter:
+            latency *= 1 + self._random.uniform(-self.jitter, self.jitter)
+        await asyncio.sleep(latency / 1000)
+
+    async def signin(self, request: web.Request) -> web.Response:
+        await self._delay("signin")
+        body = await request.json()
+        site = body["credentials"]["site"]["contentUrl"]
+        return web.json_response({
+            "credentials": {
+                "token": f"fake-session-{self.requests['signin']}",
+                "site": {"id": "fake-site-id", "contentUrl": site},
+                "user": {"id": "fake-user-id"},
+                "estimatedTimeToExpiration": "1:59:59"
+            }
+        })
+
+    async def graphql(self, request: web.Request) -> web.Response:
+        await self._delay("graphql")
+        fields = [
+            {
+                "name": name,
+                "isHidden": False,
+                "description": f"Description of {name}",
+                "fullyQualifiedName": name,
+                "__typename": "ColumnField",
+                "dataCategory": "QUANTITATIVE" if _data_type(name) == "REAL" else "NOMINAL",
+                "role": "MEASURE" if _data_type(name) == "REAL" else "DIMENSION",
+                "dataType": _data_type(name),
+            }
+            for name in self.fields
+        ]
+        return web.json_response({
+            "data": {
+                "publishedDatasources": [{
+                    "luid": "benchmark-datasource-luid",
+                    "name": "Superstore Datasource",
+                    "projectName": "Benchmarks",
+                    "description": "Benchmark data source served by the fake Tableau server",
+                    "owner": {"name": "benchmarks"},
+                    "fields": fields
+                }]
+            }
+        })
+
+    async def read_metadata(self, request: web.Request) -> web.Response:
+        await self._delay("read_metadata")
+        return web.json_response({
+            "data": [
+                {
+                    "fieldName": name.replace(" ", "_"),
+                    "fieldCaption": name,
+                    "dataType": _data_type(name),
+                    "logicalTableId": "Orders",
+                    "defaultAggregation": "SUM" if _data_type(name) == "REAL" else None,
+                    "columnClass": "COLUMN",
+                }
+                for name in self.fields
+            ]
+        })
+
+    async def query(self, request: web.Request) -> web.Response:
+        await self._delay("query")
+        body = await request.json()
+        query_fields = body.get("query", {}).get("fields", [])
+        if not query_fields:
+            return web.Response(status=400, text=json.dumps({"message": "Query must contain fields"}))
+
+        rows = []
+        for index in range(self.rows):
+            row = {}
+            for field in query_fields:
+                caption = field.get("fieldCaption", "")
+                function = field.get("function")
+                column = field.get("fieldAlias") or (f"{function}({caption})" if function else caption)
+                if function or _data_type(caption) == "REAL":
+                    row[column] = round((index + 1) * 101.5 % 9973, 2)
+                else:
+                    members = DIMENSION_MEMBERS.get(caption)
+                    row[column] = members[index % len(members)] if members else f"{caption} {index}"
+            rows.append(row)
+
+        for query_filter in body.get("query", {}).get("filters", []):
+            if query_filter.get("filterType") == "SET":
+                caption = query_filter["field"]["fieldCaption"]
+                values = set(query_filter.get("values", []))
+                rows = [row for row in rows if row.get(caption) in values]
+        # queries without measures return each combination of members once
+        if not any(field.get("function") for field in query_fields):
+            rows = [dict(unique) for unique in dict.fromkeys(tuple(row.items()) for row in rows)]
+        if self.max_response_rows is not None and len(rows) > self.max_response_rows:
+            return web.Response(status=400, text=json.dumps({"message": "The response size is too large"}))
+        return web.json_response({"data": rows})
+
+    def _app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 ** 2)
+        app.router.add_post("/api/{version}/auth/signin", self.signin)
+        app.router.add_post("/api/metadata/graphql", self.graphql)
+        app.router.add_post("/api/v1/vizql-data-service/read-metadata", self.read_metadata)
+        app.router.add_post("/api/v1/vizql-data-service/query-datasource", self.query)
+        return app
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+
+        async def start():
+            self._runner = web.AppRunner(self._app(), access_log=None)
+            await self._runner.setup()
+            site = web.TCPSite(self._runner, self.host, self.port)
+            await site.start()
+            self.port = site._server.sockets[0].getsockname()[1]
+
+        self._loop.run_until_complete(start())
+        self._started.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+        self._loop.close()
+
+    def start(self) -> "FakeTableauServer":
+        self._thread = threading.Thread(target=self._serve, name="fake-tableau", daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def __enter__(self) -> "FakeTableauServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
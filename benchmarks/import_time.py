@@ -0,0 +1,97 @@
+import os
+import sys
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+from benchmarks.run import configure_environment
+
+
+"""
+IMPORT TIME BUDGET
+
+Imports agent modules in a fresh interpreter with `python -X importtime` and fails when the cumulative import
+time of any of them exceeds a budget. Tools and agents must not build clients or open network connections at
+import, which is what keeps this check fast and runnable offline:
+
+    python -m benchmarks.import_time --budget-ms 2000
+    python -m benchmarks.import_time experimental.agents.superstore.agent --top 20
+
+The process exits with status 1 when a module is over budget so the check can gate CI.
+"""
+
+DEFAULT_MODULES = [
+    "experimental.agents.superstore.agent",
+    "experimental.agents.experimental.agent",
+    "experimental.agents.keynote.agent",
+]
+
+DEFAULT_BUDGET_MS = 2000
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """Parses `-X importtime` output into (module, self_us, cumulative_us) tuples, nested modules keep indentation"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|", 2)
+        entries.append((module.rstrip()[1:], int(self_us), int(cumulative_us)))
+    return entries
+
+
+def profile_import(module: str, env: Dict[str, str]) -> List[Tuple[str, int, int]]:
+    """Imports `module` in a new interpreter and returns its import time entries"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if completed.returncode != 0:
+        errors = [line for line in completed.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"Importing {module} failed:\n" + "\n".join(errors[-10:]))
+    return parse_importtime(completed.stderr)
+
+
+def import_environment() -> Dict[str, str]:
+    """Placeholder settings so agent modules import without a .env file, endpoints point nowhere routable"""
+    saved = dict(os.environ)
+    configure_environment("http://127.0.0.1:9")
+    env = dict(os.environ)
+    os.environ.clear()
+    os.environ.update(saved)
+    for index in ("METRICS_INDEX", "DATASOURCES_INDEX", "WORKBOOKS_INDEX"):
+        env.setdefault(index, index.lower().replace("_", "-"))
+    env.setdefault("PINECONE_API_KEY", "import-time")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+    return env
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fail when importing agent modules takes longer than a budget")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=10, help="imports with the highest self time listed per module")
+    args = parser.parse_args(argv)
+
+    env = import_environment()
+    over_budget = []
+    for module in args.modules:
+        entries = profile_import(module, env)
+        # top-level entries have no indentation, their cumulative times add up to the whole import
+        top_level = [entry for entry in entries if not entry[0].startswith(" ")]
+        total_ms = sum(cumulative for _, _, cumulative in top_level) / 1000
+        status = "ok" if total_ms <= args.budget_ms else "OVER BUDGET"
+        print(f"{module}: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms) {status}")
+        for name, self_us, cumulative in sorted(entries, key=lambda entry: entry[1], reverse=True)[:args.top]:
+            print(f"    {self_us / 1000:8.1f} ms self {cumulative / 1000:8.1f} ms cumulative  {name.strip()}")
+        if total_ms > args.budget_ms:
+            over_budget.append(module)
+
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import json
+import time
+import random
+import asyncio
+import argparse
+import importlib
+from collections import Counter
+from itertools import cycle
+from typing import Any, Dict, List, Optional
+from unittest.mock import patch
+
+from benchmarks.fake_llm import fake_select_model
+from benchmarks.fake_tableau import FakeTableauServer, DEFAULT_LATENCY_MS
+from benchmarks.run import configure_environment
+from benchmarks.stats import summarize, format_table, stage_breakdown
+
+
+"""
+LOAD GENERATOR
+
+Replays recorded agent sessions against a compiled agent graph using the local stand-in backends. Each line of
+the sessions file is a message in the format built by `main.py`:
+
+    {"user_message": "sales by region", "agent_inputs": {"tableau_credentials": {...}, "datasource": {...}, ...}}
+
+Load is either closed-loop (a fixed number of concurrent clients) or open-loop (Poisson arrivals at a target
+rate). `--sweep` runs several concurrency levels and reports where throughput stops increasing:
+
+    python -m benchmarks.load benchmarks/sessions.jsonl --agent experimental --concurrency 8 --requests 200
+    python -m benchmarks.load benchmarks/sessions.jsonl --rate 5 --requests 100
+    python -m benchmarks.load benchmarks/sessions.jsonl --sweep 1 2 4 8 16 32
+"""
+
+LEVEL_COLUMNS = ["level", "requests", "errors", "p50_ms", "p95_ms", "p99_ms", "throughput_rps"]
+
+# a level is saturated when doubling load adds less than this fraction of throughput
+SATURATION_GAIN = 0.10
+
+
+def load_sessions(path: str) -> List[Dict[str, Any]]:
+    with open(path) as f:
+        sessions = [json.loads(line) for line in f if line.strip()]
+    if not sessions:
+        raise ValueError(f"No sessions found in {path}")
+    return sessions
+
+
+class LoadResult:
+    """Latencies and errors collected while replaying sessions"""
+
+    def __init__(self):
+        self.latencies_ms: List[float] = []
+        self.errors: Counter = Counter()
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def summary(self, name: str) -> Dict[str, Any]:
+        wall_seconds = (self.finished or time.perf_counter()) - self.started
+        summary = summarize(name, self.latencies_ms, sum(self.errors.values()), wall_seconds)
+        summary["error_types"] = dict(self.errors)
+        return summary
+
+
+async def _send(graph, message: Dict[str, Any], result: LoadResult):
+    from experimental.agents.utils.agent_utils import build_agent_input
+    from experimental.utilities.metrics import classify_error
+
+    started = time.perf_counter()
+    try:
+        await graph.ainvoke(build_agent_input(message))
+        result.latencies_ms.append((time.perf_counter() - started) * 1000)
+    except Exception as e:
+        result.errors[classify_error(e)] += 1
+
+
+async def replay_closed_loop(graph, sessions: List[Dict[str, Any]], concurrency: int, requests: int) -> LoadResult:
+    """Runs `concurrency` clients that each send their next message as soon as the previous one completes"""
+    result = LoadResult()
+    messages = cycle(sessions)
+    remaining = requests
+
+    async def client():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await _send(graph, next(messages), result)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    result.finished = time.perf_counter()
+    return result
+
+
+async def replay_open_loop(graph, sessions: List[Dict[str, Any]], rate: float, requests: int, seed: int = 7) -> LoadResult:
+    """Sends messages with exponentially distributed gaps (Poisson arrivals) regardless of completions"""
+    result = LoadResult()
+    rng = random.Random(seed)
+    messages = cycle(sessions)
+    tasks = []
+    for _ in range(requests):
+        tasks.append(asyncio.create_task(_send(graph, next(messages), result)))
+        await asyncio.sleep(rng.expovariate(rate))
+    await asyncio.gather(*tasks)
+    result.finished = time.perf_counter()
+    return result
+
+
+def find_saturation(levels: List[Dict[str, Any]]) -> Optional[Any]:
+    """Returns the first level whose successor adds less than `SATURATION_GAIN` throughput"""
+    for previous, current in zip(levels, levels[1:]):
+        if previous["throughput_rps"] and current["throughput_rps"] < previous["throughput_rps"] * (1 + SATURATION_GAIN):
+            return previous["level"]
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay agent sessions against local stand-in backends")
+    parser.add_argument("sessions", help="JSONL file of messages in the format built by main.py")
+    parser.add_argument("--agent", default="experimental", help="agent name under experimental/agents")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4, help="closed-loop clients")
+    parser.add_argument("--rate", type=float, help="open-loop arrivals per second, overrides --concurrency")
+    parser.add_argument("--sweep", type=int, nargs="+", help="concurrency levels to run one after another")
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    parser.add_argument("--llm-first-token-ms", type=float, default=300)
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args(argv)
+
+    sessions = load_sessions(args.sessions)
+    latency_ms = {endpoint: value * args.latency_scale for endpoint, value in DEFAULT_LATENCY_MS.items()}
+
+    from experimental.utilities.telemetry import enable_telemetry, REGISTRY
+    enable_telemetry()
+
+    levels = []
+    with FakeTableauServer(latency_ms=latency_ms, rows=args.rows) as server, \
+            patch("experimental.utilities.models.select_model", fake_select_model(first_token_ms=args.llm_first_token_ms)):
+        configure_environment(server.url)
+        graph = importlib.import_module(f"experimental.agents.{args.agent}.agent").analytics_agent
+
+        if args.rate:
+            plan = [("rate", args.rate)]
+        else:
+            plan = [("concurrency", level) for level in (args.sweep or [args.concurrency])]
+
+        for mode, level in plan:
+            REGISTRY.reset()
+            if mode == "rate":
+                result = asyncio.run(replay_open_loop(graph, sessions, level, args.requests))
+            else:
+                result = asyncio.run(replay_closed_loop(graph, sessions, level, args.requests))
+            summary = result.summary(args.agent)
+            summary["level"] = f"{level} rps" if mode == "rate" else level
+            summary["stages"] = stage_breakdown(REGISTRY.collect())
+            levels.append(summary)
+
+    print(format_table(levels, LEVEL_COLUMNS))
+    for level in levels:
+        if level["error_types"]:
+            print(f"\nerrors at {level['level']}: {level['error_types']}")
+    print(f"\nstages at {levels[-1]['level']}:")
+    print(format_table(levels[-1]["stages"], ["stage", "calls", "mean_ms", "total_ms"]))
+    if len(levels) > 1:
+        saturation = find_saturation(levels)
+        print(f"\nsaturation: {saturation if saturation is not None else 'not reached'}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(levels, f, indent=2)
+
+    return levels
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import asyncio
+import argparse
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+from benchmarks.fake_llm import fake_select_model
+from benchmarks.fake_tableau import FakeTableauServer, DEFAULT_LATENCY_MS
+from benchmarks.stats import summarize, format_table, stage_breakdown
+
+
+"""
+OFFLINE BENCHMARKS
+
+Runs the `simple_datasource_qa` tool and the agents end to end against a local fake Tableau server and a
+deterministic fake chat model, then reports p50, p95 and p99 latency, throughput and a per-stage breakdown:
+
+    python -m benchmarks.run --iterations 50 --concurrency 8
+    python -m benchmarks.run --targets tool --rows 5000 --latency-scale 0.1
+
+No network access or credentials are needed.
+"""
+
+SAMPLE_QUESTIONS = [
+    "show me average discount, total sales and profits by region sorted by profit",
+    "sales and orders for April 20 2025",
+    "profits and average discounts for last week",
+    "which states sell the most?",
+]
+
+RESULT_COLUMNS = ["name", "requests", "errors", "p50_ms", "p95_ms", "p99_ms", "mean_ms", "throughput_rps"]
+
+
+def configure_environment(server_url: str):
+    """Points every Tableau setting used by the tools and agents to the fake server and disables remote tracing"""
+    settings = {
+        "TABLEAU_DOMAIN": server_url,
+        "TABLEAU_SITE": "benchmarks",
+        "TABLEAU_JWT_CLIENT_ID": "benchmark-client-id",
+        "TABLEAU_JWT_SECRET_ID": "benchmark-secret-id",
+        "TABLEAU_JWT_SECRET": "benchmark-secret",
+        "TABLEAU_API_VERSION": "3.21",
+        "TABLEAU_USER": "benchmarks@example.com",
+        "DATASOURCE_LUID": "benchmark-datasource-luid",
+        "MODEL_PROVIDER": "openai",
+        "AGENT_MODEL": "fake-agent",
+        "TOOLING_MODEL": "fake-tooling",
+        "EMBEDDING_MODEL": "fake-embeddings",
+        "OPENAI_API_KEY": "benchmark",
+        "LANGCHAIN_TRACING_V2": "false",
+        "LANGSMITH_TRACING": "false",
+    }
+    for prefix in ("DOMAIN", "SITE", "JWT_CLIENT_ID", "JWT_SECRET_ID", "JWT_SECRET", "API_VERSION", "USER"):
+        settings[f"KEYNOTE_{prefix}"] = settings[f"TABLEAU_{prefix}"]
+    settings["KEYNOTE_DATASOURCE_LUID"] = settings["DATASOURCE_LUID"]
+    os.environ.update(settings)
+
+
+def bench_tool(iterations: int, concurrency: int) -> Dict[str, Any]:
+    """Invokes `simple_datasource_qa` directly from a thread pool, the way ToolNode runs sync tools"""
+    from experimental.tools.simple_datasource_qa import initialize_simple_datasource_qa
+
+    tool = initialize_simple_datasource_qa(domain=os.environ["TABLEAU_DOMAIN"])
+    latencies: List[float] = []
+    errors = 0
+
+    def call(index: int):
+        started = time.perf_counter()
+        tool.invoke({"user_input": SAMPLE_QUESTIONS[index % len(SAMPLE_QUESTIONS)]})
+        return (time.perf_counter() - started) * 1000
+
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(call, index) for index in range(iterations)]
+        for future in futures:
+            try:
+                latencies.append(future.result())
+            except Exception:
+                errors += 1
+    return summarize("simple_datasource_qa", latencies, errors, time.perf_counter() - wall_started)
+
+
+async def _bench_graph(name: str, graph, iterations: int, concurrency: int) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def call(index: int):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await graph.ainvoke({"messages": [("user", SAMPLE_QUESTIONS[index % len(SAMPLE_QUESTIONS)])]})
+                latencies.append((time.perf_counter() - started) * 1000)
+            except Exception:
+                errors += 1
+
+    wall_started = time.perf_counter()
+    await asyncio.gather(*(call(index) for index in range(iterations)))
+    return summarize(f"agent:{name}", latencies, errors, time.perf_counter() - wall_started)
+
+
+def bench_agent(name: str, iterations: int, concurrency: int) -> Dict[str, Any]:
+    """Runs an agent from `experimental/agents/<name>/agent.py` end to end with the fake backends"""
+    module = importlib.import_module(f"experimental.agents.{name}.agent")
+    return asyncio.run(_bench_graph(name, module.analytics_agent, iterations, concurrency))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for tableau_langchain tools and agents")
+    parser.add_argument("--targets", nargs="+", default=["tool", "experimental", "keynote"],
+                        help="`tool` and/or agent names under experimental/agents")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=50, help="rows returned by each VDS query")
+    parser.add_argument("--fields", type=int, default=13, help="fields in the fake data source")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplier for fake Tableau latencies")
+    parser.add_argument("--llm-first-token-ms", type=float, default=300)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0)
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    latency_ms = {endpoint: value * args.latency_scale for endpoint, value in DEFAULT_LATENCY_MS.items()}
+    fake_model = fake_select_model(
+        first_token_ms=args.llm_first_token_ms,
+        tokens_per_second=args.llm_tokens_per_second
+    )
+
+    # stage spans are only recorded when telemetry is enabled
+    from experimental.utilities.telemetry import enable_telemetry, REGISTRY
+    enable_telemetry()
+
+    results = []
+    with FakeTableauServer(latency_ms=latency_ms, rows=args.rows, fields=args.fields) as server, \
+            patch("experimental.utilities.models.select_model", fake_model):
+        configure_environment(server.url)
+        for target in args.targets:
+            if target == "tool":
+                results.append(bench_tool(args.iterations, args.concurrency))
+            else:
+                results.append(bench_agent(target, args.iterations, args.concurrency))
+        requests_served = dict(server.requests)
+
+    stages = stage_breakdown(REGISTRY.collect())
+    print(format_table(results, RESULT_COLUMNS))
+    print()
+    print(format_table(stages, ["stage", "calls", "mean_ms", "total_ms"]))
+    print(f"\nfake Tableau requests: {requests_served}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"results": results, "stages": stages, "requests": requests_served}, f, indent=2)
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
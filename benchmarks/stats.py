@@ -0,0 +1,58 @@
+import math
+from typing import Any, Dict, List, Sequence
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Percentile (0-100) of a list of values using linear interpolation between closest ranks"""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    if lower == upper:
+        return ordered[lower]
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(name: str, latencies_ms: List[float], errors: int, wall_seconds: float) -> Dict[str, Any]:
+    """Latency percentiles and throughput for one benchmark target"""
+    completed = len(latencies_ms)
+    return {
+        "name": name,
+        "requests": completed + errors,
+        "errors": errors,
+        "p50_ms": percentile(latencies_ms, 50),
+        "p95_ms": percentile(latencies_ms, 95),
+        "p99_ms": percentile(latencies_ms, 99),
+        "mean_ms": sum(latencies_ms) / completed if completed else float("nan"),
+        "throughput_rps": completed / wall_seconds if wall_seconds else 0.0,
+    }
+
+
+def format_table(rows: List[Dict[str, Any]], columns: List[str]) -> str:
+    """Formats dictionaries as a fixed width text table, floats are rounded to one decimal"""
+    def cell(value):
+        return f"{value:.1f}" if isinstance(value, float) else str(value)
+
+    widths = {column: max(len(column), *(len(cell(row.get(column, ""))) for row in rows)) for column in columns}
+    lines = ["  ".join(column.ljust(widths[column]) for column in columns)]
+    lines.append("  ".join("-" * widths[column] for column in columns))
+    for row in rows:
+        lines.append("  ".join(cell(row.get(column, "")).ljust(widths[column]) for column in columns))
+    return "\n".join(lines)
+
+
+def stage_breakdown(histograms: List[Dict[str, Any]], name: str = "stage_latency_ms") -> List[Dict[str, Any]]:
+    """Mean latency and call count per pipeline stage from a telemetry registry snapshot"""
+    rows = []
+    for histogram in histograms:
+        if histogram["name"] != name or not histogram["count"]:
+            continue
+        rows.append({
+            "stage": histogram["labels"].get("stage", ""),
+            "calls": histogram["count"],
+            "mean_ms": histogram["sum"] / histogram["count"],
+            "total_ms": float(histogram["sum"]),
+        })
+    return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
@@ -3,9 +3,11 @@ import os
 from dotenv import load_dotenv
 
 from langgraph.prebuilt import create_react_agent
-from langgraph.store.memory import InMemoryStore
 
-from experimental.utilities.models import select_model
+from experimental.utilities.models import select_lazy_model
+from experimental.utilities.metrics import MetricsCallbackHandler
+from experimental.agents.utils.persistence import select_checkpointer, select_store
+from experimental.agents.utils.compaction import compaction_prompt
 from experimental.agents.experimental.tooling import tools
 from experimental.agents.experimental.prompt import AGENT_SYSTEM_PROMPT
 
@@ -25,15 +27,29 @@ Agent for specific applications
 # environment variables available to current process and sub processes
 load_dotenv()
 
-# configure running model for the agent
-llm = select_model(
+# configure running model for the agent, the client is built on the first turn or when pre-warmed
+llm = select_lazy_model(
+    name="experimental",
     provider=os.environ["MODEL_PROVIDER"],
     model_name=os.environ["AGENT_MODEL"],
     temperature=0.2
 )
 
-# initialize a memory store
-memory = InMemoryStore()
+# old tool results are digested and older turns summarized once the conversation exceeds the token budget
+prompt = compaction_prompt(
+    system_prompt=AGENT_SYSTEM_PROMPT,
+    token_budget=int(os.environ.get("EXPERIMENTAL_TOKEN_BUDGET", "12000")),
+    summarizer=select_lazy_model(
+        name="summarizer",
+        provider=os.environ["MODEL_PROVIDER"],
+        model_name=os.environ["TOOLING_MODEL"],
+        temperature=0
+    )
+)
+
+# conversation checkpoints and long-term memory, configured with the CHECKPOINTER and STORE variables
+checkpointer = select_checkpointer()
+memory = select_store()
 
 # set agent debugging state
 if os.getenv('DEBUG') == '1':
@@ -45,6 +61,8 @@ else:
 analytics_agent = create_react_agent(
     model=llm,
     tools=tools,
+    checkpointer=checkpointer,
+    store=memory,
     debug=debugging,
-    prompt=AGENT_SYSTEM_PROMPT
-)
+    prompt=prompt
+).with_config(callbacks=[MetricsCallbackHandler("experimental")])
@@ -1,9 +1,13 @@
 import os
 from dotenv import load_dotenv
 
-from langchain_tableau.tools.simple_datasource_qa import initialize_simple_datasource_qa
+# importing from latest local
+from experimental.tools.simple_datasource_qa import initialize_simple_datasource_qa
 
-from experimental.tools.external.retrievers import pinecone_retriever_tool
+# importing from remote `pkg`
+# from langchain_tableau.tools.simple_datasource_qa import initialize_simple_datasource_qa
+
+from experimental.tools.external.retrievers import catalog_retriever_tool, pinecone_retriever_tool
 
 # Load environment variables before accessing them
 load_dotenv()
@@ -80,7 +84,7 @@ tableau_datasources = pinecone_retriever_tool(
     have descriptions and fields that may match the needs of the user, use this information to determine the best data
     resource for the user to consult.
 
-    If the user wants to know about the Data Catalog in general, use two tools - one for analytics and one for data sources.
+    If the user wants to know about the Data Catalog in general, use the tableau_catalog tool to search both at once.
 
     Args:
         query (str): A natural language query describing the data to retrieve or an open-ended question
@@ -107,7 +111,7 @@ tableau_analytics = pinecone_retriever_tool(
     Don't list sheets unless you are asked for charts, graphics, tables, visualizations, sheets, otherwise list dashboards
     and workbooks.
 
-    If the user wants to know about the Data Catalog in general, use two tools - one for analytics and one for data sources.
+    If the user wants to know about the Data Catalog in general, use the tableau_catalog tool to search both at once.
 
     If nothing matches the user's needs, then you might need to try a different approach such as querying a data source for live data.
 
@@ -153,5 +157,30 @@ tableau_knowledge_base = pinecone_retriever_tool(
     max_concurrency = 5
 )
 
+tableau_catalog = catalog_retriever_tool(
+    name='tableau_catalog',
+    description="""Searches the whole Tableau catalog with one query: metrics, data sources, analytics such as
+    workbooks and dashboards, and the knowledge base of Tableau documentation. Use this tool when the user wants to
+    know about the Data Catalog in general or when it is unclear which kind of resource answers their query, results
+    are tagged with the catalog they come from.
+
+    Args:
+        query (str): A natural language query describing the data to retrieve or an open-ended question
+        that can be answered using information contained in the data source
+
+    Returns:
+        dict: A data set relevant to the user's query
+    """,
+    indexes={
+        "metrics": {"index": os.environ["METRICS_INDEX"], "text_key": "_node_content", "k": 3},
+        "datasources": {"index": os.environ["DATASOURCES_INDEX"], "text_key": "_node_content", "k": 4},
+        "analytics": {"index": os.environ["WORKBOOKS_INDEX"], "text_key": "_node_content", "k": 4},
+        "knowledge_base": {"index": "literature", "text_key": "_node_content", "k": 3}
+    },
+    model_provider=os.environ["MODEL_PROVIDER"],
+    embedding_model=os.environ["EMBEDDING_MODEL"],
+    max_concurrency = 5
+)
+
 # List of tools used to build the state graph and for binding them to nodes
-tools = [ analyze_datasource, tableau_metrics, tableau_datasources, tableau_analytics ]
+tools = [ analyze_datasource, tableau_metrics, tableau_datasources, tableau_analytics, tableau_catalog ]
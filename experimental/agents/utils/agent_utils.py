@@ -4,6 +4,8 @@ import json
 
 from IPython.display import Image, display
 
+from experimental.agents.utils.streaming import StdoutSink, stream_graph_tokens
+
 
 def _visualize_graph(graph):
     """
@@ -29,7 +31,30 @@ def _visualize_graph(graph):
         print(f"Failed to generate PNG: {str(e)}")
 
 
-async def stream_graph_updates(message: dict, graph):
+def build_agent_input(message: dict) -> dict:
+    """
+    Converts a client message into the input of an agent graph
+
+    Parameters:
+    - message (dict): contains a string with the user_message and the agent_inputs built by clients such as `main.py`
+
+    Returns:
+    - dict: graph input with the user message and the Tableau credentials and data source to operate on
+    """
+    message_string = json.dumps(message['user_message'])
+
+    tableau_credentials = message['agent_inputs']['tableau_credentials']
+    datasource = message['agent_inputs']['datasource']
+
+    # this is how client apps should format their requests to the Agent API
+    return {
+        "messages": [("user", message_string)],
+        "tableau_credentials": tableau_credentials,
+        "datasource": datasource
+    }
+
+
+async def stream_graph_updates(message: dict, graph, stream_mode: str = "updates", sink=None, thread_id: str = None):
     """
     This function streams responses from Agents to clients, such as chat interfaces, by processing
     user inputs and dynamically updating the conversation.
@@ -47,30 +72,30 @@ async def stream_graph_updates(message: dict, graph):
     if debugging is enabled (checked via an environment variable), it prints out the content of the last message
     for further inspection.
 
+    With `stream_mode="tokens"` the function streams LLM tokens as soon as they are generated, along with tool
+    start and end events, to a sink (stdout by default, SSE or websockets for chat clients). See `streaming.py`
+
     Parameters:
     - message (dict): contains a string with the user_message and additional operating parameters
     - graph: a representation of the agents behavior and tool set
+    - stream_mode (str): `updates` prints whole messages from the agent node, `tokens` streams tokens and tool events
+    - sink (StreamSink): destination for token events, defaults to `StdoutSink`
+    - thread_id (str): conversation to resume when the graph has a checkpointer, only the new message is sent
 
     Returns:
     - None. The function's primary side effect is to print the assistant's response to the console.
     """
 
-    message_string = json.dumps(message['user_message'])
-
-    tableau_credentials = message['agent_inputs']['tableau_credentials']
-    datasource = message['agent_inputs']['datasource']
+    input_stream = build_agent_input(message)
+    config = {"configurable": {"thread_id": thread_id}} if thread_id else None
 
-    # this is how client apps should format their requests to the Agent API
-    input_stream = {
-        "messages": [("user", message_string)],
-        "tableau_credentials": tableau_credentials,
-        "datasource": datasource
-    }
+    if stream_mode == "tokens":
+        await stream_graph_tokens(input_stream, graph, sink or StdoutSink(), config=config)
 
     # gets value DEBUG value or sets it to empty string, condition applies if string is empty or 0
-    if os.environ.get("DEBUG", "") in ["0", ""]:
+    elif os.environ.get("DEBUG", "") in ["0", ""]:
         # streams events from the agent graph started by the client input containing user queries
-        async for event in graph.astream(input_stream):
+        async for event in graph.astream(input_stream, config):
             agent_output = event.get('agent')
             if event.get('agent'):
                 agent_message = agent_output["messages"][0].content
@@ -82,6 +107,6 @@ async def stream_graph_updates(message: dict, graph):
         # display tableau credentials to prove access to the environment
         print('*** tableau_credentials ***', message.get('tableau_credentials'))
 
-        async for event in graph.astream(input_stream):
+        async for event in graph.astream(input_stream, config):
             print(f"*** EVENT *** type: {type(event)}")
             print(event)
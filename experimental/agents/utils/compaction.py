@@ -0,0 +1,228 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+from experimental.agents.utils.streaming import NOSTREAM_TAG
+from experimental.utilities.telemetry import count_tokens
+
+
+"""
+MESSAGE COMPACTION
+
+ReAct agents send the whole conversation to the model on every turn, including the large markdown tables
+returned by `simple_datasource_qa`. `compaction_prompt` returns a runnable for the `prompt` argument of
+`create_react_agent` that shapes what the model sees without changing the conversation state:
+
+1. tool results older than the latest `keep_tool_results` are replaced with short digests
+2. when the messages still exceed `token_budget`, turns before the latest `keep_turns` human messages are
+   summarized by `summarizer` (or dropped when there is no summarizer) into a single system message
+
+Summaries are cached by a hash of the messages they cover and extended incrementally, so a long session only
+summarizes each turn once.
+"""
+
+SUMMARY_PROMPT = """Summarize the conversation below between a user and an AI analyst for the analyst to continue it.
+Keep the questions asked, the data sources and filters used, key figures from tool results and any decisions or
+preferences the user expressed. Be concise, use bullet points.
+
+{previous_summary}
+
+Conversation:
+{conversation}
+"""
+
+# digests keep the start of a tool result so the model remembers what it contained
+DIGEST_CHARS = 300
+
+# summaries cached per process, each entry is a few hundred tokens
+MAX_CACHED_SUMMARIES = 1024
+
+
+def message_tokens(message: BaseMessage) -> int:
+    text = message.content if isinstance(message.content, str) else str(message.content)
+    if isinstance(message, AIMessage) and message.tool_calls:
+        text += str(message.tool_calls)
+    # a few tokens of overhead per message for roles and separators
+    return count_tokens(text) + 4
+
+
+def digest_tool_message(message: ToolMessage, max_chars: int = DIGEST_CHARS) -> ToolMessage:
+    """
+    Replaces the content of an old tool result with its first characters and the size of what was omitted,
+    markdown tables keep their header and report the number of rows
+
+    Args:
+        message (ToolMessage): tool result to shorten.
+        max_chars (int): characters of the original content to keep.
+
+    Returns:
+        ToolMessage: a copy of the message with the digest as content.
+    """
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    if len(content) <= max_chars:
+        return message
+
+    table_rows = [line for line in content.splitlines() if line.strip().startswith("|")]
+    kept = content[:max_chars]
+    if len(table_rows) > 2:
+        kept = kept.split(table_rows[2])[0] if table_rows[2] in kept else kept
+        note = f"[{len(table_rows) - 2} table rows from an earlier call omitted, call the tool again if needed]"
+    else:
+        note = f"[{len(content) - len(kept)} characters from an earlier call omitted, call the tool again if needed]"
+    return message.model_copy(update={"content": f"{kept.rstrip()}\n{note}"})
+
+
+def _turn_starts(messages: Sequence[BaseMessage]) -> List[int]:
+    return [index for index, message in enumerate(messages) if isinstance(message, HumanMessage)]
+
+
+def _prefix_hashes(messages: Sequence[BaseMessage]) -> List[str]:
+    """Hash of every prefix of the conversation, `hashes[i]` covers `messages[:i]`"""
+    hashes = [""]
+    digest = hashlib.sha1()
+    for message in messages:
+        digest.update(message.type.encode())
+        digest.update(str(message.content).encode())
+        if isinstance(message, AIMessage) and message.tool_calls:
+            digest.update(str(message.tool_calls).encode())
+        hashes.append(digest.copy().hexdigest())
+    return hashes
+
+
+def _transcript(messages: Sequence[BaseMessage]) -> str:
+    lines = []
+    for message in messages:
+        if isinstance(message, AIMessage) and message.tool_calls:
+            calls = ", ".join(f"{call['name']}({call['args']})" for call in message.tool_calls)
+            lines.append(f"assistant called: {calls}")
+        if message.content:
+            lines.append(f"{message.type}: {message.content}")
+    return "\n".join(lines)
+
+
+class MessageCompactor:
+    """
+    Args:
+        system_prompt (str): prepended to the messages sent to the model.
+        token_budget (int): maximum tokens of system prompt plus messages before older turns are summarized.
+        keep_tool_results (int): most recent tool results sent verbatim.
+        keep_turns (int): most recent human turns, and everything after them, never summarized.
+        summarizer (Optional[Runnable]): chat model writing summaries, older turns are dropped without one.
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        token_budget: int = 12000,
+        keep_tool_results: int = 1,
+        keep_turns: int = 2,
+        summarizer: Optional[Runnable] = None
+    ):
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        self.keep_tool_results = keep_tool_results
+        self.keep_turns = keep_turns
+        self.summarizer = summarizer
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+        tool_indexes = [index for index, message in enumerate(messages) if isinstance(message, ToolMessage)]
+        old = set(tool_indexes[:-self.keep_tool_results] if self.keep_tool_results else tool_indexes)
+        return [digest_tool_message(message) if index in old else message for index, message in enumerate(messages)]
+
+    def _plan(self, original: List[BaseMessage], messages: List[BaseMessage]) -> Tuple[int, Optional[str], int]:
+        """
+        Returns where the summarized prefix ends (0 when nothing is summarized), the longest cached summary of
+        a shorter prefix and where that cached summary ends. Prefixes are hashed before digests are applied
+        since whether a tool result is digested changes as the conversation grows.
+        """
+        total = count_tokens(self.system_prompt) + sum(message_tokens(message) for message in messages)
+        turns = _turn_starts(messages)
+        if total <= self.token_budget or len(turns) <= self.keep_turns:
+            return 0, None, 0
+
+        cut = turns[-self.keep_turns] if self.keep_turns else len(messages)
+        hashes = _prefix_hashes(original)
+        with self._lock:
+            for boundary in reversed([0] + turns):
+                if boundary <= cut and hashes[boundary] in self._summaries:
+                    self._summaries.move_to_end(hashes[boundary])
+                    return cut, self._summaries[hashes[boundary]], boundary
+        return cut, None, 0
+
+    def _remember(self, original: List[BaseMessage], cut: int, summary: str):
+        with self._lock:
+            self._summaries[_prefix_hashes(original[:cut])[-1]] = summary
+            while len(self._summaries) > MAX_CACHED_SUMMARIES:
+                self._summaries.popitem(last=False)
+
+    def _summary_request(self, previous: Optional[str], messages: Sequence[BaseMessage]) -> str:
+        return SUMMARY_PROMPT.format(
+            previous_summary=f"Summary of the conversation so far:\n{previous}" if previous else "",
+            conversation=_transcript(messages)
+        )
+
+    def _assemble(self, summary: Optional[str], messages: List[BaseMessage]) -> List[BaseMessage]:
+        compacted = [SystemMessage(content=self.system_prompt)]
+        if summary:
+            compacted.append(SystemMessage(content=f"Summary of earlier conversation:\n{summary}"))
+        return compacted + messages
+
+    def compact(self, state: Dict[str, Any], config: Optional[RunnableConfig] = None) -> List[BaseMessage]:
+        original = list(state["messages"])
+        messages = self._digest(original)
+        cut, summary, covered = self._plan(original, messages)
+        if not cut:
+            return self._assemble(None, messages)
+        if covered < cut:
+            if self.summarizer is None:
+                summary = None
+            else:
+                request = self._summary_request(summary, messages[covered:cut])
+                summary = self.summarizer.invoke(request, {"tags": [NOSTREAM_TAG]}).content
+                self._remember(original, cut, summary)
+        return self._assemble(summary, messages[cut:])
+
+    async def acompact(self, state: Dict[str, Any], config: Optional[RunnableConfig] = None) -> List[BaseMessage]:
+        original = list(state["messages"])
+        messages = self._digest(original)
+        cut, summary, covered = self._plan(original, messages)
+        if not cut:
+            return self._assemble(None, messages)
+        if covered < cut:
+            if self.summarizer is None:
+                summary = None
+            else:
+                request = self._summary_request(summary, messages[covered:cut])
+                summary = (await self.summarizer.ainvoke(request, {"tags": [NOSTREAM_TAG]})).content
+                self._remember(original, cut, summary)
+        return self._assemble(summary, messages[cut:])
+
+
+def compaction_prompt(
+    system_prompt: str,
+    token_budget: int = 12000,
+    keep_tool_results: int = 1,
+    keep_turns: int = 2,
+    summarizer: Optional[Runnable] = None
+) -> Runnable:
+    """
+    Builds the `prompt` runnable for `create_react_agent` that compacts the conversation before each model call,
+    see `MessageCompactor` for the arguments
+
+    Returns:
+        Runnable: maps the agent state to the messages sent to the model, sync and async.
+    """
+    compactor = MessageCompactor(
+        system_prompt=system_prompt,
+        token_budget=token_budget,
+        keep_tool_results=keep_tool_results,
+        keep_turns=keep_turns,
+        summarizer=summarizer
+    )
+    return RunnableLambda(compactor.compact, afunc=compactor.acompact, name="compact_messages")
@@ -0,0 +1,517 @@
+import os
+import json
+import time
+import atexit
+import random
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    WRITES_IDX_MAP,
+    get_checkpoint_id,
+)
+from langgraph.store.base import BaseStore, PutOp
+from langgraph.store.memory import InMemoryStore
+
+from experimental.utilities.lazy import register
+
+
+"""
+CONVERSATION PERSISTENCE
+
+Checkpointers and stores for the agents, selected with environment variables so the same agent modules work
+under the LangGraph server (which provides its own persistence) and in standalone processes such as `main.py`:
+
+    CHECKPOINTER: "" (none), "memory" or "sqlite"        CHECKPOINT_PATH: SQLite file, default `checkpoints.sqlite`
+    STORE: "memory" or "file"                             STORE_PATH: JSON file, default `store.json`
+
+With a checkpointer, clients send only the new message and a `thread_id`, the graph resumes from the latest
+checkpoint of that thread instead of receiving the whole history again.
+
+`SQLiteCheckpointSaver` keeps the latest checkpoint of every thread in memory so resuming does not touch the
+database, queues writes and flushes them in one transaction per `flush_interval`, and deletes all but the
+`keep_last` most recent checkpoints of a thread after each flush. Writes queued when the process is killed are
+lost, `close()` (also run at exit) flushes them.
+"""
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_PATH = "checkpoints.sqlite"
+DEFAULT_STORE_PATH = "store.json"
+
+# checkpoints kept per thread and namespace, older ones can no longer be resumed from
+DEFAULT_KEEP_LAST = 20
+
+# threads whose latest checkpoint is kept in memory, least recently used ones are read back from SQLite
+DEFAULT_CACHED_THREADS = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver[str]):
+    """
+    Checkpointer backed by a SQLite database in WAL mode with batched writes and compaction.
+
+    Args:
+        path (str): database file, created if it does not exist.
+        keep_last (Optional[int]): checkpoints kept per thread after compaction, None keeps all of them.
+        flush_interval (float): seconds writes are batched before being committed.
+        cached_threads (int): threads whose latest checkpoint is served from memory.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CHECKPOINT_PATH,
+        keep_last: Optional[int] = DEFAULT_KEEP_LAST,
+        flush_interval: float = 0.05,
+        cached_threads: int = DEFAULT_CACHED_THREADS,
+        **kwargs: Any
+    ):
+        super().__init__(**kwargs)
+        self.path = path
+        self.keep_last = keep_last
+        self.flush_interval = flush_interval
+        self.cached_threads = cached_threads
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+        self._lock = threading.RLock()
+        self._pending_checkpoints: List[Tuple] = []
+        self._pending_writes: List[Tuple] = []
+        # (thread_id, checkpoint_ns) -> (checkpoint_id, checkpoint row, {(task_id, idx): write row})
+        self._latest: "OrderedDict[Tuple[str, str], Tuple[str, Tuple, Dict[Tuple[str, int], Tuple]]]" = OrderedDict()
+
+        self._wake = threading.Event()
+        self._closed = False
+        self._flusher = threading.Thread(target=self._flush_loop, name="checkpoint-flusher", daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait()
+            self._wake.clear()
+            if self.flush_interval:
+                time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush checkpoints to {self.path}: {e}")
+
+    def flush(self):
+        """Commits queued checkpoints and writes in one transaction, then compacts the threads they belong to"""
+        with self._lock:
+            checkpoints, self._pending_checkpoints = self._pending_checkpoints, []
+            writes, self._pending_writes = self._pending_writes, []
+            if not checkpoints and not writes:
+                return
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)", checkpoints
+                )
+                # regular writes keep their first value, special writes (errors, interrupts) are replaced
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [row for row in writes if row[4] >= 0]
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [row for row in writes if row[4] < 0]
+                )
+                if self.keep_last:
+                    for thread_id, checkpoint_ns in {(row[0], row[1]) for row in checkpoints}:
+                        self._compact(thread_id, checkpoint_ns)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _compact(self, thread_id: str, checkpoint_ns: str):
+        oldest_kept = self._conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep_last - 1)
+        ).fetchone()
+        if oldest_kept is None:
+            return
+        for table in ("checkpoints", "writes"):
+            self._conn.execute(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                (thread_id, checkpoint_ns, oldest_kept[0])
+            )
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+    def _tuple(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, row: Tuple, writes) -> CheckpointTuple:
+        parent_checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata = row
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=self.serde.loads_typed((checkpoint_type, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+        )
+
+    def _db_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str):
+        return self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes WHERE thread_id = ? AND checkpoint_ns = ? "
+            "AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id)
+        ).fetchall()
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+
+        with self._lock:
+            latest = self._latest.get((thread_id, checkpoint_ns))
+            if latest and checkpoint_id in (None, latest[0]):
+                self._latest.move_to_end((thread_id, checkpoint_ns))
+                writes = [row[3:7] for _, row in sorted(latest[2].items())]
+                return self._tuple(thread_id, checkpoint_ns, latest[0], latest[1][3:8], writes)
+
+            self.flush()
+            if checkpoint_id:
+                row = self._conn.execute(
+                    "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+                    "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id)
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+                    "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns)
+                ).fetchone()
+            if row is None:
+                return None
+            return self._tuple(thread_id, checkpoint_ns, row[0], row[1:], self._db_writes(thread_id, checkpoint_ns, row[0]))
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None
+    ) -> Iterator[CheckpointTuple]:
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            clauses.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        # results are read while holding the lock and yielded after releasing it
+        checkpoint_tuples = []
+        with self._lock:
+            self.flush()
+            rows = self._conn.execute(
+                "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+                f"metadata_type, metadata FROM checkpoints {where} ORDER BY checkpoint_id DESC",
+                params
+            ).fetchall()
+
+            for row in rows:
+                if limit is not None and len(checkpoint_tuples) >= limit:
+                    break
+                checkpoint_tuple = self._tuple(
+                    row[0], row[1], row[2], row[3:], self._db_writes(row[0], row[1], row[2])
+                )
+                if filter and not all(checkpoint_tuple.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                checkpoint_tuples.append(checkpoint_tuple)
+
+        yield from checkpoint_tuples
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_blob = self.serde.dumps_typed(dict(metadata))
+        row = (
+            thread_id,
+            checkpoint_ns,
+            checkpoint["id"],
+            config["configurable"].get("checkpoint_id"),
+            checkpoint_type,
+            checkpoint_blob,
+            metadata_type,
+            metadata_blob,
+        )
+        with self._lock:
+            self._pending_checkpoints.append(row)
+            self._latest[(thread_id, checkpoint_ns)] = (checkpoint["id"], row, {})
+            self._latest.move_to_end((thread_id, checkpoint_ns))
+            # evicted threads are safe to drop, reads that miss the cache flush pending writes first
+            while len(self._latest) > self.cached_threads:
+                self._latest.popitem(last=False)
+        self._wake.set()
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = ""
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self._lock:
+            latest = self._latest.get((thread_id, checkpoint_ns))
+            latest_writes = latest[2] if latest and latest[0] == checkpoint_id else None
+            for idx, (channel, value) in enumerate(writes):
+                idx = WRITES_IDX_MAP.get(channel, idx)
+                value_type, value_blob = self.serde.dumps_typed(value)
+                row = (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, value_type, value_blob, task_path)
+                self._pending_writes.append(row)
+                if latest_writes is not None and (idx < 0 or (task_id, idx) not in latest_writes):
+                    latest_writes[(task_id, idx)] = (*row[:3], task_id, channel, value_type, value_blob)
+        self._wake.set()
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self.flush()
+            for key in [key for key in self._latest if key[0] == thread_id]:
+                del self._latest[key]
+            self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            self._conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+
+    # puts only touch memory, reads that miss the latest checkpoint and deletes query SQLite off the event loop
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None
+    ) -> AsyncIterator[CheckpointTuple]:
+        checkpoint_tuples = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in checkpoint_tuples:
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions
+    ) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = ""
+    ) -> None:
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None = None) -> str:
+        # same scheme as the in-memory saver: a zero padded counter plus a random suffix
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+
+class FileStore(InMemoryStore):
+    """
+    `InMemoryStore` persisted to a JSON file. Items are loaded at start up and the whole store is rewritten at
+    most once per `flush_interval` after it changes.
+
+    Args:
+        path (str): JSON file holding the items, created on the first flush.
+        flush_interval (float): seconds changes are batched before the file is rewritten.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH, flush_interval: float = 1.0, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+        if os.path.exists(path):
+            with open(path) as f:
+                items = json.load(f)
+            super().batch([PutOp(tuple(item["namespace"]), item["key"], item["value"]) for item in items])
+
+    def _changed(self, ops: List[Any]):
+        if not any(isinstance(op, PutOp) for op in ops):
+            return
+        with self._lock:
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Writes every item to a temporary file and atomically replaces the store file with it"""
+        with self._lock:
+            self._timer = None
+            items = [
+                {"namespace": list(item.namespace), "key": item.key, "value": item.value}
+                for namespace_items in list(self._data.values())
+                for item in list(namespace_items.values())
+            ]
+            temporary_path = f"{self.path}.tmp"
+            with open(temporary_path, "w") as f:
+                json.dump(items, f)
+            os.replace(temporary_path, self.path)
+
+    def batch(self, ops):
+        ops = list(ops)
+        results = super().batch(ops)
+        self._changed(ops)
+        return results
+
+    async def abatch(self, ops):
+        ops = list(ops)
+        results = await super().abatch(ops)
+        self._changed(ops)
+        return results
+
+
+def _closed_at_exit(backend):
+    atexit.register(backend.close if hasattr(backend, "close") else backend.flush)
+    return backend
+
+
+def select_checkpointer(backend: Optional[str] = None, path: Optional[str] = None) -> Optional[BaseCheckpointSaver]:
+    """
+    Returns the checkpointer shared by every agent in the process, or None when conversation state is not
+    persisted (the default, the LangGraph server supplies its own).
+
+    Args:
+        backend (Optional[str]): "memory" or "sqlite", defaults to the CHECKPOINTER environment variable.
+        path (Optional[str]): SQLite file, defaults to CHECKPOINT_PATH or `checkpoints.sqlite`.
+
+    Returns:
+        Optional[BaseCheckpointSaver]: the checkpointer to pass to `create_react_agent`.
+    """
+    backend = backend if backend is not None else os.environ.get("CHECKPOINTER", "")
+    if backend in ("", "none"):
+        return None
+    if backend == "memory":
+        from langgraph.checkpoint.memory import MemorySaver
+
+        return register("checkpointer:memory", MemorySaver).get()
+    if backend == "sqlite":
+        path = path or os.environ.get("CHECKPOINT_PATH", DEFAULT_CHECKPOINT_PATH)
+        return register(f"checkpointer:sqlite:{path}", lambda: _closed_at_exit(SQLiteCheckpointSaver(path))).get()
+    raise ValueError(f"Unknown checkpointer backend '{backend}', expected 'memory' or 'sqlite'")
+
+
+def select_store(backend: Optional[str] = None, path: Optional[str] = None) -> BaseStore:
+    """
+    Returns the long-term memory store shared by every agent in the process.
+
+    Args:
+        backend (Optional[str]): "memory" or "file", defaults to the STORE environment variable or "memory".
+        path (Optional[str]): JSON file, defaults to STORE_PATH or `store.json`.
+
+    Returns:
+        BaseStore: the store to pass to `create_react_agent`.
+    """
+    backend = backend if backend is not None else os.environ.get("STORE", "memory")
+    if backend in ("", "memory"):
+        return register("store:memory", InMemoryStore).get()
+    if backend == "file":
+        path = path or os.environ.get("STORE_PATH", DEFAULT_STORE_PATH)
+        return register(f"store:file:{path}", lambda: _closed_at_exit(FileStore(path))).get()
+    raise ValueError(f"Unknown store backend '{backend}', expected 'memory' or 'file'")
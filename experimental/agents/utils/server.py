@@ -0,0 +1,43 @@
+import asyncio
+import contextlib
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from experimental.agents.utils.warmup import WARMUP, warm_up
+from experimental.utilities.metrics import render_prometheus
+
+
+"""
+LANGGRAPH SERVER ROUTES
+
+Custom Starlette app mounted by the LangGraph server through the `http.app` key of `langgraph.json`. Its lifespan
+starts warming up every graph when the server boots, `/ready` returns 503 until the warm-up finishes so load
+balancers only route traffic to warm workers, and `/metrics` exposes the Prometheus metrics of the agents.
+"""
+
+
+async def ready(request):
+    return JSONResponse(WARMUP.to_dict(), status_code=200 if WARMUP.ready.is_set() else 503)
+
+
+async def metrics(request):
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # warm-up runs in the background so the server keeps answering health checks while it completes
+    task = asyncio.create_task(warm_up())
+    yield
+    task.cancel()
+
+
+app = Starlette(
+    routes=[
+        Route("/ready", ready),
+        Route("/metrics", metrics),
+    ],
+    lifespan=lifespan
+)
@@ -0,0 +1,216 @@
+import sys
+import json
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+"""
+STREAMING SINKS
+
+Destinations for token-level events produced by `stream_graph_tokens`. Every event is a plain dictionary
+with a `type` key so that chat clients can render them without knowing about Langchain objects:
+
+    {"type": "token", "content": "Sales in the West...", "node": "agent"}
+    {"type": "tool_start", "name": "simple_datasource_qa", "run_id": "...", "input": {...}}
+    {"type": "tool_end", "name": "simple_datasource_qa", "run_id": "...", "output": "...", "duration_ms": 812.4}
+    {"type": "end", "first_token_ms": 341.2, "total_ms": 5120.9}
+
+Sinks expose a single coroutine `send(event)`. Awaiting it is what provides backpressure: a slow client holds
+the producer back instead of letting events pile up in memory. `BufferedSink` adds a bounded buffer in between so
+short network stalls don't stall token generation.
+"""
+
+# model calls carrying this tag run inside the agent node but are not part of its answer
+NOSTREAM_TAG = "nostream"
+
+
+class StreamSink:
+    """Base class for destinations of agent stream events"""
+
+    async def send(self, event: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        return None
+
+
+class StdoutSink(StreamSink):
+    """Prints tokens to the terminal as they arrive, used by `main.py`"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._in_message = False
+
+    async def send(self, event: Dict[str, Any]) -> None:
+        event_type = event.get("type")
+        if event_type == "token":
+            if not self._in_message:
+                self.stream.write("\nAgent:\n")
+                self._in_message = True
+            self.stream.write(event["content"])
+        elif event_type == "tool_start":
+            self._end_message()
+            self.stream.write(f"\n[tool] {event['name']} started\n")
+        elif event_type == "tool_end":
+            self._end_message()
+            self.stream.write(f"[tool] {event['name']} finished in {event.get('duration_ms', 0):.0f} ms\n")
+        elif event_type == "end":
+            self._end_message()
+        self.stream.flush()
+
+    def _end_message(self):
+        if self._in_message:
+            self.stream.write(" \n")
+            self._in_message = False
+
+
+class SSESink(StreamSink):
+    """
+    Formats events as Server-Sent Events. `write` is the coroutine of the HTTP response that accepts bytes,
+    such as `aiohttp.web.StreamResponse.write`
+    """
+
+    def __init__(self, write: Callable[[bytes], Awaitable[Any]]):
+        self.write = write
+
+    async def send(self, event: Dict[str, Any]) -> None:
+        data = json.dumps(event, default=str)
+        await self.write(f"event: {event['type']}\ndata: {data}\n\n".encode("utf-8"))
+
+
+class WebSocketSink(StreamSink):
+    """Sends each event as a JSON message on an open websocket (aiohttp and starlette both provide `send_json`)"""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+
+    async def send(self, event: Dict[str, Any]) -> None:
+        await self.websocket.send_json(json.loads(json.dumps(event, default=str)))
+
+
+class BufferedSink(StreamSink):
+    """
+    Decouples the agent from a slower client with a bounded queue. When `max_pending` events are waiting
+    `send` blocks until the client catches up, so memory use stays bounded.
+    """
+
+    def __init__(self, sink: StreamSink, max_pending: int = 256):
+        self.sink = sink
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._drain_task: Optional[asyncio.Task] = None
+
+    async def send(self, event: Dict[str, Any]) -> None:
+        if self._drain_task is None:
+            self._drain_task = asyncio.create_task(self._drain())
+        await self._put(event)
+
+    def _raise_if_drain_stopped(self):
+        """Re-raises the error of a drain task that stopped, events queued after it would never be delivered"""
+        if self._drain_task is not None and self._drain_task.done():
+            raise self._drain_task.exception() or RuntimeError("The stream sink stopped before the stream ended")
+
+    async def _put(self, event: Optional[Dict[str, Any]]):
+        self._raise_if_drain_stopped()
+        # a full queue is only waited on while the drain task is running
+        put = asyncio.ensure_future(self._queue.put(event))
+        try:
+            await asyncio.wait({put, self._drain_task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            queued = put.done()
+            if not queued:
+                put.cancel()
+        # the drain task stopped while the queue was full, the event cannot be delivered
+        if not queued:
+            self._raise_if_drain_stopped()
+
+    async def _drain(self):
+        while True:
+            event = await self._queue.get()
+            if event is None:
+                break
+            await self.sink.send(event)
+
+    async def close(self) -> None:
+        try:
+            if self._drain_task is not None:
+                await self._put(None)
+                await self._drain_task
+        finally:
+            self._drain_task = None
+            await self.sink.close()
+
+
+def _chunk_text(chunk) -> str:
+    """Extracts text from an AIMessageChunk whose content can be a string or a list of content blocks"""
+    content = getattr(chunk, "content", "")
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "") if isinstance(block, dict) else str(block)
+        for block in content
+    )
+
+
+async def stream_graph_tokens(input_stream: dict, graph, sink: StreamSink, config: Optional[dict] = None) -> None:
+    """
+    Streams LLM tokens from the agent node as soon as they are generated, along with structured tool start
+    and end events, to the provided sink.
+
+    Only tokens from the `agent` node are forwarded, tokens produced by models running inside of tools (such
+    as the query writer in `simple_datasource_qa`) are internal to the tool and are not shown to users.
+
+    Parameters:
+    - input_stream (dict): graph input including messages and agent inputs
+    - graph: a compiled Langgraph graph
+    - sink (StreamSink): destination for events such as `StdoutSink`, `SSESink` or `WebSocketSink`
+    - config (dict): optional runnable config such as `{"configurable": {"thread_id": "..."}}`
+
+    Returns:
+    - None. Events are delivered to the sink, the last one is always of type `end`.
+    """
+    started = time.perf_counter()
+    first_token_ms = None
+    tool_starts = {}
+
+    try:
+        async for event in graph.astream_events(input_stream, config=config, version="v2"):
+            kind = event["event"]
+            metadata = event.get("metadata", {})
+
+            # model calls tagged `nostream`, such as conversation summaries, are internal to the agent
+            if kind == "on_chat_model_stream" and metadata.get("langgraph_node") == "agent" \
+                    and NOSTREAM_TAG not in event.get("tags", []):
+                text = _chunk_text(event["data"]["chunk"])
+                if text:
+                    if first_token_ms is None:
+                        first_token_ms = (time.perf_counter() - started) * 1000
+                    await sink.send({"type": "token", "content": text, "node": "agent"})
+
+            elif kind == "on_tool_start":
+                tool_starts[event["run_id"]] = time.perf_counter()
+                await sink.send({
+                    "type": "tool_start",
+                    "name": event["name"],
+                    "run_id": event["run_id"],
+                    "input": event["data"].get("input"),
+                })
+
+            elif kind == "on_tool_end":
+                tool_started = tool_starts.pop(event["run_id"], started)
+                output = event["data"].get("output")
+                await sink.send({
+                    "type": "tool_end",
+                    "name": event["name"],
+                    "run_id": event["run_id"],
+                    "output": getattr(output, "content", output),
+                    "duration_ms": (time.perf_counter() - tool_started) * 1000,
+                })
+
+        await sink.send({
+            "type": "end",
+            "first_token_ms": first_token_ms,
+            "total_ms": (time.perf_counter() - started) * 1000,
+        })
+    finally:
+        await sink.close()
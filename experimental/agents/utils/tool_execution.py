@@ -0,0 +1,129 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import partial
+from inspect import signature
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool, ToolException
+from langgraph.prebuilt import ToolNode
+
+
+"""
+PARALLEL TOOL EXECUTION
+
+When the model requests several tool calls in one turn, `ToolNode` gathers them concurrently and returns the
+results in call order. `parallel_tool_node` wraps every tool before handing it to `ToolNode` so that:
+
+- async tools run on the event loop, cancelled after their timeout
+- sync tools run on a thread pool owned by the node, bounding how many block at once, and stop being waited
+  for after their timeout (Python threads cannot be cancelled, the call finishes in the background)
+
+Timeouts raise `ToolTimeoutError`, which `ToolNode` returns to the model as an error message so it can retry
+or answer with the results it has.
+"""
+
+DEFAULT_TIMEOUT_SECONDS = 60
+DEFAULT_MAX_WORKERS = 8
+
+
+class ToolTimeoutError(ToolException, TimeoutError):
+    """A tool call exceeded its timeout"""
+
+
+def _has_async_implementation(tool: BaseTool) -> bool:
+    if hasattr(tool, "coroutine"):
+        return tool.coroutine is not None
+    return type(tool)._arun is not BaseTool._arun
+
+
+def _tool_kwargs(method, config: RunnableConfig, run_manager: Any) -> Dict[str, Any]:
+    """Config and run manager arguments accepted by the `_run` or `_arun` method of a tool"""
+    parameters = signature(method).parameters
+    kwargs = {}
+    if "config" in parameters:
+        kwargs["config"] = config
+    if run_manager is not None and "run_manager" in parameters:
+        kwargs["run_manager"] = run_manager
+    return kwargs
+
+
+class BoundedTool(BaseTool):
+    """
+    Runs another tool with a timeout, sync implementations run on `executor`. Name, description and schema are
+    those of the wrapped tool so the model and callbacks see no difference.
+    """
+
+    tool: BaseTool
+    timeout: float
+    executor: Any
+
+    def __init__(self, tool: BaseTool, timeout: float, executor: ThreadPoolExecutor):
+        super().__init__(
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            return_direct=tool.return_direct,
+            response_format=tool.response_format,
+            handle_tool_error=tool.handle_tool_error,
+            handle_validation_error=tool.handle_validation_error,
+            tags=tool.tags,
+            metadata=tool.metadata,
+            tool=tool,
+            timeout=timeout,
+            executor=executor
+        )
+
+    def _timeout_error(self) -> ToolTimeoutError:
+        return ToolTimeoutError(
+            f"Tool '{self.name}' did not finish within {self.timeout:g} seconds. Retry with a narrower request "
+            "or answer with the information already available."
+        )
+
+    def _run(self, *args: Any, config: RunnableConfig, run_manager: Any = None, **kwargs: Any) -> Any:
+        call = partial(self.tool._run, *args, **_tool_kwargs(self.tool._run, config, run_manager), **kwargs)
+        # the context carries the parent run so LLM calls inside the tool are traced under it
+        future = self.executor.submit(contextvars.copy_context().run, call)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise self._timeout_error()
+
+    async def _arun(self, *args: Any, config: RunnableConfig, run_manager: Any = None, **kwargs: Any) -> Any:
+        if _has_async_implementation(self.tool):
+            pending = self.tool._arun(*args, **_tool_kwargs(self.tool._arun, config, run_manager), **kwargs)
+        else:
+            sync_manager = run_manager.get_sync() if run_manager is not None else None
+            call = partial(self.tool._run, *args, **_tool_kwargs(self.tool._run, config, sync_manager), **kwargs)
+            pending = asyncio.get_running_loop().run_in_executor(
+                self.executor, contextvars.copy_context().run, call
+            )
+        try:
+            return await asyncio.wait_for(pending, self.timeout)
+        except asyncio.TimeoutError:
+            raise self._timeout_error()
+
+
+def parallel_tool_node(
+    tools: Sequence[BaseTool],
+    timeouts: Optional[Dict[str, float]] = None,
+    default_timeout: float = DEFAULT_TIMEOUT_SECONDS,
+    max_workers: int = DEFAULT_MAX_WORKERS
+) -> ToolNode:
+    """
+    Builds the tool execution node passed as `tools` to `create_react_agent`.
+
+    Args:
+        tools (Sequence[BaseTool]): tools available to the agent.
+        timeouts (Optional[Dict[str, float]]): seconds allowed per tool name.
+        default_timeout (float): seconds allowed for tools missing from `timeouts`.
+        max_workers (int): sync tool calls running at the same time, further calls queue.
+
+    Returns:
+        ToolNode: runs the tool calls of a turn concurrently and returns their results in call order.
+    """
+    timeouts = timeouts or {}
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-tool")
+    bounded = [BoundedTool(tool, timeouts.get(tool.name, default_timeout), executor) for tool in tools]
+    return ToolNode(bounded)
@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import importlib
+from typing import Any, Dict, Optional
+
+from experimental.utilities.lazy import prewarm, registered
+
+
+"""
+GRAPH WARM-UP
+
+Imports every graph declared in `langgraph.json` and builds what their first request would otherwise pay for:
+Tableau sessions and data source metadata for each configured data source, model clients and vector index
+handshakes. Everything registered with `experimental.utilities.lazy.register` is built concurrently, readiness
+is reported through `WARMUP` once all of it completes.
+"""
+
+logger = logging.getLogger(__name__)
+
+# the repository root, graph paths in `langgraph.json` are relative to it whatever the working directory
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+DEFAULT_CONFIG_PATH = "langgraph.json"
+
+
+class WarmupState:
+    """Progress of the warm-up, `ready` is only set once every graph and registry entry was attempted"""
+
+    def __init__(self):
+        self.ready = asyncio.Event()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.timings_ms: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready.is_set(),
+            "total_ms": (self.finished - self.started) * 1000 if self.finished else None,
+            "timings_ms": {name: round(ms, 1) for name, ms in self.timings_ms.items()},
+            "errors": self.errors,
+        }
+
+
+WARMUP = WarmupState()
+
+
+def graph_modules(config_path: str = DEFAULT_CONFIG_PATH) -> Dict[str, str]:
+    """
+    Maps graph names in `langgraph.json` to importable module names.
+
+    Args:
+        config_path (str): path to the LangGraph configuration file, relative paths are resolved against the
+            project root.
+
+    Returns:
+        Dict[str, str]: graph name to module such as `experimental.agents.superstore.agent`.
+    """
+    with open(os.path.join(PROJECT_ROOT, config_path)) as f:
+        graphs = json.load(f)["graphs"]
+    modules = {}
+    for name, spec in graphs.items():
+        path = spec.split(":", 1)[0]
+        modules[name] = os.path.splitext(os.path.normpath(path))[0].replace(os.sep, ".")
+    return modules
+
+
+async def warm_up(
+    config_path: str = DEFAULT_CONFIG_PATH,
+    max_workers: int = 8,
+    state: WarmupState = WARMUP
+) -> WarmupState:
+    """
+    Imports the graphs in `langgraph.json` and pre-warms every registered client, failures are logged and
+    recorded in `state.errors` without preventing readiness so a missing backend does not block the server.
+
+    Args:
+        config_path (str): path to the LangGraph configuration file, relative to the project root.
+        max_workers (int): maximum number of clients built at the same time.
+        state (WarmupState): where timings, errors and readiness are reported.
+
+    Returns:
+        WarmupState: the updated state.
+    """
+    state.started = time.perf_counter()
+    try:
+        try:
+            modules = graph_modules(config_path)
+        except Exception as e:
+            logger.warning(f"Warm-up could not read the graphs of {config_path}: {e}")
+            state.errors["config"] = str(e)
+            modules = {}
+
+        # imports run one at a time since they serialize on the import lock, tools and models register themselves
+        for name, module in modules.items():
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(importlib.import_module, module)
+            except Exception as e:
+                logger.warning(f"Warm-up could not import graph '{name}': {e}")
+                state.errors[f"graph:{name}"] = str(e)
+            state.timings_ms[f"graph:{name}"] = (time.perf_counter() - started) * 1000
+
+        try:
+            pending = [name for name, entry in registered().items() if not entry.built]
+            results = await asyncio.to_thread(prewarm, pending, max_workers)
+        except Exception as e:
+            logger.warning(f"Warm-up could not pre-warm the registry: {e}")
+            state.errors["registry"] = str(e)
+            results = {}
+        for name, result in results.items():
+            if isinstance(result, Exception):
+                state.errors[name] = str(result)
+            else:
+                state.timings_ms[name] = result
+    finally:
+        # the server is reported ready even when the warm-up fails, requests then build what they need
+        state.finished = time.perf_counter()
+        state.ready.set()
+    logger.info(
+        f"Warm-up finished in {(state.finished - state.started) * 1000:.0f} ms, "
+        f"{len(state.timings_ms)} steps, {len(state.errors)} errors: "
+        + ", ".join(f"{name}={ms:.0f}ms" for name, ms in sorted(state.timings_ms.items(), key=lambda item: -item[1]))
+    )
+    return state
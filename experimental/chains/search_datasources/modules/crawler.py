@@ -0,0 +1,152 @@
+import os
+import contextlib
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+"""
+METADATA API CRAWLER
+
+Querying a whole site with one unpaginated GraphQL query times out or holds the entire catalog in memory on large
+sites. The crawler reads `...Connection` fields page by page with `first` and `after` instead:
+
+1. ids are listed page by page with a light query, cursors make this step sequential
+2. the details of each page of ids are fetched with an `idWithin` filter while the next ids are listed, at most
+   `WINDOW` detail queries in flight
+3. nodes are yielded as soon as their page arrives, so indexers embed and write while the crawl continues
+
+Every query of a crawl shares the sign-in of the caller, `signed_in` only signs in when the server is not already.
+"""
+
+# nodes per page, the Metadata API caps pages at 1000 nodes and detail queries are heavier than id listings
+PAGE_SIZE = 100
+LIST_PAGE_SIZE = 1000
+
+# detail queries in flight at the same time
+WINDOW = 4
+
+# entity -> (connection, query listing ids, query fetching details by id or None when listing returns everything)
+ENTITIES = {
+    'datasources': (
+        'publishedDatasourcesConnection', 'tab_datasource_versions.graphql', 'tab_datasources_by_id.graphql'
+    ),
+    'dashboards': ('dashboardsConnection', 'tab_dashboard_ids.graphql', 'tab_dashboard_fields.graphql'),
+    'sheets': ('sheetsConnection', 'tab_sheets.graphql', None),
+}
+
+
+def read_query(file_name):
+    with open(os.path.join(os.path.dirname(__file__), 'prompts', file_name), 'r') as f:
+        return f.read()
+
+
+@contextlib.contextmanager
+def signed_in(server, auth):
+    """Signs in for the duration of the block, unless the server already holds a session"""
+    if server.is_signed_in():
+        yield server
+        return
+    with server.auth.sign_in(auth):
+        yield server
+
+
+def paginate(server, query, connection, variables=None, page_size=PAGE_SIZE):
+    """
+    Yields the nodes of a connection query page by page.
+
+    Args:
+        server: a signed in `tableauserverclient.Server`.
+        query (str): GraphQL query taking `$first` and `$after` and selecting `nodes` and `pageInfo`.
+        connection (str): the connection field of the query, such as `publishedDatasourcesConnection`.
+        variables (dict): other variables of the query.
+        page_size (int): nodes per page.
+
+    Yields:
+        list: the nodes of each page.
+    """
+    after = None
+    while True:
+        resp = server.metadata.query(query, variables={**(variables or {}), 'first': page_size, 'after': after})
+        if resp.get('errors'):
+            raise RuntimeError(f"Metadata API query on {connection} failed: {resp['errors']}")
+        page = resp['data'][connection]
+        yield page['nodes']
+        if not page['pageInfo']['hasNextPage']:
+            return
+        after = page['pageInfo']['endCursor']
+
+
+def fetch_by_ids(server, entity, ids, page_size=PAGE_SIZE, window=WINDOW):
+    """
+    Yields the details of the nodes of an entity with the given ids, `page_size` ids per query and at most
+    `window` queries in flight. Nodes are yielded in the order their pages complete.
+    """
+    connection, _, detail_file = ENTITIES[entity]
+    query = read_query(detail_file)
+    pages = (ids[start:start + page_size] for start in range(0, len(ids), page_size))
+    yield from _fetch_concurrently(server, connection, query, pages, page_size, window)
+
+
+def crawl(server, entity, page_size=PAGE_SIZE, window=WINDOW):
+    """
+    Yields every node of an entity, `datasources`, `dashboards` or `sheets`, with the fields of its detail query.
+
+    Args:
+        server: a signed in `tableauserverclient.Server`.
+        entity (str): key of `ENTITIES`.
+        page_size (int): nodes per detail query.
+        window (int): detail queries in flight.
+    """
+    connection, list_file, detail_file = ENTITIES[entity]
+    if detail_file is None:
+        for nodes in paginate(server, read_query(list_file), connection, page_size=page_size):
+            yield from nodes
+        return
+
+    def id_pages():
+        for nodes in paginate(server, read_query(list_file), connection, page_size=LIST_PAGE_SIZE):
+            ids = [node['id'] for node in nodes]
+            for start in range(0, len(ids), page_size):
+                yield ids[start:start + page_size]
+
+    yield from _fetch_concurrently(server, connection, read_query(detail_file), id_pages(), page_size, window)
+
+
+def _fetch_concurrently(server, connection, query, id_pages, page_size, window):
+    def fetch(ids):
+        nodes = []
+        for page in paginate(server, query, connection, variables={'ids': ids}, page_size=page_size):
+            nodes.extend(page)
+        return nodes
+
+    with ThreadPoolExecutor(max_workers=window, thread_name_prefix='metadata-crawl') as executor:
+        pending = set()
+        for ids in id_pages:
+            pending.add(executor.submit(contextvars.copy_context().run, fetch, ids))
+            # listing pauses while the window is full, completed pages are handed to the caller meanwhile
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+
+def crawl_catalog(server, auth, entities=('datasources', 'dashboards', 'sheets'), page_size=PAGE_SIZE, window=WINDOW):
+    """
+    Crawls several entities concurrently with a single sign-in, each with its own window of detail queries.
+
+    Returns:
+        dict: entity -> list of nodes.
+    """
+    with signed_in(server, auth):
+        with ThreadPoolExecutor(max_workers=len(entities), thread_name_prefix='metadata-catalog') as executor:
+            futures = {
+                entity: executor.submit(
+                    contextvars.copy_context().run, lambda entity=entity: list(crawl(server, entity, page_size, window))
+                )
+                for entity in entities
+            }
+            return {entity: future.result() for entity, future in futures.items()}
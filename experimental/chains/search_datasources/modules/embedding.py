@@ -1,18 +1,33 @@
-import numpy as np
-from openai import OpenAI
 from dotenv import load_dotenv
-import os
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+from experimental.utilities.embedding_cache import cached_embeddings
+from experimental.utilities import similarity
 
 def get_embedding_openai(text, model="text-embedding-3-small"):
+   # repeated texts are served from the shared embedding cache
    text = text.replace("\n", " ")
-   return client.embeddings.create(input = [text], model=model).data[0].embedding
+   return cached_embeddings(provider="openai", model_name=model).embed_query(text)
+
+def get_embeddings_openai(texts, model="text-embedding-3-small"):
+   # embeds many texts with concurrent batched requests, vectors are returned in the order of the texts
+   texts = [text.replace("\n", " ") for text in texts]
+   return cached_embeddings(provider="openai", model_name=model).embed_documents(texts)
+
+
+class CachedEmbeddingFunction:
+    """Chroma embedding function backed by the shared embedding cache"""
+
+    def __init__(self, model_name="text-embedding-3-small"):
+        self.model_name = model_name
+
+    def __call__(self, input):
+        return cached_embeddings(provider="openai", model_name=self.model_name).embed_documents(list(input))
 
 def cosine_similarity(vec1, vec2):
-    """Calculate the cosine similarity between two vectors."""
-    return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
+    """Calculate the cosine similarity between two vectors, or between every row of two matrices.
+    To rank many documents keep them in a `SimilarityIndex` so they are normalized once."""
+    return similarity.cosine_similarity(vec1, vec2)
 
 
 
@@ -2,6 +2,8 @@ import tableauserverclient as TSC
 from dotenv import load_dotenv
 import os
 
+from . import crawler
+
 def get_tableau_client():
     load_dotenv()
     tableau_server = 'https://' + os.getenv('TABLEAU_DOMAIN')
@@ -13,95 +15,70 @@ def get_tableau_client():
     return server, tableau_auth
 
 def fetch_dashboard_data(server, auth):
-    with server.auth.sign_in(auth):
-        # Read the GraphQL query from the file
-        query_file_path = os.path.join('query_data_chain','modules','prompts', 'tab_dashboard_fields.graphql')
-        with open(query_file_path, 'r') as f:
-            query = f.read()
-        # Query the Metadata API and store the response in resp
-        resp = server.metadata.query(query)
-        return resp['data']['dashboards']
+    with crawler.signed_in(server, auth):
+        return list(crawler.crawl(server, 'dashboards'))
     
 def fetch_sheets_data(server, auth):
-    with server.auth.sign_in(auth):
-        # Read the GraphQL query from the file
-        query_file_path = os.path.join('query_data_chain','modules','prompts','tab_sheets.graphql')
-        with open(query_file_path, 'r') as f:
-            query = f.read()
-        # Query the Metadata API and store the response in resp
-        resp = server.metadata.query(query)
-        return resp['data']['sheets']
+    with crawler.signed_in(server, auth):
+        return list(crawler.crawl(server, 'sheets'))
     
 def fetch_datasources(server, auth):
-    with server.auth.sign_in(auth):
-
-        # Read the GraphQL query from the file
-        query_file_path = os.path.join('query_data_chain','modules','prompts','tab_datasources.graphql')
-        with open(query_file_path, 'r') as f:
-            query = f.read()
-
-        # Query the Metadata API and store the response in resp
-        resp = server.metadata.query(query)
-        
-        # Prepare datasources for RAG
-        datasources = resp['data']['publishedDatasources']
-
-        for datasource in datasources:
+    with crawler.signed_in(server, auth):
+        return list(query_datasources(server))
 
-            # Combine datasource columns (is not hidden) to one cell for RAG
-            fields = datasource['fields']
+def fetch_catalog(server, auth):
+    """Fetches datasources prepared for RAG, dashboards and sheets concurrently with a single sign-in"""
+    catalog = crawler.crawl_catalog(server, auth)
+    catalog['datasources'] = [prepare_datasource(datasource) for datasource in catalog['datasources']]
+    return catalog
 
-            field_entries = []
-            for field in fields:
-                # Exclude columns that are hidden
-                if not field.get('isHidden', True):
-                    name = field.get('name', '')
-                    description = field.get('description', '')
-                    # If there's a description include it
-                    if description:
-                        # Remove newlines and extra spaces
-                        description = ' '.join(description.split())
-                        field_entry = f"- {name}: [{description}]"
-                    else:
-                        field_entry = "- " + name
-                    field_entries.append(field_entry)
+def query_datasource_versions(server):
+    """Lists the id, luid and updatedAt of every published datasource page by page, requires a signed in server"""
+    connection, list_file, _ = crawler.ENTITIES['datasources']
+    query = crawler.read_query(list_file)
+    for nodes in crawler.paginate(server, query, connection, page_size=crawler.LIST_PAGE_SIZE):
+        yield from nodes
 
-            # Combining Datasource columns
-            concatenated_field_entries = '\n'.join(field_entries)
+def query_datasources(server, ids=None):
+    """Yields published datasources prepared for RAG as their pages arrive, only those with the given Metadata API
+    ids when set. Requires a signed in server"""
+    if ids is None:
+        datasources = crawler.crawl(server, 'datasources')
+    else:
+        datasources = crawler.fetch_by_ids(server, 'datasources', list(ids))
+    for datasource in datasources:
+        yield prepare_datasource(datasource)
 
-            # Datasource RAG headers
-            datasource_name = datasource['name']
-            datasource_desc = datasource['description']
-            datasource_project = datasource['projectName']
+def prepare_datasource(datasource):
+    """Adds the `dashboard_overview` text embedded for RAG to a datasource of the Metadata API"""
+    # Combine datasource columns (is not hidden) to one cell for RAG
+    fields = datasource['fields']
 
-            # Formating Output for readability
-            rag_column = f"Datasource: {datasource_name}\n{datasource_desc}\n{datasource_project}\n\nDatasource Columns:\n{concatenated_field_entries}"
-            
-            datasource['dashboard_overview'] = rag_column
+    field_entries = []
+    for field in fields:
+        # Exclude columns that are hidden
+        if not field.get('isHidden', True):
+            name = field.get('name', '')
+            description = field.get('description', '')
+            # If there's a description include it
+            if description:
+                # Remove newlines and extra spaces
+                description = ' '.join(description.split())
+                field_entry = f"- {name}: [{description}]"
+            else:
+                field_entry = "- " + name
+            field_entries.append(field_entry)
 
-            # Simplifying output schema 
-            keys_to_extract = [
-                'dashboard_overview',
-                'id',
-                'luid',
-                'uri',
-                'vizportalId',
-                'vizportalUrlId',
-                'name',
-                'hasExtracts',
-                'createdAt',
-                'updatedAt',
-                'extractLastUpdateTime',
-                'extractLastRefreshTime',
-                'extractLastIncrementalUpdateTime',
-                'projectName',
-                'containerName',
-                'isCertified',
-                'description'
-            ]
+    # Combining Datasource columns
+    concatenated_field_entries = '\n'.join(field_entries)
 
-            # Create a new dictionary with only the specified keys
-            datasource = {key: datasource.get(key) for key in keys_to_extract}
+    # Datasource RAG headers
+    datasource_name = datasource['name']
+    datasource_desc = datasource['description']
+    datasource_project = datasource['projectName']
 
-        return datasources
+    # Formating Output for readability
+    rag_column = f"Datasource: {datasource_name}\n{datasource_desc}\n{datasource_project}\n\nDatasource Columns:\n{concatenated_field_entries}"
 
+    datasource['dashboard_overview'] = rag_column
+    return datasource
@@ -0,0 +1,127 @@
+import hashlib
+
+from experimental.utilities.embedding_cache import cached_embeddings
+
+from . import crawler, graphql
+
+
+"""
+INCREMENTAL DATASOURCE INDEXER
+
+Keeps a Chroma collection of published datasources in sync with the Metadata API without embedding the whole
+catalog again. Each document stores the `updatedAt` of its datasource and a hash of its content in its metadata:
+
+1. a light paginated query lists the id and `updatedAt` of every datasource
+2. fields and descriptions are only fetched for datasources that are new or were updated since the last sync,
+   by the crawler in concurrent pages
+3. documents whose text hash changed are embedded and upserted in batches as their pages arrive, documents with
+   the same text only get their metadata updated
+4. documents of datasources that no longer exist are deleted
+"""
+
+# documents written to Chroma per call
+UPSERT_BATCH_SIZE = 256
+
+
+def convert_to_string(value):
+    if isinstance(value, dict):
+        return str(value)
+    elif isinstance(value, list):
+        return ', '.join(map(str, value))
+    else:
+        return str(value)
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def datasource_document(datasource):
+    """Returns the id, text and Chroma metadata of a datasource returned by `graphql.query_datasources`"""
+    text = datasource['dashboard_overview']
+    # Prepare metadata (exclude 'dashboard_overview' and 'id'), Chroma only stores scalar values
+    metadata = {k: v for k, v in datasource.items() if k not in ['dashboard_overview', 'id', 'fields']}
+    metadata = {
+        k: convert_to_string(v) for k, v in metadata.items() if isinstance(v, (str, int, float, bool, dict, list))
+    }
+    metadata['content_hash'] = content_hash(text)
+    return datasource['id'], text, metadata
+
+
+def sync_datasources(collection, server, auth, model_name="text-embedding-3-small", full=False):
+    """
+    Brings a Chroma collection up to date with the published datasources of a site.
+
+    Args:
+        collection: the Chroma collection, created empty on the first sync.
+        server: a `tableauserverclient.Server`.
+        auth: credentials to sign in to the server.
+        model_name (str): OpenAI embedding model of the collection.
+        full (bool): fetch every datasource, not only updated ones, documents are still only embedded when
+            their content changed.
+
+    Returns:
+        dict: number of datasources `added`, `updated`, `unchanged` and `deleted`, updated ones include those
+        whose metadata changed without being embedded again.
+    """
+    stored = collection.get(include=['metadatas'])
+    indexed = {doc_id: metadata or {} for doc_id, metadata in zip(stored['ids'], stored['metadatas'])}
+
+    embeddings = cached_embeddings(provider="openai", model_name=model_name)
+    changed, retagged = [], []
+    added = updated = 0
+
+    def flush():
+        # embedded together, packed into concurrent rate limited requests
+        vectors = embeddings.embed_documents([text for _, text, _ in changed])
+        collection.upsert(
+            ids=[doc_id for doc_id, _, _ in changed],
+            documents=[text for _, text, _ in changed],
+            metadatas=[metadata for _, _, metadata in changed],
+            embeddings=vectors
+        )
+        changed.clear()
+
+    with crawler.signed_in(server, auth):
+        # updatedAt as stored in the metadata, missing when the datasource has none
+        current = {
+            datasource['id']: convert_to_string(datasource['updatedAt']) if datasource.get('updatedAt') else None
+            for datasource in graphql.query_datasource_versions(server)
+        }
+        stale = [
+            doc_id for doc_id, updated_at in current.items()
+            if full or doc_id not in indexed or indexed[doc_id].get('updatedAt') != updated_at
+        ]
+        # datasources arrive page by page, each batch is embedded and written while the next pages are fetched
+        for datasource in graphql.query_datasources(server, ids=stale) if stale else []:
+            doc_id, text, metadata = datasource_document(datasource)
+            previous = indexed.get(doc_id)
+            if previous is None or previous.get('content_hash') != metadata['content_hash']:
+                changed.append((doc_id, text, metadata))
+                if previous is None:
+                    added += 1
+                else:
+                    updated += 1
+                if len(changed) >= UPSERT_BATCH_SIZE:
+                    flush()
+            elif previous != metadata:
+                retagged.append((doc_id, metadata))
+        if changed:
+            flush()
+
+    if retagged:
+        collection.update(
+            ids=[doc_id for doc_id, _ in retagged],
+            metadatas=[metadata for _, metadata in retagged]
+        )
+
+    deleted = [doc_id for doc_id in indexed if doc_id not in current]
+    if deleted:
+        collection.delete(ids=deleted)
+
+    return {
+        'added': added,
+        'updated': updated + len(retagged),
+        'unchanged': len(current) - added - updated - len(retagged),
+        'deleted': len(deleted)
+    }
@@ -1,11 +1,7 @@
 from flask import Flask, request, jsonify, render_template
-from modules import graphql
+from modules import graphql, embedding, indexer
 import chromadb
-import numpy as np
-from openai import OpenAI
 from dotenv import load_dotenv
-import os
-import chromadb.utils.embedding_functions as embedding_functions
 
 # Load environment variables
 load_dotenv()
@@ -13,68 +9,22 @@ load_dotenv()
 # Initialize Flask app
 app = Flask(__name__)
 
-openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-
 def get_embedding_openai(text, model="text-embedding-3-small"):
-   text = text.replace("\n", " ")
-   return openai_client.embeddings.create(input = [text], model=model).data[0].embedding
-
-
-openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-                api_key=os.getenv('OPENAI_API_KEY'),
-                model_name="text-embedding-3-small"
-            )
-
-def convert_to_string(value):
-    if isinstance(value, dict):
-        return str(value)
-    elif isinstance(value, list):
-        return ', '.join(map(str, value))
-    else:
-        return str(value)
-    
+   return embedding.get_embedding_openai(text, model=model)
+
+
+# embeddings of documents and queries go through the shared embedding cache
+openai_ef = embedding.CachedEmbeddingFunction(model_name="text-embedding-3-small")
+
 # Initialize the Chroma client
 chroma_client = chromadb.PersistentClient(path="data")
 collection_name = 'tableau_datasource_RAG_search'
+collection = chroma_client.get_or_create_collection(name=collection_name, embedding_function=openai_ef)
 
-# Try to get the collection
-try:
-    collection = chroma_client.get_collection(name=collection_name, embedding_function=openai_ef)
-    print("Collection exists.")
-except Exception as e:
-    print("Collection does not exist. Creating collection...")
-    # Fetch data from Tableau
-    server, auth = graphql.get_tableau_client()
-    datasources = graphql.fetch_datasources(server, auth)
-
-    documents = []
-    ids = []
-    metadatas = []
-
-    for datasource in datasources:
-        # Extract the text to embed
-        text_to_embed = datasource['dashboard_overview']
-
-        # Extract the unique identifier
-        unique_id = datasource['id']
-
-        # Prepare metadata (exclude 'dashboard_overview' and 'id')
-        metadata = {k: v for k, v in datasource.items() if k not in ['dashboard_overview', 'id']}
-
-        # Convert metadata values to strings
-        metadata = {k: convert_to_string(v) for k, v in metadata.items() if isinstance(v, (str, int, float, bool, dict, list))}
-
-        documents.append(text_to_embed)
-        ids.append(unique_id)
-        metadatas.append(metadata)
-
-    # Create the collection and add data
-    collection = chroma_client.get_or_create_collection(name=collection_name, embedding_function=openai_ef)
-    collection.add(
-        documents=documents,
-        metadatas=metadatas,
-        ids=ids
-    )
+# Only datasources added or updated since the last start are fetched from Tableau and embedded again
+server, auth = graphql.get_tableau_client()
+changes = indexer.sync_datasources(collection, server, auth, model_name="text-embedding-3-small")
+print(f"Collection synced: {changes}")
 
 # Route to display the search form
 @app.route('/', methods=['GET'])
@@ -1,11 +1,149 @@
 import os
+import asyncio
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
-from pinecone import Pinecone
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.prompts import PromptTemplate
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.tools import create_retriever_tool
 
-from langchain_pinecone import PineconeVectorStore
-from langchain.tools.retriever import create_retriever_tool
+from experimental.utilities.lazy import Lazy, register
+from experimental.utilities.embedding_cache import cached_embeddings
+from experimental.utilities.retrieval_cache import RETRIEVALS
 
-from experimental.utilities.models import select_embeddings
+
+logger = logging.getLogger(__name__)
+
+# concurrent requests of the shared Pinecone HTTP client across all indexes, overridden by PINECONE_POOL_THREADS
+PINECONE_POOL_THREADS = 8
+
+
+def pinecone_client():
+    """
+    Returns the Pinecone client shared by every retriever, built on first use. Set PINECONE_GRPC=1 to use the
+    gRPC client (requires `pinecone-client[grpc]`), the HTTP client keeps a pool of `PINECONE_POOL_THREADS`
+    connections otherwise.
+    """
+    def build():
+        if os.environ.get("PINECONE_GRPC", "0") == "1":
+            from pinecone.grpc import PineconeGRPC
+
+            return PineconeGRPC(api_key=os.environ["PINECONE_API_KEY"], source_tag="langchain")
+
+        from pinecone import Pinecone
+
+        return Pinecone(
+            api_key=os.environ["PINECONE_API_KEY"],
+            pool_threads=int(os.environ.get("PINECONE_POOL_THREADS", PINECONE_POOL_THREADS)),
+            source_tag="langchain"
+        )
+
+    return register("pinecone:client", build).get()
+
+
+def pinecone_index_handle(index_name: str):
+    """Returns the handle of a Pinecone index, resolved once with the shared client on first use"""
+    return register(f"pinecone:index:{index_name}", lambda: pinecone_client().Index(index_name)).get()
+
+
+def index_retriever(
+    pinecone_index: str,
+    model_provider: Optional[str] = None,
+    embedding_model: Optional[str] = None,
+    text_key: str = "text",
+    search_k: int = 6,
+    max_concurrency: int = 5,
+    backend: Optional[str] = None,
+    hybrid: Optional[bool] = None
+) -> Lazy:
+    """
+    Registers the retriever of an index as `retriever:<pinecone_index>` and its stats as `index:<pinecone_index>`,
+    tools searching the same index share the first registration. Arguments are described in
+    `pinecone_retriever_tool`.
+
+    Returns:
+        Lazy: the registry entry, its value is a LangChain retriever exposing the index as `vectorstore`.
+    """
+    backend = backend or os.environ.get("VECTOR_BACKEND", "pinecone")
+    if backend not in ("pinecone", "local"):
+        raise ValueError(f"Unknown vector backend '{backend}', expected `pinecone` or `local`")
+    if hybrid is None:
+        hybrid = os.environ.get("HYBRID_RETRIEVAL", "0") == "1"
+    snapshot_path = os.path.join(os.environ.get("VECTOR_SNAPSHOT_DIR", "snapshots"), pinecone_index)
+
+    def make_retriever():
+        # query embeddings are cached and shared by every retriever using the same model
+        embeddings = cached_embeddings(
+            provider = model_provider or os.environ.get("MODEL_PROVIDER", "openai"),
+            model_name = embedding_model or os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small")
+        )
+
+        if backend == "local":
+            from experimental.utilities.vector_index import LocalVectorStore
+
+            vector_store = LocalVectorStore.load(snapshot_path, embedding=embeddings)
+        else:
+            from langchain_pinecone import PineconeVectorStore
+
+            # index handles and the client connection pool are shared by every retriever
+            vector_store = PineconeVectorStore(
+                index=pinecone_index_handle(pinecone_index),
+                embedding=embeddings,
+                text_key=text_key
+            )
+
+        # the BM25 index covers the documents of the snapshot, listing a Pinecone index within a tool call would
+        # fetch every vector and exceed the tool timeout. It is built again when a new export bumps the version.
+        read_records = None
+        if hybrid and backend == "local":
+            # the documents of the snapshot the store serves, a store failing to reload keeps the previous version
+            read_records, records_version = lambda: vector_store._index.documents, lambda: vector_store.version
+        elif hybrid and os.path.exists(os.path.join(snapshot_path, "documents.jsonl")):
+            from experimental.utilities.retrieval_cache import index_version
+            from experimental.utilities.vector_index import read_documents
+
+            read_records = lambda: read_documents(snapshot_path)
+            records_version = lambda: index_version(pinecone_index, directory=snapshot_path)
+        elif hybrid:
+            logger.warning(
+                f"Hybrid retrieval of '{pinecone_index}' needs a snapshot at {snapshot_path}, export one with "
+                "`python -m experimental.utilities.vector_index export`, searching vectors only"
+            )
+
+        if read_records is not None:
+            from experimental.utilities import hybrid_search
+
+            return hybrid_search.HybridRetriever(
+                vector_retriever=vector_store.as_retriever(
+                    search_kwargs={"k": search_k * hybrid_search.CANDIDATE_FACTOR},
+                    max_concurrency=max_concurrency,
+                    verbose=False
+                ),
+                lexical_index=hybrid_search.VersionedBM25Index(
+                    lambda: hybrid_search.lexical_documents(read_records()), records_version
+                ),
+                k=search_k
+            )
+
+        return vector_store.as_retriever(
+            search_kwargs={"k": search_k},
+            max_concurrency=max_concurrency,
+            verbose=False
+        )
+
+    vector_retriever = register(f"retriever:{pinecone_index}", make_retriever)
+
+    # opens the connection to the index, or loads the snapshot, ahead of the first query when the registry is
+    # pre-warmed
+    def describe_index():
+        return vector_retriever.get().vectorstore._index.describe_index_stats()
+
+    register(f"index:{pinecone_index}", describe_index)
+    return vector_retriever
 
 
 def pinecone_retriever_tool(
@@ -16,13 +154,16 @@ def pinecone_retriever_tool(
     embedding_model: str,
     text_key: str = "text",
     search_k: int = 6,
-    max_concurrency: int = 5
+    max_concurrency: int = 5,
+    backend: Optional[str] = None,
+    hybrid: Optional[bool] = None
 ):
     """
     Initializes a Pinecone retriever using langchain-pinecone and creates a LangChain tool.
 
     Assumes PINECONE_API_KEY and PINECONE_ENVIRONMENT environment variables are set for
-    PineconeVectorStore initialization.
+    PineconeVectorStore initialization. With the `local` backend the index is served in-process from the
+    snapshot at `VECTOR_SNAPSHOT_DIR/<pinecone_index>` instead, see `experimental.utilities.vector_index`.
 
     Args:
         name: The name to assign to the created LangChain tool.
@@ -33,43 +174,172 @@ def pinecone_retriever_tool(
         text_key: Pinecone metadata containing the content, default: `text`,  `_node_content` is another example.
         search_k: The number of documents to retrieve (k). Defaults to 6.
         max_concurrency: The maximum concurrency for retriever requests. Defaults to 5.
+        backend: `pinecone` or `local`, defaults to the VECTOR_BACKEND environment variable or `pinecone`.
+        hybrid: Fuse the vector search with a BM25 search over the index documents, helps searches for exact
+            names. The documents are read from the snapshot of the index, Pinecone indexes without a snapshot are
+            searched by vector only. Defaults to the HYBRID_RETRIEVAL environment variable, off unless set to 1.
 
     Returns:
-        A LangChain BaseTool configured to use the specified Pinecone retriever.
+        A LangChain BaseTool configured to use the specified Pinecone retriever. The vector store is built on the
+        first query or when the `retriever:<pinecone_index>` registry entry is pre-warmed, with the Pinecone client
+        and embeddings shared by all retrievers. Pre-warming `index:<pinecone_index>` also fetches the index stats.
 
     Raises:
         ImportError: If langchain-pinecone is not installed.
         EnvironmentError: If required Pinecone environment variables are missing.
         Exception: If connection to the Pinecone index fails.
     """
-    # Initialize Pinecone client
-    pc = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"))
+    vector_retriever = index_retriever(
+        pinecone_index=pinecone_index,
+        model_provider=model_provider,
+        embedding_model=embedding_model,
+        text_key=text_key,
+        search_k=search_k,
+        max_concurrency=max_concurrency,
+        backend=backend,
+        hybrid=hybrid
+    )
 
-    embeddings = select_embeddings(
-        provider = model_provider or os.environ.get("MODEL_PROVIDER", "openai"),
-        model_name = embedding_model or os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small")
+    # searches go through the embedding and retrieval caches, the vector store is built on the first one
+    retriever = IndexRetriever(
+        provider=model_provider or os.environ.get("MODEL_PROVIDER", "openai"),
+        model_name=embedding_model or os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small"),
+        sources={pinecone_index: (pinecone_index, vector_retriever, search_k)},
+        tag=False
     )
 
-    def make_retriever(index_name: str):
-        vector_store = PineconeVectorStore.from_existing_index(
-            index_name=index_name,
-            embedding=embeddings,
-            text_key=text_key
-        )
+    retriever_tool = create_retriever_tool(
+        retriever,
+        name=name,
+        description=description
+    )
 
-        return vector_store.as_retriever(
-            search_kwargs={"k": search_k},
+    return retriever_tool
+
+
+def search_index(pinecone_index: str, retriever: Any, query: str, vector: List[float], k: int) -> List[Document]:
+    """
+    Searches a registered index retriever with a query embedded beforehand, results are cached per index version
+    unless RETRIEVAL_CACHE=0.
+    """
+    def run():
+        # hybrid retrievers also run their BM25 search on the query text
+        if hasattr(retriever, "search_by_vector"):
+            return retriever.search_by_vector(query, vector, k=k)
+        # PineconeVectorStore only implements the search by vector that returns scores
+        return [document for document, _ in retriever.vectorstore.similarity_search_by_vector_with_score(vector, k=k)]
+
+    if os.environ.get("RETRIEVAL_CACHE", "1") != "1":
+        return run()
+    namespace = getattr(retriever.vectorstore, "_namespace", None)
+    return RETRIEVALS.search(pinecone_index, namespace, vector, k, run)
+
+
+def _search_entry(pinecone_index: str, entry: Lazy, query: str, vector: List[float], k: int) -> List[Document]:
+    # the retriever of a cold index is built here, in the worker thread, rather than on the caller's event loop
+    return search_index(pinecone_index, entry.get(), query, vector, k)
+
+
+class IndexRetriever(BaseRetriever):
+    """
+    Retriever embedding the query once with the shared cached embeddings and searching one or several indexes
+    concurrently. With `tag`, documents carry the name of their source in the `catalog` metadata.
+    """
+
+    provider: str
+    model_name: str
+    # source name -> (index name, registry entry of the index retriever, documents returned)
+    sources: Dict[str, Tuple[str, Any, int]]
+    tag: bool = True
+
+    def _merge(self, results: List[List[Document]]) -> List[Document]:
+        merged = []
+        for source, documents in zip(self.sources, results):
+            for document in documents:
+                # cached documents are shared, tagged copies are returned
+                metadata = {**document.metadata, "catalog": source} if self.tag else dict(document.metadata)
+                merged.append(document.model_copy(update={"metadata": metadata}))
+        return merged
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        vector = cached_embeddings(self.provider, self.model_name).embed_query(query)
+        if len(self.sources) == 1:
+            (index_name, entry, k), = self.sources.values()
+            return self._merge([_search_entry(index_name, entry, query, vector, k)])
+
+        with ThreadPoolExecutor(max_workers=len(self.sources), thread_name_prefix="catalog") as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, _search_entry, index_name, entry, query, vector, k)
+                for index_name, entry, k in self.sources.values()
+            ]
+            return self._merge([future.result() for future in futures])
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector = await cached_embeddings(self.provider, self.model_name).aembed_query(query)
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(
+                None, contextvars.copy_context().run, _search_entry, index_name, entry, query, vector, k
+            )
+            for index_name, entry, k in self.sources.values()
+        ))
+        return self._merge(list(results))
+
+
+def catalog_retriever_tool(
+    name: str,
+    description: str,
+    indexes: Dict[str, Dict[str, Any]],
+    model_provider: Optional[str] = None,
+    embedding_model: Optional[str] = None,
+    max_concurrency: int = 5,
+    backend: Optional[str] = None,
+    hybrid: Optional[bool] = None
+):
+    """
+    Creates a LangChain tool searching several indexes with one call, the query is embedded once and the indexes
+    are searched concurrently. Results are grouped by index and each one starts with the name of its index.
+
+    Args:
+        name: The name to assign to the created LangChain tool.
+        description: The description for the created LangChain tool.
+        indexes: Source name -> index settings, `index` names the Pinecone index and the optional `k` (default 4)
+            and `text_key` (default `text`) are the documents returned and the content metadata of that index.
+        model_provider: The model vendor such as `openai` or `azure`, shared by every index.
+        embedding_model: The embedding model every index was built with.
+        max_concurrency: The maximum concurrency for retriever requests. Defaults to 5.
+        backend: `pinecone` or `local`, see `pinecone_retriever_tool`.
+        hybrid: Fuse vector and BM25 searches, see `pinecone_retriever_tool`.
+
+    Returns:
+        A LangChain BaseTool sharing its index retrievers with the `pinecone_retriever_tool` tools of the same
+        indexes.
+    """
+    provider = model_provider or os.environ.get("MODEL_PROVIDER", "openai")
+    model_name = embedding_model or os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small")
+
+    sources = {}
+    for source, settings in indexes.items():
+        k = settings.get("k", 4)
+        entry = index_retriever(
+            pinecone_index=settings["index"],
+            model_provider=provider,
+            embedding_model=model_name,
+            text_key=settings.get("text_key", "text"),
+            search_k=k,
             max_concurrency=max_concurrency,
-            verbose=False
+            backend=backend,
+            hybrid=hybrid
         )
+        sources[source] = (settings["index"], entry, k)
 
+    retriever = IndexRetriever(provider=provider, model_name=model_name, sources=sources)
 
-    retriever = make_retriever(pinecone_index)
-
-    retriever_tool = create_retriever_tool(
+    return create_retriever_tool(
         retriever,
         name=name,
-        description=description
+        description=description,
+        document_prompt=PromptTemplate.from_template("[{catalog}]\n{page_content}")
     )
-
-    return retriever_tool
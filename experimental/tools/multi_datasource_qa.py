@@ -0,0 +1,173 @@
+import os
+from typing import List, Optional
+from pydantic import Field
+
+from langchain_core.tools import tool, ToolException
+
+from experimental.tools.simple_datasource_qa import (
+    DataSourceQAInputs,
+    PLANNER_DESCRIPTION,
+    query_datasource,
+    query_writer_model,
+    with_session
+)
+from experimental.utilities.lazy import register
+from experimental.utilities.member_index import MEMBER_INDEXES
+from experimental.utilities.simple_datasource_qa import (
+    env_vars_simple_datasource_qa,
+    get_datasource_metadata,
+    resolve_datasource
+)
+
+
+"""
+MULTI DATASOURCE QA
+
+`simple_datasource_qa` binds one data source per tool instance, so serving many data sources means many tools
+with their own configuration. `multi_datasource_qa` chooses the data source on every call, from its LUID or its
+name resolved against the catalog of published data sources. Every data source shares the same cached Tableau
+session, metadata cache, query writer model and HTTP connection pool, so adding data sources costs nothing until
+they are queried.
+"""
+
+
+class MultiDataSourceQAInputs(DataSourceQAInputs):
+    """Describes inputs for usage of the multi_datasource_qa tool"""
+
+    datasource_luid: Optional[str] = Field(
+        None,
+        description="""The LUID of the Tableau data source to query, when known from a previous call or a catalog search.
+        Otherwise use None and provide the datasource_name""",
+        examples=[
+            None,
+            "2d935df8-fe7e-4fd8-bb14-35eb4ba31d45"
+        ],
+    )
+    datasource_name: Optional[str] = Field(
+        None,
+        description="""The name of the Tableau data source to query when its LUID is not known, such as 'Superstore Datasource'.
+        If the name is ambiguous or unknown, the error lists the available data sources to retry with""",
+        examples=[
+            None,
+            "Superstore Datasource"
+        ],
+    )
+
+
+def initialize_multi_datasource_qa(
+    domain: Optional[str] = None,
+    site: Optional[str] = None,
+    jwt_client_id: Optional[str] = None,
+    jwt_secret_id: Optional[str] = None,
+    jwt_secret: Optional[str] = None,
+    tableau_api_version: Optional[str] = None,
+    tableau_user: Optional[str] = None,
+    datasource_luids: Optional[List[str]] = None,
+    model_provider: Optional[str] = None,
+    tooling_llm_model: Optional[str] = None,
+    query_planner: Optional[bool] = None
+):
+    """
+    Initializes the Langgraph tool called 'multi_datasource_qa' for analytical questions and answers on any
+    Tableau Data Source available to the user, chosen at call time
+
+    Args:
+        domain (Optional[str]): The domain of the Tableau server.
+        site (Optional[str]): The site name on the Tableau server.
+        jwt_client_id (Optional[str]): The client ID for JWT authentication.
+        jwt_secret_id (Optional[str]): The secret ID for JWT authentication.
+        jwt_secret (Optional[str]): The secret for JWT authentication.
+        tableau_api_version (Optional[str]): The version of the Tableau API to use.
+        tableau_user (Optional[str]): The Tableau user to authenticate as.
+        datasource_luids (Optional[List[str]]): LUIDs of the data sources the tool may query, any data source
+            visible to the user when None. Listed data sources are pre-warmed with the registry.
+        tooling_llm_model (Optional[str]): The LLM model to use for tooling operations.
+        query_planner (Optional[bool]): Lets the query writer split compound questions into concurrent queries
+            joined into one table, read from QUERY_PLANNER when not provided.
+
+    Returns:
+        function: A decorated function that can be used as a langgraph tool for data source QA.
+
+    Note:
+        If arguments are not provided, the function will attempt to read them from
+        environment variables, typically stored in a .env file.
+    """
+    # if arguments are not provided, the tool obtains environment variables directly from .env
+    env_vars = env_vars_simple_datasource_qa(
+        domain=domain,
+        site=site,
+        jwt_client_id=jwt_client_id,
+        jwt_secret_id=jwt_secret_id,
+        jwt_secret=jwt_secret,
+        tableau_api_version=tableau_api_version,
+        tableau_user=tableau_user,
+        model_provider=model_provider,
+        tooling_llm_model=tooling_llm_model,
+        query_planner=query_planner,
+        datasource_required=False
+    )
+
+    query_writer = query_writer_model(env_vars["model_provider"], env_vars["tooling_llm_model"])
+
+    # metadata and member indexes of the allowed data sources are built when the registry is pre-warmed, the
+    # entries are shared with any simple_datasource_qa tool configured for the same data source
+    def warm_datasource(luid):
+        def warm(tableau_auth):
+            _, data_model = get_datasource_metadata(api_key=tableau_auth, url=env_vars["domain"], datasource_luid=luid)
+            if os.environ.get("MEMBER_INDEX", "1") == "1":
+                MEMBER_INDEXES.build(url=env_vars["domain"], datasource_luid=luid, api_key=tableau_auth, data_model=data_model)
+        return lambda: with_session(env_vars, warm)
+
+    for luid in datasource_luids or []:
+        register(f"datasource:{env_vars['domain']}:{luid}", warm_datasource(luid))
+
+    @tool("multi_datasource_qa", args_schema=MultiDataSourceQAInputs)
+    def multi_datasource_qa(
+        user_input: str,
+        datasource_luid: Optional[str] = None,
+        datasource_name: Optional[str] = None,
+        previous_call_error: Optional[str] = None,
+        previous_vds_payload: Optional[str] = None
+    ) -> dict:
+        """
+        Queries one of the user's Tableau data sources for analytical Q&A, identified by its LUID or name. Returns
+        a data set you can use to answer user questions. Describe your entire query in a single request rather than
+        selecting small slices of data in multiple requests, and query each data source separately.
+
+        Good query: "Profits & average discounts by region for last week" on "Superstore Datasource"
+        Bad queries: "profits per region last week" & "average discounts per region last week"
+
+        If you received an error after using this tool, mention it in your next attempt to help the tool correct itself.
+        """
+
+        def run(tableau_auth):
+            try:
+                luid = resolve_datasource(
+                    api_key=tableau_auth,
+                    url=env_vars["domain"],
+                    datasource_luid=datasource_luid,
+                    datasource_name=datasource_name,
+                    allowed_luids=datasource_luids
+                )
+            except ValueError as e:
+                raise ToolException(f"Could not determine which data source to query: {e}")
+
+            return query_datasource(
+                user_input=user_input,
+                api_key=tableau_auth,
+                domain=env_vars["domain"],
+                datasource_luid=luid,
+                query_writer=query_writer.get(),
+                tooling_llm_model=env_vars["tooling_llm_model"],
+                previous_call_error=previous_call_error,
+                previous_vds_payload=previous_vds_payload,
+                query_planner=env_vars["query_planner"]
+            )
+
+        # credentials to access Tableau environment on behalf of the user, signed in again if Tableau rejects them
+        return with_session(env_vars, run)
+
+    if env_vars["query_planner"]:
+        multi_datasource_qa.description += PLANNER_DESCRIPTION
+
+    return multi_datasource_qa
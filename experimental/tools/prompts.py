@@ -1194,3 +1194,18 @@ Your response should:
 
 Your synthesized response:
 """
+
+# planner mode: same instructions as `vds_query` but the query writer may split the task into several queries
+vds_plan = vds_query[:vds_query.index("Output:")] + """Query Plan:
+Most tasks are answered by a single query. When the task needs data at different grains (for example totals per region
+and sales per region and category) or with different filter sets (for example this year and last year), write one query
+per grain or filter set instead, up to 4 queries. The queries run at the same time and their results are joined on the
+dimension fields they share, so:
+- use the same fieldCaption, function and fieldAlias for a dimension in every query that shares it
+- give every measure a fieldAlias that is unique across all queries and describes its filters, such as "Sales 2024"
+
+Output:
+Your output must be minimal, containing only a JSON array of VDS queries without any extra formatting for readability,
+the array contains a single query when one is enough. If the data source does not contain fields of data that can answer
+the user_input, return a message so the agent knows to use a different tool.
+"""
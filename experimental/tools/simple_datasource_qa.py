@@ -1,17 +1,32 @@
+import os
 import json
-from typing import Optional
+from typing import Any, Callable, Dict, Optional, TypeVar
 from pydantic import BaseModel, Field
 
-from langchain.prompts import PromptTemplate
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
 from langchain_core.tools import tool, ToolException
 
-from experimental.tools.prompts import vds_query, vds_prompt_data, vds_response
-from experimental.utilities.auth import jwt_connected_app
+from experimental.tools.prompts import vds_query, vds_plan, vds_prompt_data, vds_response
+from experimental.utilities.auth import get_tableau_session, invalidate_tableau_session
+from experimental.utilities.lazy import Lazy, register
+from experimental.utilities.member_index import MEMBER_INDEXES
 from experimental.utilities.models import select_model
+from experimental.utilities.utils import SessionExpiredError
+from experimental.utilities.telemetry import (
+    span,
+    count_tokens,
+    STAGE_AUTH,
+    STAGE_PROMPT_RENDERING,
+    STAGE_QUERY_WRITER,
+    STAGE_RESPONSE_FORMATTING
+)
 from experimental.utilities.simple_datasource_qa import (
     env_vars_simple_datasource_qa,
     augment_datasource_metadata,
+    get_datasource_metadata,
     get_headlessbi_data,
+    get_planned_data,
     prepare_prompt_inputs
 )
 
@@ -53,6 +68,253 @@ class DataSourceQAInputs(BaseModel):
     )
 
 
+T = TypeVar("T")
+
+# Session scopes are limited to only required authorizations to Tableau resources that support tool operations
+ACCESS_SCOPES = [
+    "tableau:content:read", # for quering Tableau Metadata API
+    "tableau:viz_data_service:read" # for querying VizQL Data Service
+]
+
+# appended to the tool description in planner mode, the tool splits compound questions itself
+PLANNER_DESCRIPTION = """
+
+Questions comparing different grains or filter sets, such as "sales by region this year vs last year and the
+share of each category", can be asked in one request: the tool splits them into queries and joins the results."""
+
+
+def sign_in(env_vars: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Signs in with the connected app settings of `env_vars`, sessions are cached and shared by every tool
+    configured for the same site, user and scopes
+
+    Args:
+        env_vars (Dict[str, Any]): configuration returned by `env_vars_simple_datasource_qa`.
+
+    Returns:
+        Dict[str, Any]: the Tableau authentication response including the session token.
+
+    Raises:
+        ToolException: when the sign-in fails, with instructions for the agent.
+    """
+    try:
+        with span(STAGE_AUTH):
+            return get_tableau_session(
+                tableau_domain=env_vars["domain"],
+                tableau_site=env_vars["site"],
+                jwt_client_id=env_vars["jwt_client_id"],
+                jwt_secret_id=env_vars["jwt_secret_id"],
+                jwt_secret=env_vars["jwt_secret"],
+                tableau_api=env_vars["tableau_api_version"],
+                tableau_user=env_vars["tableau_user"],
+                scopes=ACCESS_SCOPES
+            )
+    except Exception as e:
+        auth_error_string = f"""
+        CRITICAL ERROR: Could not authenticate to the Tableau site successfully.
+        This tool is unusable as a result.
+        Error from remote server: {e}
+
+        INSTRUCTION: Do not ask the user to provide credentials directly or in chat since they should
+        originate from a secure Connected App or similar authentication mechanism. You may inform the
+        user that you are not able to access their Tableau environment at this time. You can also describe
+        the nature of the error to help them understand why you can't service their request.
+        """
+        raise ToolException(auth_error_string)
+
+
+def with_session(env_vars: Dict[str, Any], run: Callable[[str], T]) -> T:
+    """
+    Runs `run` with the token of the cached session. When Tableau rejects the token, because it was revoked or
+    expired before the cache refreshed it, the session is dropped from the cache and `run` is retried once with a
+    new sign-in.
+
+    Args:
+        env_vars (Dict[str, Any]): configuration returned by `env_vars_simple_datasource_qa`.
+        run (Callable[[str], T]): the Tableau calls, given the session token.
+
+    Returns:
+        T: the value returned by `run`.
+    """
+    token = sign_in(env_vars)['credentials']['token']
+    try:
+        return run(token)
+    except SessionExpiredError:
+        invalidate_tableau_session(token)
+    try:
+        return run(sign_in(env_vars)['credentials']['token'])
+    except SessionExpiredError as e:
+        raise ToolException(f"Tableau rejected a new session for this tool: {e}")
+
+
+def query_writer_model(model_provider: str, tooling_llm_model: str) -> Lazy:
+    """
+    The query writer is built once per provider and model so its connection pool is reused across calls and
+    across tools
+
+    Returns:
+        Lazy: registry entry building the chat model on first use.
+    """
+    return register(
+        f"model:tooling:{model_provider}:{tooling_llm_model}",
+        lambda: select_model(
+            provider=model_provider,
+            model_name=tooling_llm_model,
+            temperature=0
+        )
+    )
+
+
+def query_datasource(
+    user_input: str,
+    api_key: str,
+    domain: str,
+    datasource_luid: str,
+    query_writer: Any,
+    tooling_llm_model: str,
+    previous_call_error: Optional[str] = None,
+    previous_vds_payload: Optional[str] = None,
+    query_planner: bool = False
+):
+    """
+    Writes a VizQL Data Service query for `user_input` with the query writer, runs it against the data source and
+    formats the result for the agent.
+
+    Args:
+        user_input (str): the question in natural language.
+        api_key (str): Tableau session token.
+        domain (str): The domain of the Tableau server.
+        datasource_luid (str): The LUID of the data source to query.
+        query_writer (Any): chat model writing the VDS payload.
+        tooling_llm_model (str): name of the query writer model, used for telemetry.
+        previous_call_error (Optional[str]): error of a previous call for the query writer to correct.
+        previous_vds_payload (Optional[str]): payload of a previous call that caused the error.
+        query_planner (bool): lets the query writer return several queries, run concurrently and joined into one
+            table, for questions needing different grains or filter sets.
+
+    Returns:
+        PromptValue: the response prompt containing the query, data source details and the data table.
+    """
+    # 0. Obtain metadata about the data source to enhance the query writing prompt
+    query_writing_data = augment_datasource_metadata(
+        task = user_input,
+        api_key = api_key,
+        url = domain,
+        datasource_luid = datasource_luid,
+        prompt = vds_prompt_data,
+        previous_errors = previous_call_error,
+        previous_vds_payload = previous_vds_payload
+    )
+
+    # 1. Insert instruction data into the template
+    query_writing_prompt = PromptTemplate(
+        input_variables=[
+            "task"
+            "instructions",
+            "vds_schema",
+            "sample_queries",
+            "error_queries",
+            "data_dictionary",
+            "data_model",
+            "previous_call_error",
+            "previous_vds_payload"
+        ],
+        template=vds_plan if query_planner else vds_query
+    )
+
+    # 2. Language model to execute the prompt to write a VizQL Data Service query
+    # render the prompt and execute the query writer as timed stages, token counts are only computed when recording
+    def render_query_prompt(inputs, config):
+        with span(STAGE_PROMPT_RENDERING) as stage:
+            prompt_value = query_writing_prompt.invoke(inputs, config)
+            if stage.is_recording():
+                stage.set_attribute("prompt_tokens", count_tokens(prompt_value.to_string()))
+        return prompt_value
+
+    def write_query(prompt_value, config):
+        with span(STAGE_QUERY_WRITER, model=tooling_llm_model):
+            return query_writer.invoke(prompt_value, config)
+
+    # 3. Query data from Tableau's VizQL Data Service using the AI written payload
+    def get_data(vds_query):
+        payload = vds_query.content
+
+        # in planner mode the payload may hold several queries
+        fetch_data = get_planned_data if query_planner else get_headlessbi_data
+
+        try:
+            data = fetch_data(
+                api_key = api_key,
+                url = domain,
+                datasource_luid = datasource_luid,
+                payload = payload
+            )
+
+            return {
+                "vds_query": payload,
+                "data_table": data,
+            }
+        except SessionExpiredError:
+            raise
+        except Exception as e:
+            query_error_message = f"""
+            Tableau's VizQL Data Service return an error for the generated query:
+
+            {str(vds_query.content)}
+
+            The user_input used to write this query was:
+
+            {str(user_input)}
+
+            This was the error:
+
+            {str(e)}
+
+            Consider retrying this tool with the same inputs but include the previous query
+            causing the error and the error itself for the tool to correct itself on a retry.
+            If the error was an empty array, this usually indicates an incorrect filter value
+            was applied, thus returning no data
+            """
+
+            raise ToolException(query_error_message)
+
+    # 4. Prepare inputs for a structured response to the calling Agent
+    def response_inputs(input):
+        metadata = query_writing_data.get('meta')
+        data = {
+            "query": input.get('vds_query', ''),
+            "data_source_name": metadata.get('datasource_name'),
+            "data_source_description": metadata.get('datasource_description'),
+            "data_source_maintainer": metadata.get('datasource_owner'),
+            "data_table": input.get('data_table', ''),
+        }
+        inputs = prepare_prompt_inputs(data=data, user_string=user_input)
+        return inputs
+
+    # 5. Response template for the Agent with further instructions
+    response_prompt = PromptTemplate(
+        input_variables=[
+            "data_source_name",
+            "data_source_description",
+            "data_source_maintainer",
+            "vds_query",
+            "data_table",
+            "user_input"
+        ],
+        template=vds_response
+    )
+
+    def format_response(input, config):
+        with span(STAGE_RESPONSE_FORMATTING):
+            return response_prompt.invoke(response_inputs(input), config)
+
+    # this chain defines the flow of data through the system
+    chain = RunnableLambda(render_query_prompt) | write_query | get_data | format_response
+
+    # invoke the chain to generate a query and obtain data
+    return chain.invoke(query_writing_data)
+
+
 def initialize_simple_datasource_qa(
     domain: Optional[str] = None,
     site: Optional[str] = None,
@@ -63,7 +325,8 @@ def initialize_simple_datasource_qa(
     tableau_user: Optional[str] = None,
     datasource_luid: Optional[str] = None,
     model_provider: Optional[str] = None,
-    tooling_llm_model: Optional[str] = None
+    tooling_llm_model: Optional[str] = None,
+    query_planner: Optional[bool] = None
 ):
     """
     Initializes the Langgraph tool called 'simple_datasource_qa' for analytical
@@ -79,6 +342,8 @@ def initialize_simple_datasource_qa(
         tableau_user (Optional[str]): The Tableau user to authenticate as.
         datasource_luid (Optional[str]): The LUID of the data source to perform QA on.
         tooling_llm_model (Optional[str]): The LLM model to use for tooling operations.
+        query_planner (Optional[bool]): Lets the query writer split compound questions into concurrent queries
+            joined into one table, read from QUERY_PLANNER when not provided.
 
     Returns:
         function: A decorated function that can be used as a langgraph tool for data source QA.
@@ -104,7 +369,30 @@ def initialize_simple_datasource_qa(
         tableau_user=tableau_user,
         datasource_luid=datasource_luid,
         model_provider=model_provider,
-        tooling_llm_model=tooling_llm_model
+        tooling_llm_model=tooling_llm_model,
+        query_planner=query_planner
+    )
+
+    query_writer = query_writer_model(env_vars["model_provider"], env_vars["tooling_llm_model"])
+
+    # signs in, caches the data source metadata and indexes its members when the registry is pre-warmed
+    def warm_datasource(tableau_auth):
+        _, data_model = get_datasource_metadata(
+            api_key=tableau_auth,
+            url=env_vars["domain"],
+            datasource_luid=env_vars["datasource_luid"]
+        )
+        if os.environ.get("MEMBER_INDEX", "1") == "1":
+            MEMBER_INDEXES.build(
+                url=env_vars["domain"],
+                datasource_luid=env_vars["datasource_luid"],
+                api_key=tableau_auth,
+                data_model=data_model
+            )
+
+    register(
+        f"datasource:{env_vars['domain']}:{env_vars['datasource_luid']}",
+        lambda: with_session(env_vars, warm_datasource)
     )
 
     @tool("simple_datasource_qa", args_schema=DataSourceQAInputs)
@@ -125,147 +413,21 @@ def initialize_simple_datasource_qa(
         If you received an error after using this tool, mention it in your next attempt to help the tool correct itself.
         """
 
-        # Session scopes are limited to only required authorizations to Tableau resources that support tool operations
-        access_scopes = [
-            "tableau:content:read", # for quering Tableau Metadata API
-            "tableau:viz_data_service:read" # for querying VizQL Data Service
-        ]
-        try:
-            tableau_session = jwt_connected_app(
-                tableau_domain=env_vars["domain"],
-                tableau_site=env_vars["site"],
-                jwt_client_id=env_vars["jwt_client_id"],
-                jwt_secret_id=env_vars["jwt_secret_id"],
-                jwt_secret=env_vars["jwt_secret"],
-                tableau_api=env_vars["tableau_api_version"],
-                tableau_user=env_vars["tableau_user"],
-                scopes=access_scopes
-            )
-        except Exception as e:
-            auth_error_string = f"""
-            CRITICAL ERROR: Could not authenticate to the Tableau site successfully.
-            This tool is unusable as a result.
-            Error from remote server: {e}
-
-            INSTRUCTION: Do not ask the user to provide credentials directly or in chat since they should
-            originate from a secure Connected App or similar authentication mechanism. You may inform the
-            user that you are not able to access their Tableau environment at this time. You can also describe
-            the nature of the error to help them understand why you can't service their request.
-            """
-            raise ToolException(auth_error_string)
-
-        # credentials to access Tableau environment on behalf of the user
-        tableau_auth =  tableau_session['credentials']['token']
-
-        # Data source for VDS querying
-        tableau_datasource = env_vars["datasource_luid"]
-
-        # 0. Obtain metadata about the data source to enhance the query writing prompt
-        query_writing_data = augment_datasource_metadata(
-            task = user_input,
-            api_key = tableau_auth,
-            url = domain,
-            datasource_luid = tableau_datasource,
-            prompt = vds_prompt_data,
-            previous_errors = previous_call_error,
-            previous_vds_payload = previous_vds_payload
-        )
-
-        # 1. Insert instruction data into the template
-        query_writing_prompt = PromptTemplate(
-            input_variables=[
-                "task"
-                "instructions",
-                "vds_schema",
-                "sample_queries",
-                "error_queries",
-                "data_dictionary",
-                "data_model",
-                "previous_call_error",
-                "previous_vds_payload"
-            ],
-            template=vds_query
-        )
-
-        # 2. Instantiate language model to execute the prompt to write a VizQL Data Service query
-        query_writer = select_model(
-            provider=env_vars["model_provider"],
-            model_name=env_vars["tooling_llm_model"],
-            temperature=0
-        )
-
-        # 3. Query data from Tableau's VizQL Data Service using the AI written payload
-        def get_data(vds_query):
-            payload = vds_query.content
-
-            try:
-                data = get_headlessbi_data(
-                    api_key = tableau_auth,
-                    url = domain,
-                    datasource_luid = tableau_datasource,
-                    payload = payload
-                )
-
-                return {
-                    "vds_query": payload,
-                    "data_table": data,
-                }
-            except Exception as e:
-                query_error_message = f"""
-                Tableau's VizQL Data Service return an error for the generated query:
-
-                {str(vds_query.content)}
-
-                The user_input used to write this query was:
-
-                {str(user_input)}
-
-                This was the error:
-
-                {str(e)}
-
-                Consider retrying this tool with the same inputs but include the previous query
-                causing the error and the error itself for the tool to correct itself on a retry.
-                If the error was an empty array, this usually indicates an incorrect filter value
-                was applied, thus returning no data
-                """
-
-                raise ToolException(query_error_message)
-
-        # 4. Prepare inputs for a structured response to the calling Agent
-        def response_inputs(input):
-            metadata = query_writing_data.get('meta')
-            data = {
-                "query": input.get('vds_query', ''),
-                "data_source_name": metadata.get('datasource_name'),
-                "data_source_description": metadata.get('datasource_description'),
-                "data_source_maintainer": metadata.get('datasource_owner'),
-                "data_table": input.get('data_table', ''),
-            }
-            inputs = prepare_prompt_inputs(data=data, user_string=user_input)
-            return inputs
-
-        # 5. Response template for the Agent with further instructions
-        response_prompt = PromptTemplate(
-            input_variables=[
-                "data_source_name",
-                "data_source_description",
-                "data_source_maintainer",
-                "vds_query",
-                "data_table",
-                "user_input"
-            ],
-            template=vds_response
-        )
-
-        # this chain defines the flow of data through the system
-        chain = query_writing_prompt | query_writer | get_data | response_inputs | response_prompt
-
-
-        # invoke the chain to generate a query and obtain data
-        vizql_data = chain.invoke(query_writing_data)
-
-        # Return the structured output
-        return vizql_data
+        # query the configured data source and return the structured output, with credentials to access Tableau
+        # environment on behalf of the user
+        return with_session(env_vars, lambda tableau_auth: query_datasource(
+            user_input=user_input,
+            api_key=tableau_auth,
+            domain=env_vars["domain"],
+            datasource_luid=env_vars["datasource_luid"],
+            query_writer=query_writer.get(),
+            tooling_llm_model=env_vars["tooling_llm_model"],
+            previous_call_error=previous_call_error,
+            previous_vds_payload=previous_vds_payload,
+            query_planner=env_vars["query_planner"]
+        ))
+
+    if env_vars["query_planner"]:
+        simple_datasource_qa.description += PLANNER_DESCRIPTION
 
     return simple_datasource_qa
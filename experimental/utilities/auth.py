@@ -1,11 +1,19 @@
 
-from typing import Dict, Any, List
-import requests
+import time
+import threading
+from typing import Dict, Any, List, Tuple
 import jwt
 from datetime import datetime, timedelta, timezone
 from uuid import uuid4
 
-from experimental.utilities.utils import http_post
+from experimental.utilities.utils import http_post, http_session
+from experimental.utilities.metrics import record_cache
+
+# sessions are valid for 2 hours, cached ones are refreshed well before they expire
+SESSION_TTL_SECONDS = 90 * 60
+
+_sessions: Dict[Tuple, Tuple[float, Dict[str, Any]]] = {}
+_sessions_lock = threading.Lock()
 
 def jwt_connected_app(
         tableau_domain: str,
@@ -73,7 +81,7 @@ def jwt_connected_app(
         }
     }
 
-    response = requests.post(endpoint, headers=headers, json=payload)
+    response = http_session().post(endpoint, headers=headers, json=payload)
 
     # Check if the request was successful (status code 200)
     if response.status_code == 200:
@@ -162,3 +170,65 @@ async def jwt_connected_app_async(
             f"Status code: {response['status']}. Response: {response['data']}"
         )
         raise RuntimeError(error_message)
+
+
+def get_tableau_session(
+        tableau_domain: str,
+        tableau_site: str,
+        tableau_api: str,
+        tableau_user: str,
+        jwt_client_id: str,
+        jwt_secret_id: str,
+        jwt_secret: str,
+        scopes: List[str],
+        ttl_seconds: float = SESSION_TTL_SECONDS
+) -> Dict[str, Any]:
+    """
+    Returns a cached sign-in response for the same site, user, connected app and scopes, signing in with
+    `jwt_connected_app` when there is no session younger than `ttl_seconds`.
+
+    Args:
+        ttl_seconds (float): maximum age of a cached session, defaults to `SESSION_TTL_SECONDS`.
+        The remaining arguments are the same as `jwt_connected_app`.
+
+    Returns:
+        Dict[str, Any]: the Tableau authentication response including the session token.
+    """
+    key = (tableau_domain, tableau_site, tableau_api, tableau_user, jwt_client_id, tuple(sorted(scopes)))
+    with _sessions_lock:
+        cached = _sessions.get(key)
+    if cached and time.monotonic() - cached[0] < ttl_seconds:
+        record_cache("tableau_session", hit=True)
+        return cached[1]
+
+    record_cache("tableau_session", hit=False)
+    session = jwt_connected_app(
+        tableau_domain=tableau_domain,
+        tableau_site=tableau_site,
+        tableau_api=tableau_api,
+        tableau_user=tableau_user,
+        jwt_client_id=jwt_client_id,
+        jwt_secret_id=jwt_secret_id,
+        jwt_secret=jwt_secret,
+        scopes=scopes
+    )
+    with _sessions_lock:
+        _sessions[key] = (time.monotonic(), session)
+    return session
+
+
+def session_token(session: Dict[str, Any]) -> str:
+    return session.get('credentials', {}).get('token')
+
+
+def invalidate_tableau_session(token: str):
+    """Drops the cached sessions holding a token Tableau rejected, the next call signs in again"""
+    with _sessions_lock:
+        for key in [key for key, (_, session) in _sessions.items() if session_token(session) == token]:
+            del _sessions[key]
+
+
+def invalidate_tableau_sessions():
+    """Drops every cached session, for example after credentials are rotated"""
+    with _sessions_lock:
+        _sessions.clear()
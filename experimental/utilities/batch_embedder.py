@@ -0,0 +1,235 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple, TypeVar
+
+from langchain_core.embeddings import Embeddings
+
+from experimental.utilities.telemetry import count_tokens
+
+
+"""
+BATCH EMBEDDER
+
+Embedding APIs accept many texts per request, but callers tend to embed one text at a time or send one large
+serial pass. `BatchEmbedder` wraps any LangChain `Embeddings` and, for document batches:
+
+1. packs texts in input order into requests of at most `max_batch_texts` texts and `max_batch_tokens` tokens
+2. sends the requests concurrently, at most `EMBED_CONCURRENCY` at a time
+3. spaces requests with a limiter shared by every embedder of the provider, sized by EMBED_REQUESTS_PER_MINUTE
+   and EMBED_TOKENS_PER_MINUTE
+4. retries requests refused with a 429 after the delay the API asks for, or an exponential backoff with jitter
+
+Vectors are returned in the order of the input texts. Query embeddings go through the same limiter and retries.
+"""
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# OpenAI accepts 2048 inputs and 300k tokens per request, smaller requests run concurrently and fail cheaper
+MAX_BATCH_TEXTS = 256
+MAX_BATCH_TOKENS = 100_000
+
+# embedding requests in flight per call
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", 4))
+
+# attempts of a request refused for rate limits, and the first backoff delay
+MAX_ATTEMPTS = 6
+BACKOFF_SECONDS = 1.0
+
+
+class RateLimiter:
+    """
+    Token buckets holding a minute of requests and of tokens of a provider, so bursts go out at once and sustained
+    load is spaced out. Callers reserve capacity and wait outside of the lock.
+
+    Args:
+        requests_per_minute (float): requests allowed per minute, unlimited when 0.
+        tokens_per_minute (float): tokens allowed per minute, unlimited when 0.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = requests_per_minute
+        self._tokens = tokens_per_minute
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        """Reserves capacity for one request and returns the seconds to wait before sending it"""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._updated = now
+            wait = max(0.0, self._paused_until - now)
+            if self.requests_per_minute:
+                self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+                self._requests -= 1
+                wait = max(wait, -self._requests * 60 / self.requests_per_minute)
+            if self.tokens_per_minute:
+                self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+                self._tokens -= tokens
+                wait = max(wait, -self._tokens * 60 / self.tokens_per_minute)
+            return wait
+
+    def pause(self, seconds: float):
+        """Delays every later request, when the provider answers with a 429"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def rate_limiter(provider: str) -> RateLimiter:
+    """The limiter shared by every embedder of a provider"""
+    with _limiters_lock:
+        if provider not in _limiters:
+            _limiters[provider] = RateLimiter(
+                requests_per_minute=float(os.environ.get("EMBED_REQUESTS_PER_MINUTE", 3000)),
+                tokens_per_minute=float(os.environ.get("EMBED_TOKENS_PER_MINUTE", 1_000_000))
+            )
+        return _limiters[provider]
+
+
+def retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """Seconds to wait before retrying a request that raised `error`, None when it is not a rate limit error"""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status != 429 and "rate limit" not in str(error).lower():
+        return None
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return BACKOFF_SECONDS * 2 ** attempt * (0.5 + random.random())
+
+
+def pack_batches(
+    texts: Sequence[str],
+    max_texts: int = MAX_BATCH_TEXTS,
+    max_tokens: int = MAX_BATCH_TOKENS,
+    model_name: str = "text-embedding-3-small"
+) -> List[Tuple[List[int], int]]:
+    """
+    Groups consecutive texts into batches under both limits, a text longer than `max_tokens` gets a batch of its
+    own.
+
+    Returns:
+        List[Tuple[List[int], int]]: positions of the texts of each batch and its number of tokens.
+    """
+    batches, batch, tokens = [], [], 0
+    for position, text in enumerate(texts):
+        text_tokens = count_tokens(text, model_name)
+        if batch and (len(batch) >= max_texts or tokens + text_tokens > max_tokens):
+            batches.append((batch, tokens))
+            batch, tokens = [], 0
+        batch.append(position)
+        tokens += text_tokens
+    if batch:
+        batches.append((batch, tokens))
+    return batches
+
+
+class BatchEmbedder(Embeddings):
+    """
+    Args:
+        embeddings (Embeddings): embeddings sending the requests.
+        provider (str): the provider, embedders of the same provider share a rate limiter.
+        model_name (str): the model, used to count tokens.
+        max_batch_texts (int): texts per request.
+        max_batch_tokens (int): tokens per request.
+        concurrency (int): requests in flight per call.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        provider: str = "openai",
+        model_name: str = "text-embedding-3-small",
+        max_batch_texts: int = MAX_BATCH_TEXTS,
+        max_batch_tokens: int = MAX_BATCH_TOKENS,
+        concurrency: int = EMBED_CONCURRENCY
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_batch_texts = max_batch_texts
+        self.max_batch_tokens = max_batch_tokens
+        self.concurrency = concurrency
+        self.limiter = rate_limiter(provider)
+
+    def _call(self, request: Callable[[], T], tokens: int) -> T:
+        for attempt in range(MAX_ATTEMPTS):
+            time.sleep(self.limiter.reserve(tokens))
+            try:
+                return request()
+            except Exception as e:
+                delay = retry_delay(e, attempt)
+                if delay is None or attempt == MAX_ATTEMPTS - 1:
+                    raise
+                logger.warning(f"Embedding request rate limited, retrying in {delay:.1f}s")
+                self.limiter.pause(delay)
+
+    async def _acall(self, request: Callable[[], Awaitable[T]], tokens: int) -> T:
+        for attempt in range(MAX_ATTEMPTS):
+            await asyncio.sleep(self.limiter.reserve(tokens))
+            try:
+                return await request()
+            except Exception as e:
+                delay = retry_delay(e, attempt)
+                if delay is None or attempt == MAX_ATTEMPTS - 1:
+                    raise
+                logger.warning(f"Embedding request rate limited, retrying in {delay:.1f}s")
+                self.limiter.pause(delay)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = list(texts)
+        batches = pack_batches(texts, self.max_batch_texts, self.max_batch_tokens, self.model_name)
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+
+        def run(batch: List[int], tokens: int):
+            inputs = [texts[position] for position in batch]
+            for position, vector in zip(batch, self._call(lambda: self.embeddings.embed_documents(inputs), tokens)):
+                vectors[position] = vector
+
+        if len(batches) <= 1 or self.concurrency <= 1:
+            for batch, tokens in batches:
+                run(batch, tokens)
+            return vectors
+
+        workers = min(self.concurrency, len(batches))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as executor:
+            futures = [executor.submit(contextvars.copy_context().run, run, *batch) for batch in batches]
+            for future in futures:
+                future.result()
+        return vectors
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = list(texts)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+
+        async def run(batch: List[int], tokens: int):
+            inputs = [texts[position] for position in batch]
+            async with semaphore:
+                embedded = await self._acall(lambda: self.embeddings.aembed_documents(inputs), tokens)
+            for position, vector in zip(batch, embedded):
+                vectors[position] = vector
+
+        batches = pack_batches(texts, self.max_batch_texts, self.max_batch_tokens, self.model_name)
+        await asyncio.gather(*(run(batch, tokens) for batch, tokens in batches))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call(lambda: self.embeddings.embed_query(text), count_tokens(text, self.model_name))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self._acall(lambda: self.embeddings.aembed_query(text), count_tokens(text, self.model_name))
@@ -0,0 +1,213 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from experimental.utilities.lazy import register
+from experimental.utilities.batch_embedder import BatchEmbedder
+from experimental.utilities.metrics import record_cache
+from experimental.utilities import models
+
+
+"""
+EMBEDDING CACHE
+
+Agents repeat or slightly rephrase catalog searches within a session and across users, and every search embeds
+its query again. `CachedEmbeddings` wraps any LangChain `Embeddings` with two cache tiers keyed by provider, model
+and normalized text (whitespace collapsed, case folded):
+
+1. an in-memory LRU of `max_entries` vectors
+2. an optional SQLite file shared by processes and kept across restarts, vectors are stored as float32
+
+Lookups are reported to the `embeddings` cache metrics along with the latency saved by hits, estimated from the
+average latency of embedding calls. `cached_embeddings` returns one shared instance per provider and model, its
+misses are embedded by a `BatchEmbedder`.
+"""
+
+# vectors kept in memory per model, a 1536 dimension vector takes about 12 KB
+MAX_CACHED_EMBEDDINGS = 10_000
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Args:
+        embeddings (Embeddings): embeddings computing vectors on cache misses.
+        namespace (str): identifies the provider and model so vectors of different models are never mixed.
+        max_entries (int): vectors kept in memory.
+        path (Optional[str]): SQLite file of the on-disk tier, memory only when None.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        namespace: str,
+        max_entries: int = MAX_CACHED_EMBEDDINGS,
+        path: Optional[str] = None
+    ):
+        self.embeddings = embeddings
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.path = path
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # average seconds per embedded text, used to estimate the latency saved by hits
+        self._seconds_per_text: Optional[float] = None
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def _key(self, text: str, kind: str) -> str:
+        # some models embed queries and documents differently, their vectors are cached apart
+        return hashlib.sha256(f"{self.namespace}\0{kind}\0{normalize_text(text)}".encode()).hexdigest()
+
+    def _remember(self, key: str, vector: List[float]):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+            missing = [key for key in keys if key not in found]
+            if self._db is not None and missing:
+                placeholders = ",".join("?" * len(missing))
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", missing
+                ).fetchall()
+            else:
+                rows = []
+        for key, blob in rows:
+            vector = array("f", blob).tolist()
+            found[key] = vector
+            self._remember(key, vector)
+        return found
+
+    def _store(self, vectors: Dict[str, List[float]]):
+        for key, vector in vectors.items():
+            self._remember(key, vector)
+        if self._db is not None and vectors:
+            with self._lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, array("f", vector).tobytes()) for key, vector in vectors.items()]
+                )
+
+    def _observe(self, seconds: float, texts: int):
+        per_text = seconds / max(texts, 1)
+        previous = self._seconds_per_text
+        self._seconds_per_text = per_text if previous is None else 0.9 * previous + 0.1 * per_text
+
+    def _report(self, hits: int, misses: int):
+        if hits:
+            record_cache("embeddings", hit=True, saved_seconds=hits * (self._seconds_per_text or 0), count=hits)
+        if misses:
+            record_cache("embeddings", hit=False, count=misses)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text, "document") for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+        # texts repeated in the batch are embedded once
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            started = time.perf_counter()
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            self._observe(time.perf_counter() - started, len(missing))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store(computed)
+            found.update(computed)
+        self._report(len(texts) - len(missing), len(missing))
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text, "query")
+        found = self._lookup([key])
+        if key in found:
+            self._report(1, 0)
+            return found[key]
+        started = time.perf_counter()
+        vector = self.embeddings.embed_query(text)
+        self._observe(time.perf_counter() - started, 1)
+        self._store({key: vector})
+        self._report(0, 1)
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text, "document") for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            started = time.perf_counter()
+            vectors = await self.embeddings.aembed_documents(list(missing.values()))
+            self._observe(time.perf_counter() - started, len(missing))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store(computed)
+            found.update(computed)
+        self._report(len(texts) - len(missing), len(missing))
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self._key(text, "query")
+        found = self._lookup([key])
+        if key in found:
+            self._report(1, 0)
+            return found[key]
+        started = time.perf_counter()
+        vector = await self.embeddings.aembed_query(text)
+        self._observe(time.perf_counter() - started, 1)
+        self._store({key: vector})
+        self._report(0, 1)
+        return vector
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def cached_embeddings(provider: Optional[str] = None, model_name: Optional[str] = None) -> CachedEmbeddings:
+    """
+    Returns the shared cached embeddings of a provider and model, built once per process. The on-disk tier is
+    enabled by setting EMBEDDING_CACHE_PATH.
+
+    Args:
+        provider (Optional[str]): model vendor such as `openai` or `azure`, defaults to MODEL_PROVIDER.
+        model_name (Optional[str]): embedding model, defaults to EMBEDDING_MODEL.
+
+    Returns:
+        CachedEmbeddings: embeddings shared by every retriever and chain using the same model.
+    """
+    provider = provider or os.environ.get("MODEL_PROVIDER", "openai")
+    model_name = model_name or os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small")
+
+    def build():
+        return CachedEmbeddings(
+            # resolved at build time so replacements of `select_embeddings` apply, misses are sent in concurrent
+            # rate limited batches
+            embeddings=BatchEmbedder(
+                models.select_embeddings(provider=provider, model_name=model_name),
+                provider=provider,
+                model_name=model_name
+            ),
+            namespace=f"{provider}:{model_name}",
+            path=os.environ.get("EMBEDDING_CACHE_PATH") or None
+        )
+
+    return register(f"embeddings:{provider}:{model_name}", build).get()
@@ -0,0 +1,212 @@
+import re
+import json
+import math
+import logging
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+"""
+HYBRID SEARCH
+
+Dense retrieval ranks documents by meaning and often misses searches for exact names such as a data source or
+workbook title, which makes the agent retry with rephrased queries. `HybridRetriever` runs the vector search and
+a BM25 search over an inverted index of the same documents, then merges both rankings with reciprocal-rank
+fusion so documents ranked high by either search come first.
+
+Documents indexed with LlamaIndex keep their content in `_node_content` as a JSON node, only its `text` is
+indexed for BM25.
+"""
+
+logger = logging.getLogger(__name__)
+
+# BM25 term frequency saturation and document length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# reciprocal-rank fusion constant, higher values flatten the weight of the top ranks
+RRF_K = 60
+
+# candidates taken from each search per document returned
+CANDIDATE_FACTOR = 3
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word and number tokens, camelCase and snake_case names are split into their words"""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def searchable_text(text: str) -> str:
+    """The text of a document, unwrapped from its `_node_content` JSON node when it has one"""
+    if text.startswith("{"):
+        try:
+            node = json.loads(text)
+        except ValueError:
+            return text
+        if isinstance(node, dict) and isinstance(node.get("text"), str):
+            return node["text"]
+    return text
+
+
+class BM25Index:
+    """
+    Inverted index ranking documents with Okapi BM25.
+
+    Args:
+        documents (Iterable[Document]): the documents, their `id` identifies them in fused rankings.
+    """
+
+    def __init__(self, documents: Iterable[Document], k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.documents: List[Document] = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._lengths: List[int] = []
+        for document in documents:
+            terms = Counter(tokenize(searchable_text(document.page_content)))
+            position = len(self.documents)
+            self.documents.append(document)
+            self._lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                self._postings.setdefault(term, []).append((position, frequency))
+        self._average_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def idf(self, term: str) -> float:
+        frequency = len(self._postings.get(term, ()))
+        return math.log(1 + (len(self.documents) - frequency + 0.5) / (frequency + 0.5))
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[Document, float]]:
+        """The `k` documents with the highest BM25 score for the query, documents sharing no term are left out"""
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for position, frequency in postings:
+                length_norm = 1 - self.b + self.b * self._lengths[position] / self._average_length
+                scores[position] = scores.get(position, 0.0) + idf * frequency * (self.k1 + 1) / (
+                    frequency + self.k1 * length_norm
+                )
+        ranked = sorted(scores.items(), key=lambda item: -item[1])[:k]
+        return [(self.documents[position], score) for position, score in ranked]
+
+
+class VersionedBM25Index:
+    """
+    BM25 index over documents that are read again once their version changes, such as the documents of a snapshot
+    that was exported again. Searched like `BM25Index`.
+
+    Args:
+        read_documents (Callable[[], Iterable[Document]]): reads the current documents.
+        version (Callable[[], Any]): the current version of the documents.
+    """
+
+    def __init__(self, read_documents: Callable[[], Iterable[Document]], version: Callable[[], Any]):
+        self._read_documents = read_documents
+        self._current_version = version
+        self._lock = threading.Lock()
+        # the version is read before the documents so documents replaced meanwhile are read on the next search
+        self._version = version()
+        self._index = BM25Index(read_documents())
+
+    @property
+    def index(self) -> BM25Index:
+        version = self._current_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    try:
+                        self._index = BM25Index(self._read_documents())
+                        self._version = version
+                    except (OSError, ValueError) as e:
+                        # a snapshot directory is briefly missing while it is swapped in, retried on next search
+                        logger.warning(f"Reading the documents of version {version} failed, serving the previous: {e}")
+        return self._index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[Document, float]]:
+        return self.index.search(query, k=k)
+
+
+def document_key(document: Document) -> str:
+    return document.id or document.page_content
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Document]], k: int = RRF_K) -> List[Tuple[Document, float]]:
+    """
+    Merges rankings of documents, each document scores the sum of 1 / (k + rank) over the rankings it appears in.
+
+    Args:
+        rankings (Sequence[Sequence[Document]]): the rankings, best first, documents are matched by id or content.
+        k (int): the fusion constant.
+
+    Returns:
+        List[Tuple[Document, float]]: the documents by decreasing fused score, first instance of each.
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            key = document_key(document)
+            documents.setdefault(key, document)
+            scores[key] = scores.get(key, 0.0) + 1 / (k + rank)
+    return [(documents[key], score) for key, score in sorted(scores.items(), key=lambda item: -item[1])]
+
+
+class HybridRetriever(BaseRetriever):
+    """Retriever fusing the results of a vector retriever with a BM25 search over the same documents"""
+
+    vector_retriever: Any
+    lexical_index: Any
+    k: int = 6
+    candidates: Optional[int] = None
+
+    @property
+    def vectorstore(self):
+        return self.vector_retriever.vectorstore
+
+    def _fuse(self, query: str, dense: List[Document], k: Optional[int] = None) -> List[Document]:
+        k = k or self.k
+        candidates = self.candidates or k * CANDIDATE_FACTOR
+        lexical = [document for document, _ in self.lexical_index.search(query, k=candidates)]
+        return [document for document, _ in reciprocal_rank_fusion([dense, lexical])[:k]]
+
+    def search_by_vector(self, query: str, vector: List[float], k: Optional[int] = None) -> List[Document]:
+        """Same as invoking the retriever, with the query embedded beforehand"""
+        k = k or self.k
+        candidates = self.candidates or k * CANDIDATE_FACTOR
+        dense = [
+            document
+            for document, _ in self.vectorstore.similarity_search_by_vector_with_score(vector, k=candidates)
+        ]
+        return self._fuse(query, dense, k)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        dense = self.vector_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return self._fuse(query, dense)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        dense = await self.vector_retriever.ainvoke(query, config={"callbacks": run_manager.get_child()})
+        return self._fuse(query, dense)
+
+
+def lexical_documents(records: Iterable[Dict[str, Any]]) -> List[Document]:
+    """Documents of snapshot records holding an id, text and metadata"""
+    return [
+        Document(id=record["id"], page_content=record["text"], metadata=dict(record.get("metadata") or {}))
+        for record in records
+    ]
@@ -0,0 +1,100 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Generic, Iterable, Optional, TypeVar
+
+
+"""
+LAZY REGISTRY
+
+Tools and agents are defined at import time so that `langgraph.json` can reference them, but the clients they
+depend on (model clients, embeddings, vector indexes) are expensive to build and may need the network. Wrapping
+those clients in `Lazy` defers building them until the first invocation, and registering them by name allows
+`prewarm()` to build all of them concurrently when eager startup is preferred.
+"""
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class Lazy(Generic[T]):
+    """A value built on first access by calling `factory`, thread safe and built at most once"""
+
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self.name = name
+        self.factory = factory
+        self._value: Optional[T] = None
+        self._built = False
+        self._lock = threading.Lock()
+
+    @property
+    def built(self) -> bool:
+        return self._built
+
+    def get(self) -> T:
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self._value = self.factory()
+                    self._built = True
+        return self._value
+
+
+_registry: Dict[str, Lazy] = {}
+_registry_lock = threading.Lock()
+
+
+def register(name: str, factory: Callable[[], T]) -> Lazy[T]:
+    """
+    Registers a lazily built value under a unique name. Registering a name again returns the existing entry so
+    modules that are imported more than once share clients.
+
+    Args:
+        name (str): registry key such as `model:superstore` or `retriever:superstore-metrics`.
+        factory (Callable): builds the value, called once on first use or during `prewarm`.
+
+    Returns:
+        Lazy: the registered entry, call `get()` to obtain the value.
+    """
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Lazy(name, factory)
+        return _registry[name]
+
+
+def registered() -> Dict[str, Lazy]:
+    with _registry_lock:
+        return dict(_registry)
+
+
+def prewarm(names: Optional[Iterable[str]] = None, max_workers: int = 8) -> Dict[str, Any]:
+    """
+    Builds registered values concurrently on a thread pool.
+
+    Args:
+        names (Optional[Iterable[str]]): registry keys to build, defaults to every registered entry.
+        max_workers (int): maximum number of values built at the same time.
+
+    Returns:
+        Dict[str, Any]: build time in milliseconds per name, or the exception raised while building it.
+    """
+    entries = registered()
+    selected = [entries[name] for name in names] if names is not None else list(entries.values())
+
+    def build(entry: Lazy):
+        started = time.perf_counter()
+        try:
+            entry.get()
+        except Exception as e:
+            logger.warning(f"Pre-warm of '{entry.name}' failed: {e}")
+            return entry.name, e
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Pre-warmed '{entry.name}' in {elapsed_ms:.0f} ms")
+        return entry.name, elapsed_ms
+
+    if not selected:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(selected))) as executor:
+        return dict(executor.map(build, selected))
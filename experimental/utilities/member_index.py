@@ -0,0 +1,350 @@
+import os
+import copy
+import time
+import bisect
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from experimental.utilities.vizql_data_service import ResponseTooLargeError, query_vds
+
+
+"""
+DIMENSION MEMBER INDEX
+
+The query writer only sees a few sample values per field and has to guess filter values, wrong guesses return
+empty results and cost a retry. `MemberIndexes` builds, per session and data source, an index of the members of
+every STRING field with distinct-value VDS queries run in the background. Before a query is sent,
+`resolve_query_members` replaces SET filter values that are not members with the member they most likely refer to:
+same text ignoring case, a unique prefix match or the closest member by trigram similarity.
+
+Indexes are kept per Tableau session so the permissions of different users are never mixed, under row-level
+security a member only one user can see must not replace the filter values of another. Indexes are refreshed in
+the background every `MEMBER_INDEX_REFRESH_SECONDS`, only fields whose members changed are rebuilt. Refreshes
+build new field indexes and swap them in with a single assignment, lookups running meanwhile keep reading the
+previous ones. Lookups never wait for a build, queries sent before the index is ready are left unchanged.
+"""
+
+logger = logging.getLogger(__name__)
+
+# members are reloaded in the background once the index is older than this
+MEMBER_INDEX_REFRESH_SECONDS = float(os.environ.get("MEMBER_INDEX_REFRESH_SECONDS", 30 * 60))
+
+# indexes kept per session and data source, least recently used first evicted
+MAX_MEMBER_INDEXES = 64
+
+# fields with more members are not indexed, they are identifiers rather than categories
+MAX_MEMBERS_PER_FIELD = 20_000
+
+# distinct-value queries running at the same time while building an index
+BUILD_WORKERS = 4
+
+# minimum trigram similarity for a member to replace a filter value
+MIN_SIMILARITY = 0.45
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text.lower()} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Members of one field with exact, prefix and fuzzy lookup"""
+
+    def __init__(self, members: Iterable[str] = ()):
+        self._members: Dict[int, str] = {}
+        self._ids: Dict[str, int] = {}
+        self._grams: Dict[int, Set[str]] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._lower: Dict[str, List[str]] = {}
+        self._sorted: List[str] = []
+        self._next_id = 0
+        self.update(members)
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def __contains__(self, member: str) -> bool:
+        return member in self._ids
+
+    def members(self) -> Set[str]:
+        return set(self._ids)
+
+    def update(self, members: Iterable[str]) -> Tuple[int, int]:
+        """
+        Replaces the members of the index, only the difference with the current members is applied. Not safe while
+        other threads look up members, published indexes are replaced rather than updated.
+
+        Returns:
+            Tuple[int, int]: number of members added and removed.
+        """
+        members = {member for member in members if isinstance(member, str)}
+        added = members - self._ids.keys()
+        removed = self._ids.keys() - members
+
+        for member in removed:
+            member_id = self._ids.pop(member)
+            del self._members[member_id]
+            for gram in self._grams.pop(member_id):
+                self._postings[gram].discard(member_id)
+            same_case = self._lower[member.lower()]
+            same_case.remove(member)
+            if not same_case:
+                del self._lower[member.lower()]
+
+        for member in added:
+            member_id = self._next_id
+            self._next_id += 1
+            self._members[member_id] = member
+            self._ids[member] = member_id
+            self._grams[member_id] = trigrams(member)
+            for gram in self._grams[member_id]:
+                self._postings.setdefault(gram, set()).add(member_id)
+            self._lower.setdefault(member.lower(), []).append(member)
+
+        if added or removed:
+            self._sorted = sorted(self._lower)
+        return len(added), len(removed)
+
+    def prefix(self, term: str, limit: int = 10) -> List[str]:
+        """Members starting with `term`, ignoring case"""
+        term = term.lower()
+        start = bisect.bisect_left(self._sorted, term)
+        matches = []
+        for lowered in self._sorted[start:]:
+            if not lowered.startswith(term) or len(matches) >= limit:
+                break
+            matches.extend(self._lower[lowered])
+        return matches[:limit]
+
+    def similar(self, term: str, limit: int = 5, min_similarity: float = 0.0) -> List[Tuple[str, float]]:
+        """Members ranked by the Jaccard similarity of their trigrams with `term`"""
+        grams = trigrams(term)
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for member_id in self._postings.get(gram, ()):
+                shared[member_id] = shared.get(member_id, 0) + 1
+        scored = [
+            (self._members[member_id], count / (len(grams) + len(self._grams[member_id]) - count))
+            for member_id, count in shared.items()
+        ]
+        scored = [item for item in scored if item[1] >= min_similarity]
+        return sorted(scored, key=lambda item: -item[1])[:limit]
+
+    def resolve(self, term: str, min_similarity: float = MIN_SIMILARITY) -> Optional[str]:
+        """
+        The member `term` most likely refers to.
+
+        Returns:
+            Optional[str]: the member, None when no member is close enough or the choice is ambiguous.
+        """
+        if term in self._ids:
+            return term
+        same_case = self._lower.get(term.lower())
+        if same_case:
+            return same_case[0]
+        prefixed = self.prefix(term, limit=2)
+        if len(prefixed) == 1:
+            return prefixed[0]
+        ranked = self.similar(term, limit=2, min_similarity=min_similarity)
+        if not ranked or (len(ranked) > 1 and ranked[0][1] == ranked[1][1]):
+            return None
+        return ranked[0][0]
+
+
+class DataSourceMembers:
+    """Member indexes of the STRING fields of one data source"""
+
+    def __init__(self):
+        self.fields: Dict[str, TrigramIndex] = {}
+        self.built_at: Optional[float] = None
+        self.building = False
+        self.lock = threading.Lock()
+
+    def resolve(self, field: str, term: str) -> Optional[str]:
+        index = self.fields.get(field)
+        return index.resolve(term) if index is not None else None
+
+
+def _distinct_members(api_key: str, url: str, datasource_luid: str, field: str) -> Optional[List[str]]:
+    try:
+        response = query_vds(
+            api_key=api_key,
+            datasource_luid=datasource_luid,
+            url=url,
+            query={"fields": [{"fieldCaption": field}]}
+        )
+    except ResponseTooLargeError:
+        return None
+    members = [row.get(field) for row in response.get("data") or []]
+    return members if len(members) <= MAX_MEMBERS_PER_FIELD else None
+
+
+class MemberIndexes:
+    """
+    Member indexes per Tableau session and data source, built and refreshed in the background.
+
+    Args:
+        refresh_seconds (float): age after which an index is refreshed.
+        max_indexes (int): sessions and data sources kept.
+    """
+
+    def __init__(self, refresh_seconds: float = MEMBER_INDEX_REFRESH_SECONDS, max_indexes: int = MAX_MEMBER_INDEXES):
+        self.refresh_seconds = refresh_seconds
+        self.max_indexes = max_indexes
+        self._indexes: "OrderedDict[Tuple[str, str, str], DataSourceMembers]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, url: str, api_key: str, datasource_luid: str) -> Optional[DataSourceMembers]:
+        with self._lock:
+            index = self._indexes.get((url, api_key, datasource_luid))
+            if index is not None:
+                self._indexes.move_to_end((url, api_key, datasource_luid))
+        return index
+
+    def get(self, url: str, api_key: str, datasource_luid: str) -> Optional[DataSourceMembers]:
+        """The index of a data source for a session once it was built at least once, None before"""
+        index = self._lookup(url, api_key, datasource_luid)
+        return index if index is not None and index.built_at is not None else None
+
+    def build(self, url: str, datasource_luid: str, api_key: str, data_model: List[Dict[str, Any]]) -> DataSourceMembers:
+        """
+        Builds or refreshes the index of a data source and waits for it, fields are queried concurrently.
+
+        Args:
+            url (str): The base URL for the API endpoints.
+            datasource_luid (str): The unique identifier of the datasource.
+            api_key (str): The API key for authentication, the index only holds members visible to this session.
+            data_model (List[Dict]): fields returned by VDS read-metadata, STRING fields are indexed.
+
+        Returns:
+            DataSourceMembers: the updated index.
+        """
+        key = (url, api_key, datasource_luid)
+        with self._lock:
+            index = self._indexes.setdefault(key, DataSourceMembers())
+            self._indexes.move_to_end(key)
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        with index.lock:
+            if index.building:
+                return index
+            index.building = True
+
+        try:
+            fields = [field["fieldCaption"] for field in data_model if field.get("dataType") == "STRING"]
+            with ThreadPoolExecutor(max_workers=BUILD_WORKERS, thread_name_prefix="member-index") as executor:
+                futures = {
+                    field: executor.submit(
+                        contextvars.copy_context().run, _distinct_members, api_key, url, datasource_luid, field
+                    )
+                    for field in fields
+                }
+                # field indexes read by lookups are never changed, changed fields get a new index and every field
+                # is published at once
+                fields, changes = {}, 0
+                for field, future in futures.items():
+                    current = index.fields.get(field)
+                    try:
+                        members = future.result()
+                    except Exception as e:
+                        logger.warning(f"Could not list members of '{field}' in {datasource_luid}: {e}")
+                        if current is not None:
+                            fields[field] = current
+                        continue
+                    if members is None:
+                        continue
+                    members = {member for member in members if isinstance(member, str)}
+                    if current is not None and members == current.members():
+                        fields[field] = current
+                        continue
+                    fields[field] = TrigramIndex(members)
+                    changes += len(members ^ current.members()) if current is not None else len(members)
+            index.fields = fields
+            index.built_at = time.monotonic()
+            logger.info(f"Member index of {datasource_luid}: {len(index.fields)} fields, {changes} members changed")
+        finally:
+            index.building = False
+        return index
+
+    def ensure(self, url: str, datasource_luid: str, api_key: str, data_model: List[Dict[str, Any]]):
+        """
+        Starts building or refreshing the index of a data source for a session in the background when it is missing
+        or old
+        """
+        index = self._lookup(url, api_key, datasource_luid)
+        if index is not None and (index.building or (
+            index.built_at is not None and time.monotonic() - index.built_at < self.refresh_seconds
+        )):
+            return
+        threading.Thread(
+            target=self.build,
+            args=(url, datasource_luid, api_key, data_model),
+            name="member-index",
+            daemon=True
+        ).start()
+
+
+MEMBER_INDEXES = MemberIndexes()
+
+
+def resolve_query_members(query: Dict[str, Any], members: Optional[DataSourceMembers]) -> Dict[str, Any]:
+    """
+    Replaces SET filter values of a VDS query that are not members of their field with the member they most
+    likely refer to, values without a likely member are kept.
+
+    Args:
+        query (Dict[str, Any]): the VDS query written by the query writer.
+        members (Optional[DataSourceMembers]): the member index of the data source, the query is returned as is
+            when None.
+
+    Returns:
+        Dict[str, Any]: the query, a corrected copy when any value was replaced.
+    """
+    if members is None or not query.get("filters"):
+        return query
+
+    resolved = None
+    for position, query_filter in enumerate(query["filters"]):
+        field = query_filter.get("field", {})
+        if query_filter.get("filterType") != "SET" or field.get("function") or field.get("calculation"):
+            continue
+        index = members.fields.get(field.get("fieldCaption"))
+        if index is None:
+            continue
+        values = query_filter.get("values") or []
+        corrected = [
+            value if not isinstance(value, str) or value in index else (index.resolve(value) or value)
+            for value in values
+        ]
+        if corrected != values:
+            if resolved is None:
+                resolved = copy.deepcopy(query)
+            resolved["filters"][position]["values"] = corrected
+            logger.info(f"Resolved filter values of '{field.get('fieldCaption')}': {values} -> {corrected}")
+    return resolved if resolved is not None else query
+
+
+def resolved_members_note(queries: List[Dict[str, Any]], resolved_queries: List[Dict[str, Any]]) -> str:
+    """
+    A note telling the agent which filter values `resolve_query_members` replaced, the data then answers the
+    resolved queries rather than the queries written by the query writer. Empty when no value was replaced.
+    """
+    replacements = []
+    for query, resolved in zip(queries, resolved_queries):
+        if resolved is query:
+            continue
+        for written, sent in zip(query["filters"], resolved["filters"]):
+            for value, member in zip(written.get("values") or [], sent.get("values") or []):
+                if value != member:
+                    replacements.append(f"{written['field'].get('fieldCaption')} '{value}' -> '{member}'")
+    if not replacements:
+        return ""
+    return (
+        "\n\nThese filter values are not members of their field and were replaced with the closest member before "
+        f"querying: {', '.join(dict.fromkeys(replacements))}. If a replacement is not what the question meant, "
+        "retry with the intended value."
+    )
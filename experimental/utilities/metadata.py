@@ -1,7 +1,7 @@
 import json
-import requests
-from typing import Dict
+from typing import Dict, List
 from langchain_tableau.utilities.utils import http_post
+from experimental.utilities.utils import http_session, raise_for_session
 
 
 def get_datasource_query(luid):
@@ -144,7 +144,8 @@ def get_data_dictionary(api_key: str, domain: str, datasource_luid: str) -> Dict
         'X-Tableau-Auth': api_key
     }
 
-    response = requests.post(full_url, headers=headers, data=payload)
+    response = http_session().post(full_url, headers=headers, data=payload)
+    raise_for_session(response, f"The Metadata API rejected the session. Response: {response.text}")
     response.raise_for_status()  # Raise an exception for bad status codes
 
     response_data = response.json()
@@ -174,3 +175,54 @@ def get_data_dictionary(api_key: str, domain: str, datasource_luid: str) -> Dict
         # Full raw response for power users
         'raw_graphql_response': json_data
     }
+
+
+def get_published_datasources_query():
+    query = """
+    query publishedDatasourcesCatalog {
+        publishedDatasources {
+          luid
+          name
+          description
+          projectName
+        }
+      }
+    """
+
+    return query
+
+
+def list_published_datasources(api_key: str, domain: str) -> List[Dict]:
+    """
+    Lists the published data sources visible to the session, used to resolve data sources by name
+
+    Args:
+        api_key (str): Tableau session token.
+        domain (str): The domain of the Tableau server.
+
+    Returns:
+        List[Dict]: the luid, name, description and projectName of every published data source.
+    """
+    full_url = f"{domain}/api/metadata/graphql"
+
+    payload = json.dumps({
+        "query": get_published_datasources_query(),
+        "variables": {}
+    })
+
+    headers = {
+        'Content-Type': 'application/json',
+        'Accept': 'application/json',
+        'X-Tableau-Auth': api_key
+    }
+
+    response = http_session().post(full_url, headers=headers, data=payload)
+    raise_for_session(response, f"The Metadata API rejected the session. Response: {response.text}")
+    response.raise_for_status()  # Raise an exception for bad status codes
+
+    response_data = response.json()
+    if 'errors' in response_data:
+        error_message = f"GraphQL errors: {response_data['errors']}"
+        raise RuntimeError(error_message)
+
+    return response_data['data']['publishedDatasources']
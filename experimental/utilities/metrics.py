@@ -0,0 +1,275 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from experimental.utilities.telemetry import REGISTRY as HISTOGRAMS
+
+
+"""
+METRICS
+
+Operational metrics for the agents served through `langgraph.json`: tool invocations, errors by type, cache hit
+rates, in-flight requests, retries and latency histograms per agent and per tool. Metrics are kept in process and
+rendered in the Prometheus text exposition format with `render_prometheus()`, which can be served by
+`start_metrics_server()` or mounted on any existing HTTP server.
+
+Agents record metrics by attaching a `MetricsCallbackHandler` to their graph:
+
+    analytics_agent = create_react_agent(...).with_config(callbacks=[MetricsCallbackHandler("superstore")])
+"""
+
+# error types reported in the `type` label of `agent_errors_total`
+ERROR_AUTH = "auth"
+ERROR_VDS_VALIDATION = "vds_validation"
+ERROR_VDS_SERVER = "vds_server"
+ERROR_LLM = "llm"
+ERROR_TIMEOUT = "timeout"
+ERROR_OTHER = "other"
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class _LabeledValues:
+    """Numeric values keyed by label sets, shared by counters and gauges"""
+
+    def __init__(self, name: str, documentation: str, metric_type: str):
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def _add(self, amount: float, labels: Dict[str, str]):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_LabeledValues):
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation, "counter")
+
+    def inc(self, amount: float = 1, **labels: str):
+        self._add(amount, labels)
+
+
+class Gauge(_LabeledValues):
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation, "gauge")
+
+    def inc(self, amount: float = 1, **labels: str):
+        self._add(amount, labels)
+
+    def dec(self, amount: float = 1, **labels: str):
+        self._add(-amount, labels)
+
+
+TOOL_INVOCATIONS = Counter("agent_tool_invocations_total", "Tool invocations per agent and tool")
+ERRORS = Counter("agent_errors_total", "Errors per agent, tool and error type")
+CACHE_REQUESTS = Counter("agent_cache_requests_total", "Cache lookups per cache and result (hit or miss)")
+CACHE_SAVED = Counter("agent_cache_saved_seconds_total", "Estimated latency saved by cache hits per cache")
+RETRIES = Counter("agent_retries_total", "Tool calls retrying a previous error per agent and tool")
+IN_FLIGHT = Gauge("agent_in_flight_requests", "Requests currently being processed per agent")
+
+METRICS = [TOOL_INVOCATIONS, ERRORS, CACHE_REQUESTS, CACHE_SAVED, RETRIES, IN_FLIGHT]
+
+# histogram names, histograms live in the telemetry registry along with pipeline stage latencies
+REQUEST_LATENCY = "agent_request_latency_ms"
+TOOL_LATENCY = "agent_tool_latency_ms"
+
+
+def record_cache(cache: str, hit: bool, saved_seconds: float = 0, count: int = 1):
+    """Records cache lookups, used by the caches in this project to report hit rates and, when they can estimate
+    it, the latency hits saved. Batched lookups record `count` lookups with the same result at once"""
+    CACHE_REQUESTS.inc(count, cache=cache, result="hit" if hit else "miss")
+    if hit and saved_seconds:
+        CACHE_SAVED.inc(saved_seconds, cache=cache)
+
+
+def cache_hit_ratio(cache: str) -> Optional[float]:
+    hits = CACHE_REQUESTS.value(cache=cache, result="hit")
+    total = hits + CACHE_REQUESTS.value(cache=cache, result="miss")
+    return hits / total if total else None
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    Maps an exception raised by an agent run to one of the error types reported in `agent_errors_total`
+
+    Tableau errors are identified by the messages produced by the utilities in this project, LLM errors by the
+    package of the exception class (openai, anthropic, etc.)
+    """
+    message = str(error)
+    if isinstance(error, TimeoutError):
+        return ERROR_TIMEOUT
+    if "authenticate" in message:
+        return ERROR_AUTH
+    if "VizQL Data Service" in message:
+        if "Status code: 5" in message:
+            return ERROR_VDS_SERVER
+        return ERROR_VDS_VALIDATION
+    module = type(error).__module__.split(".")[0]
+    if module in ("openai", "anthropic", "httpx") or "RateLimit" in type(error).__name__:
+        return ERROR_LLM
+    return ERROR_OTHER
+
+
+def reset_metrics():
+    for metric in METRICS:
+        metric.reset()
+    HISTOGRAMS.reset()
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{key}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render_prometheus() -> str:
+    """Renders all counters, gauges and histograms in the Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+        for labels, value in metric.samples():
+            lines.append(f"{metric.name}{_format_labels(labels)} {_format_value(value)}")
+
+    histograms: Dict[str, list] = {}
+    for histogram in HISTOGRAMS.collect():
+        histograms.setdefault(histogram["name"], []).append(histogram)
+
+    for name, series in histograms.items():
+        lines.append(f"# TYPE {name} histogram")
+        for histogram in series:
+            labels = sorted(histogram["labels"].items())
+            for upper_bound, count in histogram["buckets"]:
+                bucket_labels = labels + [("le", _format_value(upper_bound))]
+                lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Langchain callback handler recording agent metrics. Attach it to a compiled graph with `with_config` so
+    every run of the agent, its model calls and its tool calls are measured.
+    """
+
+    # metrics are recorded synchronously, avoids a thread hop per event on async runs
+    run_inline = True
+
+    def __init__(self, agent: str):
+        self.agent = agent
+        self._runs: Dict[UUID, float] = {}
+        self._tools: Dict[UUID, Tuple[str, float]] = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any):
+        if parent_run_id is None:
+            self._runs[run_id] = time.perf_counter()
+            IN_FLIGHT.inc(agent=self.agent)
+
+    def _end_run(self, run_id: UUID):
+        started = self._runs.pop(run_id, None)
+        if started is not None:
+            IN_FLIGHT.dec(agent=self.agent)
+            HISTOGRAMS.observe(REQUEST_LATENCY, (time.perf_counter() - started) * 1000, agent=self.agent)
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs: Any):
+        self._end_run(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        if run_id in self._runs:
+            ERRORS.inc(agent=self.agent, tool="", type=classify_error(error))
+        self._end_run(run_id)
+
+    def on_tool_start(self, serialized, input_str: str, *, run_id: UUID, inputs: Optional[dict] = None, **kwargs: Any):
+        tool = (serialized or {}).get("name") or kwargs.get("name", "unknown")
+        self._tools[run_id] = (tool, time.perf_counter())
+        TOOL_INVOCATIONS.inc(agent=self.agent, tool=tool)
+        # tools such as simple_datasource_qa receive the previous error when the agent retries a failed call
+        if inputs and inputs.get("previous_call_error"):
+            RETRIES.inc(agent=self.agent, tool=tool)
+
+    def _end_tool(self, run_id: UUID) -> str:
+        tool, started = self._tools.pop(run_id, ("unknown", None))
+        if started is not None:
+            HISTOGRAMS.observe(TOOL_LATENCY, (time.perf_counter() - started) * 1000, agent=self.agent, tool=tool)
+        return tool
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs: Any):
+        self._end_tool(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        tool = self._end_tool(run_id)
+        ERRORS.inc(agent=self.agent, tool=tool, type=classify_error(error))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        ERRORS.inc(agent=self.agent, tool="", type=ERROR_LLM)
+
+    def on_retry(self, retry_state, *, run_id: UUID, **kwargs: Any):
+        RETRIES.inc(agent=self.agent, tool="")
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server(port: int = 9464, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """
+    Serves `GET /metrics` from a daemon thread. Calling it more than once returns the running server.
+
+    Args:
+        port (int): port to listen on, defaults to 9464.
+        host (str): interface to bind, defaults to all interfaces.
+
+    Returns:
+        ThreadingHTTPServer: the running server, call `shutdown()` to stop it.
+    """
+    global _server
+    if _server is None:
+        _server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+        threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server
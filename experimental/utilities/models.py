@@ -1,12 +1,17 @@
 import os
+from typing import Any, Dict, Iterator, AsyncIterator, List, Optional, Sequence
 
-from langchain_openai import ChatOpenAI, AzureChatOpenAI, OpenAIEmbeddings, AzureOpenAIEmbeddings
-from langchain.chat_models.base import BaseChatModel
-from langchain.embeddings.base import Embeddings
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from experimental.utilities.lazy import Lazy, register
 
 
 def select_model(provider: str = "openai", model_name: str = "gpt-4o-mini", temperature: float = 0.2) -> BaseChatModel:
     if provider == "azure":
+        from langchain_openai import AzureChatOpenAI
+
         return AzureChatOpenAI(
             azure_deployment=os.environ.get("AZURE_OPENAI_AGENT_DEPLOYMENT_NAME"),
             openai_api_version=os.environ.get("AZURE_OPENAI_API_VERSION"),
@@ -16,6 +21,8 @@ def select_model(provider: str = "openai", model_name: str = "gpt-4o-mini", temp
             temperature=temperature
         )
     else:  # default to OpenAI
+        from langchain_openai import ChatOpenAI
+
         return ChatOpenAI(
             model_name=model_name,
             temperature=temperature,
@@ -25,6 +32,8 @@ def select_model(provider: str = "openai", model_name: str = "gpt-4o-mini", temp
 
 def select_embeddings(provider: str = "openai", model_name: str = "text-embedding-3-small") -> Embeddings:
     if provider == "azure":
+        from langchain_openai import AzureOpenAIEmbeddings
+
         return AzureOpenAIEmbeddings(
             azure_deployment=os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME"),
             openai_api_version=os.environ.get("AZURE_OPENAI_API_VERSION"),
@@ -33,7 +42,84 @@ def select_embeddings(provider: str = "openai", model_name: str = "text-embeddin
             model=model_name
         )
     else:  # default to OpenAI
+        from langchain_openai import OpenAIEmbeddings
+
         return OpenAIEmbeddings(
             model=model_name,
             openai_api_key=os.environ.get("OPENAI_API_KEY")
         )
+
+
+class LazyChatModel(Runnable):
+    """
+    Stands in for a chat model until it is first invoked. `create_react_agent` only needs `bind_tools` at graph
+    construction time, so the provider client (and its imports) are built on the first agent turn or by `prewarm`.
+
+    Args:
+        model (Lazy): registry entry that builds the underlying chat model.
+        tools (Optional[Sequence]): tools recorded by `bind_tools` and bound once the model is built.
+        tool_kwargs (Optional[Dict]): keyword arguments forwarded to the model's `bind_tools`.
+    """
+
+    def __init__(self, model: Lazy, tools: Optional[Sequence[Any]] = None, tool_kwargs: Optional[Dict[str, Any]] = None):
+        self.model = model
+        self.tools = list(tools) if tools is not None else None
+        self.tool_kwargs = tool_kwargs or {}
+        self._bound: Optional[Runnable] = None
+
+    @property
+    def name(self) -> str:
+        return self.model.name
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "LazyChatModel":
+        return LazyChatModel(self.model, tools, kwargs)
+
+    def resolve(self) -> Runnable:
+        """Builds the underlying model, binding tools when they were recorded"""
+        if self._bound is None:
+            model = self.model.get()
+            self._bound = model.bind_tools(self.tools, **self.tool_kwargs) if self.tools is not None else model
+        return self._bound
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return self.resolve().invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return await self.resolve().ainvoke(input, config, **kwargs)
+
+    def batch(self, inputs: List[Any], config: Optional[RunnableConfig] = None, **kwargs: Any) -> List[Any]:
+        return self.resolve().batch(inputs, config, **kwargs)
+
+    async def abatch(self, inputs: List[Any], config: Optional[RunnableConfig] = None, **kwargs: Any) -> List[Any]:
+        return await self.resolve().abatch(inputs, config, **kwargs)
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator[Any]:
+        yield from self.resolve().stream(input, config, **kwargs)
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        async for chunk in self.resolve().astream(input, config, **kwargs):
+            yield chunk
+
+
+def select_lazy_model(
+    name: str,
+    provider: str = "openai",
+    model_name: str = "gpt-4o-mini",
+    temperature: float = 0.2
+) -> LazyChatModel:
+    """
+    Registers a chat model under `model:<name>` and returns a `LazyChatModel` for it, the model is built with
+    `select_model` on first use
+
+    Args:
+        name (str): registry name, usually the agent name.
+        provider (str): the model vendor such as `openai` or `azure`.
+        model_name (str): the model to use such as `gpt-4o-mini`.
+        temperature (float): sampling temperature.
+
+    Returns:
+        LazyChatModel: a runnable accepted by `create_react_agent` in place of a chat model.
+    """
+    # select_model is resolved when the model is built so it can be replaced after this module is imported
+    entry = register(f"model:{name}", lambda: select_model(provider=provider, model_name=model_name, temperature=temperature))
+    return LazyChatModel(entry)
@@ -0,0 +1,183 @@
+import json
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+from experimental.utilities.vizql_data_service import field_column, is_dimension
+from experimental.utilities.result_cache import query_vds_cached
+from experimental.utilities.vds_chunking import truncation_note
+from experimental.utilities.telemetry import span, STAGE_VDS_QUERY
+
+
+"""
+QUERY PLANNER
+
+In planner mode the query writer may answer with a JSON array of VDS queries, one per grain or filter set of a
+compound question. `run_query_plan` sends them to VizQL Data Service concurrently and `join_results` combines the
+result sets into one table with a full outer join on the dimension columns they share, so the agent receives a
+single table instead of making one tool call per query.
+"""
+
+# queries of a plan beyond this number are rejected so a runaway plan cannot flood VDS
+MAX_PLANNED_QUERIES = 4
+
+def parse_query_plan(payload: Union[str, Dict, List]) -> List[Dict[str, Any]]:
+    """
+    Parses the output of the query writer into a list of VDS queries, accepting a single query, an array of
+    queries or an object with a "queries" key, with or without a markdown code fence.
+
+    Args:
+        payload (Union[str, Dict, List]): the query writer output.
+
+    Returns:
+        List[Dict]: the queries of the plan.
+
+    Raises:
+        ValueError: when the payload is not valid JSON or contains no queries.
+    """
+    if isinstance(payload, str):
+        raw = payload.strip()
+        if raw.startswith("```"):
+            raw = "\n".join(raw.splitlines()[1:-1])
+        try:
+            payload = json.loads(raw)
+        except json.JSONDecodeError:
+            raise ValueError("Invalid JSON format in the payload")
+
+    if isinstance(payload, dict):
+        queries = payload["queries"] if isinstance(payload.get("queries"), list) else [payload]
+    else:
+        queries = payload
+
+    if not queries or not all(isinstance(query, dict) and query.get("fields") for query in queries):
+        raise ValueError("The query plan must contain at least one query and every query must have fields")
+    if len(queries) > MAX_PLANNED_QUERIES:
+        raise ValueError(f"The query plan has {len(queries)} queries, combine them into at most {MAX_PLANNED_QUERIES}")
+    return queries
+
+
+def dimension_columns(query: Dict[str, Any]) -> List[str]:
+    """Columns of a query that group rows"""
+    return [field_column(field) for field in query["fields"] if is_dimension(field)]
+
+
+def run_query_plan(
+    queries: Sequence[Dict[str, Any]],
+    api_key: str,
+    url: str,
+    datasource_luid: str
+) -> List[Dict[str, Any]]:
+    """
+    Runs the queries of a plan concurrently.
+
+    Args:
+        queries (Sequence[Dict]): VDS queries returned by `parse_query_plan`.
+        api_key (str): The API key for authentication.
+        url (str): The base URL for the API endpoints.
+        datasource_luid (str): The unique identifier of the datasource.
+
+    Returns:
+        List[Dict]: the response of each query in plan order, with the "truncated" and "unordered" flags of
+        `query_vds_chunked` and its "data" rows, empty for queries that returned no data.
+
+    Raises:
+        ValueError: when every query returns no data.
+    """
+    def run(index: int, query: Dict[str, Any]) -> Dict[str, Any]:
+        with span(STAGE_VDS_QUERY, datasource_luid=datasource_luid, plan_index=index):
+            response = query_vds_cached(api_key=api_key, datasource_luid=datasource_luid, url=url, query=query)
+        return {**(response or {}), "data": (response or {}).get("data") or []}
+
+    if len(queries) == 1:
+        results = [run(0, queries[0])]
+    else:
+        # each query runs in a copy of the caller's context so its span is recorded under the tool call
+        with ThreadPoolExecutor(max_workers=len(queries), thread_name_prefix="vds-plan") as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, run, index, query)
+                for index, query in enumerate(queries)
+            ]
+            results = [future.result() for future in futures]
+
+    if not any(result["data"] for result in results):
+        raise ValueError(f"No query of the plan returned data: {json.dumps(list(queries))}")
+    return results
+
+
+def empty_queries_note(queries: Sequence[Dict[str, Any]], results: Sequence[List[Dict[str, Any]]]) -> str:
+    """Names the queries of a plan that returned no data, so the agent knows why their columns are missing"""
+    return "".join(
+        f"\n\nQuery {index + 1} of the plan returned no data, its columns are missing: {json.dumps(query)}"
+        for index, (query, rows) in enumerate(zip(queries, results))
+        if not rows
+    )
+
+
+def truncated_queries_note(responses: Sequence[Dict[str, Any]]) -> str:
+    """Names the queries of a plan whose results are missing rows, as `get_headlessbi_data` does for one query"""
+    return "".join(
+        truncation_note(response, f"the result of query {index + 1} of the plan")
+        for index, response in enumerate(responses)
+    )
+
+
+def _rename_conflicts(columns: Sequence[str], taken: set, keys: Sequence[str], index: int) -> Dict[str, str]:
+    """Measures named like a column of an earlier result are suffixed with the number of their query"""
+    return {
+        column: f"{column} (query {index + 1})" if column in taken and column not in keys else column
+        for column in columns
+    }
+
+
+def join_results(queries: Sequence[Dict[str, Any]], results: Sequence[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Combines the results of a plan with a full outer join on shared dimension columns. Results at a coarser grain
+    repeat their values on every matching row of finer ones, results sharing no dimension are appended as rows of
+    their own. Results without any dimension, such as totals of this year and last year, are cross joined into
+    one row.
+
+    Args:
+        queries (Sequence[Dict]): the queries of the plan.
+        results (Sequence[List[Dict]]): the rows of each query, the "data" of the responses returned by
+            `run_query_plan`, empty results are skipped.
+
+    Returns:
+        List[Dict]: the combined rows, every row has every column, missing values are None.
+    """
+    joined = [dict(row) for row in results[0]]
+    columns = list(joined[0].keys()) if joined else []
+    dimensions = set(dimension_columns(queries[0]))
+
+    for index in range(1, len(results)):
+        rows = results[index]
+        if not rows:
+            continue
+        keys = [column for column in dimension_columns(queries[index]) if column in dimensions and column in columns]
+        renames = _rename_conflicts(rows[0].keys(), set(columns), keys, index)
+        rows = [{renames[column]: value for column, value in row.items()} for row in rows]
+
+        if not dimensions and not dimension_columns(queries[index]):
+            joined = [{**row, **match} for row in joined or [{}] for match in rows]
+            columns += [column for column in rows[0].keys() if column not in columns]
+            continue
+
+        by_key: Dict[Tuple, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_key.setdefault(tuple(row.get(key) for key in keys), []).append(row)
+
+        combined, matched = [], set()
+        for row in joined:
+            key = tuple(row.get(column) for column in keys)
+            matches = by_key.get(key) if keys else None
+            if matches:
+                matched.add(key)
+                combined.extend({**row, **match} for match in matches)
+            else:
+                combined.append(row)
+        combined.extend(row for key, group in by_key.items() if not keys or key not in matched for row in group)
+
+        joined = combined
+        columns += [column for column in rows[0].keys() if column not in columns]
+        dimensions |= {renames.get(column, column) for column in dimension_columns(queries[index])}
+
+    return [{column: row.get(column) for column in columns} for row in joined]
@@ -0,0 +1,338 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from experimental.utilities.vizql_data_service import REAGGREGATE, field_column, is_dimension, sort_rows
+from experimental.utilities.metrics import record_cache
+from experimental.utilities.vds_chunking import query_vds_chunked
+
+
+"""
+LOCAL RESULT CACHE
+
+Follow-up questions often re-slice data the agent already fetched: the top 3 of the regions it just listed, the
+same table sorted by profit or totals per region from a table per region and category. `ResultCache` keeps the
+latest VDS results of each session in columnar form and answers such queries locally when they can be derived
+from a cached result:
+
+- every dimension of the new query is a dimension of the cached one, measures are the same fields
+- coarser grains re-aggregate measures with SUM, MIN, MAX or COUNT, other functions need the same grain
+- filters of the cached query are all repeated, extra SET and MATCH filters on cached dimensions, TOP filters and
+  QUANTITATIVE_NUMERICAL filters on measures of the new query are applied locally
+- sorting is applied locally
+
+Anything else, including date filters, falls through to VizQL Data Service. Results are kept per Tableau session,
+data source and query for `RESULT_CACHE_TTL_SECONDS` so the permissions of different users are never mixed.
+"""
+
+# results are reused for a few minutes, long enough for follow-up questions without serving stale data
+RESULT_CACHE_TTL_SECONDS = float(os.environ.get("RESULT_CACHE_TTL_SECONDS", 5 * 60))
+
+# results kept per session and data source, and sessions kept in total, least recently used first evicted
+MAX_RESULTS_PER_SESSION = 16
+MAX_SESSIONS = 256
+
+# larger results are not cached, they are unlikely to be re-sliced and would hold too much memory
+MAX_CACHED_ROWS = 100_000
+
+SessionKey = Tuple[str, str, str]
+
+
+def _canonical(value: Any) -> str:
+    return json.dumps(value, sort_keys=True)
+
+
+def _field_key(field: Dict[str, Any]) -> Tuple:
+    """Identifies a field regardless of its alias, sorting and formatting"""
+    return field.get("fieldCaption"), field.get("function"), field.get("calculation")
+
+
+class CachedResult:
+    """A VDS result in columnar form with the query that produced it"""
+
+    __slots__ = ("query", "columns", "length", "stored_at")
+
+    def __init__(self, query: Dict[str, Any], rows: List[Dict[str, Any]]):
+        self.query = query
+        names = [field_column(field) for field in query["fields"]]
+        self.columns: Dict[str, List[Any]] = {name: [row.get(name) for row in rows] for name in names}
+        self.length = len(rows)
+        self.stored_at = time.monotonic()
+
+
+def _dimension_filter(query_filter: Dict[str, Any], columns: Dict[str, str]) -> Optional[Callable[[Any], bool]]:
+    """Predicate on a dimension column for SET and MATCH filters, None when it cannot be applied locally"""
+    field = query_filter.get("field", {})
+    if field.get("function") or field.get("calculation") or _field_key(field) not in columns:
+        return None
+    exclude = str(query_filter.get("exclude", False)).lower() == "true"
+
+    if query_filter.get("filterType") == "SET":
+        values = set(query_filter.get("values") or [])
+        return lambda value: (value in values) != exclude
+
+    if query_filter.get("filterType") == "MATCH":
+        starts = query_filter.get("startsWith")
+        ends = query_filter.get("endsWith")
+        contains = query_filter.get("contains")
+
+        def matches(value):
+            text = "" if value is None else str(value)
+            matched = (
+                (starts is None or text.startswith(starts))
+                and (ends is None or text.endswith(ends))
+                and (contains is None or contains in text)
+            )
+            return matched != exclude
+        return matches
+
+    return None
+
+
+def _measure_filter(query_filter: Dict[str, Any]) -> Optional[Callable[[Any], bool]]:
+    """Predicate for QUANTITATIVE_NUMERICAL filters, None when it cannot be applied locally"""
+    if query_filter.get("filterType") != "QUANTITATIVE_NUMERICAL":
+        return None
+    kind = query_filter.get("quantitativeFilterType")
+    if kind not in ("RANGE", "MIN", "MAX"):
+        return None
+    low, high = query_filter.get("min"), query_filter.get("max")
+    include_nulls = query_filter.get("includeNulls", False)
+
+    def matches(value):
+        if value is None:
+            return include_nulls
+        if kind in ("RANGE", "MIN") and low is not None and value < low:
+            return False
+        if kind in ("RANGE", "MAX") and high is not None and value > high:
+            return False
+        return True
+    return matches
+
+
+def _aggregate(
+    result: CachedResult,
+    rows: Sequence[int],
+    group_columns: Sequence[str],
+    measures: Sequence[Tuple[str, str]]
+) -> Tuple[List[Tuple], Dict[Tuple, Dict[str, Any]]]:
+    """Groups `rows` of `result` by `group_columns` and re-aggregates `measures` (column, function)"""
+    groups: "OrderedDict[Tuple, List[int]]" = OrderedDict()
+    for row in rows:
+        groups.setdefault(tuple(result.columns[column][row] for column in group_columns), []).append(row)
+
+    aggregated = {}
+    for key, members in groups.items():
+        values = {}
+        for column, function in measures:
+            present = [result.columns[column][row] for row in members if result.columns[column][row] is not None]
+            values[column] = REAGGREGATE[function](present) if present else None
+        aggregated[key] = values
+    return list(groups.keys()), aggregated
+
+
+def derive(result: CachedResult, query: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """
+    Answers `query` from a cached result when it can be derived from it.
+
+    Args:
+        result (CachedResult): a cached VDS result.
+        query (Dict): the new VDS query.
+
+    Returns:
+        Optional[List[Dict]]: the rows VDS would return, None when the query is not derivable from the result.
+    """
+    cached_fields = result.query["fields"]
+    cached_dimensions = {_field_key(field): field_column(field) for field in cached_fields if is_dimension(field)}
+    cached_measures = {_field_key(field): field_column(field) for field in cached_fields if not is_dimension(field)}
+
+    fields = query.get("fields") or []
+    dimensions = [field for field in fields if is_dimension(field)]
+    if not fields or any(_field_key(field) not in cached_dimensions for field in dimensions):
+        return None
+    regrain = {_field_key(field) for field in dimensions} != set(cached_dimensions)
+
+    for field in fields:
+        if is_dimension(field):
+            continue
+        if _field_key(field) not in cached_measures:
+            return None
+        if regrain and (field.get("calculation") or field.get("function") not in REAGGREGATE):
+            return None
+
+    # every filter of the cached query must be repeated, the data excluded by it is not in the cache
+    cached_filters = {_canonical(query_filter) for query_filter in result.query.get("filters") or []}
+    filters = query.get("filters") or []
+    if not cached_filters <= {_canonical(query_filter) for query_filter in filters}:
+        return None
+    extra = [query_filter for query_filter in filters if _canonical(query_filter) not in cached_filters]
+
+    # measure filters of the cached query were applied at its grain, they do not hold at a coarser one
+    if regrain and any(query_filter.get("field", {}).get("function") for query_filter in result.query.get("filters") or []):
+        return None
+
+    row_filters, top_filters, measure_filters = [], [], []
+    for query_filter in extra:
+        if query_filter.get("filterType") == "TOP":
+            top_filters.append(query_filter)
+            continue
+        predicate = _dimension_filter(query_filter, cached_dimensions)
+        if predicate is not None:
+            row_filters.append((cached_dimensions[_field_key(query_filter["field"])], predicate))
+            continue
+        predicate = _measure_filter(query_filter)
+        measure_key = _field_key(query_filter.get("field", {}))
+        if predicate is None or not any(_field_key(field) == measure_key for field in fields if not is_dimension(field)):
+            return None
+        measure_filters.append((measure_key, predicate))
+
+    # TOP filters are computed before other filters in Tableau, they can only be applied on unfiltered results
+    if top_filters and (len(top_filters) > 1 or cached_filters or len(extra) > 1):
+        return None
+
+    rows = [
+        row for row in range(result.length)
+        if all(predicate(result.columns[column][row]) for column, predicate in row_filters)
+    ]
+
+    if top_filters:
+        top = top_filters[0]
+        member_key = _field_key(top.get("field", {}))
+        measure = top.get("fieldToMeasure", {})
+        if member_key not in cached_dimensions or _field_key(measure) not in cached_measures:
+            return None
+        if measure.get("function") not in REAGGREGATE:
+            return None
+        member_column = cached_dimensions[member_key]
+        measure_column = cached_measures[_field_key(measure)]
+        members, totals = _aggregate(result, rows, [member_column], [(measure_column, measure["function"])])
+        ranked = sorted(
+            (member for member in members if totals[member][measure_column] is not None),
+            key=lambda member: totals[member][measure_column],
+            reverse=top.get("direction", "TOP") == "TOP"
+        )
+        kept = {member[0] for member in ranked[:int(top.get("howMany", 0))]}
+        rows = [row for row in rows if result.columns[member_column][row] in kept]
+
+    group_columns = [cached_dimensions[_field_key(field)] for field in dimensions]
+    if regrain:
+        measures = [
+            (cached_measures[_field_key(field)], field["function"]) for field in fields if not is_dimension(field)
+        ]
+        keys, aggregated = _aggregate(result, rows, group_columns, measures)
+        records = [
+            {**dict(zip(group_columns, key)), **aggregated[key]} for key in keys
+        ]
+    else:
+        records = [{column: values[row] for column, values in result.columns.items()} for row in rows]
+
+    output = []
+    for record in records:
+        row = {}
+        for field in fields:
+            source = (cached_dimensions if is_dimension(field) else cached_measures)[_field_key(field)]
+            value = record.get(source)
+            if isinstance(value, float) and field.get("maxDecimalPlaces") is not None:
+                value = round(value, field["maxDecimalPlaces"])
+            row[field_column(field)] = value
+        output.append(row)
+
+    for measure_key, predicate in measure_filters:
+        column = next(field_column(field) for field in fields if _field_key(field) == measure_key and not is_dimension(field))
+        output = [row for row in output if predicate(row[column])]
+
+    return sort_rows(output, fields)
+
+
+class ResultCache:
+    """
+    Recent VDS results per Tableau session and data source.
+
+    Args:
+        ttl_seconds (float): maximum age of a cached result.
+        max_results (int): results kept per session and data source.
+        max_sessions (int): sessions and data sources kept.
+        max_rows (int): results with more rows are not cached.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = RESULT_CACHE_TTL_SECONDS,
+        max_results: int = MAX_RESULTS_PER_SESSION,
+        max_sessions: int = MAX_SESSIONS,
+        max_rows: int = MAX_CACHED_ROWS
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_results = max_results
+        self.max_sessions = max_sessions
+        self.max_rows = max_rows
+        self._sessions: "OrderedDict[SessionKey, OrderedDict[str, CachedResult]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, session: SessionKey, query: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """Rows for `query` derived from the most recent cached result that supports it, None otherwise"""
+        now = time.monotonic()
+        with self._lock:
+            results = self._sessions.get(session)
+            if not results:
+                return None
+            self._sessions.move_to_end(session)
+            for stale in [key for key, result in results.items() if now - result.stored_at >= self.ttl_seconds]:
+                del results[stale]
+            # an identical query is answered from its own result, otherwise from the most recent derivable one
+            exact = results.get(_canonical(query))
+            candidates = ([exact] if exact else []) + [result for result in reversed(results.values()) if result is not exact]
+
+        for result in candidates:
+            rows = derive(result, query)
+            if rows is not None:
+                return rows
+        return None
+
+    def store(self, session: SessionKey, query: Dict[str, Any], rows: List[Dict[str, Any]]):
+        if not rows or len(rows) > self.max_rows:
+            return
+        # results whose columns are not named as expected cannot be re-sliced reliably
+        if any(field_column(field) not in rows[0] for field in query["fields"]):
+            return
+        result = CachedResult(query, rows)
+        with self._lock:
+            results = self._sessions.setdefault(session, OrderedDict())
+            self._sessions.move_to_end(session)
+            results[_canonical(query)] = result
+            results.move_to_end(_canonical(query))
+            while len(results) > self.max_results:
+                results.popitem(last=False)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+
+RESULTS = ResultCache()
+
+
+def query_vds_cached(api_key: str, datasource_luid: str, url: str, query: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Same as `query_vds_chunked`, but answers from `RESULTS` when the query can be derived from a recent result of the
+    same session and data source, and caches the results of queries sent to VDS.
+
+    Returns:
+        Dict[str, Any]: the VDS response, with a "data" list of rows.
+    """
+    session = (url, api_key, datasource_luid)
+    rows = RESULTS.lookup(session, query)
+    record_cache("vds_results", hit=rows is not None)
+    if rows is not None:
+        return {"data": rows}
+
+    response = query_vds_chunked(api_key=api_key, datasource_luid=datasource_luid, url=url, query=query)
+    # truncated results are missing rows, queries derived from them would be wrong
+    if response and isinstance(response.get("data"), list) and not response.get("truncated"):
+        RESULTS.store(session, query, response["data"])
+    return response
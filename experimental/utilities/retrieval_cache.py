@@ -0,0 +1,150 @@
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from experimental.utilities.metrics import record_cache
+
+
+"""
+RETRIEVAL CACHE
+
+Popular catalog questions return the same documents until the catalog is re-indexed. `RetrievalCache` keeps the
+documents returned by each index for a query embedding and k, so repeated searches skip the vector store. The
+embedding itself comes from the embedding cache, a repeated search is answered without any network call.
+
+Entries are keyed by index, namespace, a hash of the query embedding, k and the version of the index. Indexing
+pipelines call `bump_index_version` once an index is rewritten, which changes the key of every later lookup so
+stale entries are never served and age out of the LRU. Versions are kept in `VECTOR_SNAPSHOT_DIR/<index>/VERSION`,
+shared by every process reading the same directory. Entries also expire after `RETRIEVAL_CACHE_TTL_SECONDS` for
+indexes updated outside of the pipelines.
+"""
+
+# entries expire even without a version bump, for indexes written by other tools
+RETRIEVAL_CACHE_TTL_SECONDS = float(os.environ.get("RETRIEVAL_CACHE_TTL_SECONDS", 60 * 60))
+
+# search results kept across all indexes, least recently used first evicted
+MAX_CACHED_SEARCHES = 4096
+
+
+def version_path(index_name: str) -> str:
+    return os.path.join(os.environ.get("VECTOR_SNAPSHOT_DIR", "snapshots"), index_name, "VERSION")
+
+
+# path -> (modification time, version), so versions are only parsed again after a bump
+_versions: Dict[str, Tuple[int, int]] = {}
+
+
+def index_version(index_name: str, directory: Optional[str] = None) -> int:
+    """The current version of an index, 0 before it was bumped for the first time"""
+    path = os.path.join(directory, "VERSION") if directory else version_path(index_name)
+    try:
+        modified = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+    cached = _versions.get(path)
+    if cached is not None and cached[0] == modified:
+        return cached[1]
+    try:
+        with open(path) as file:
+            version = int(file.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+    _versions[path] = (modified, version)
+    return version
+
+
+def bump_index_version(index_name: str, directory: Optional[str] = None) -> int:
+    """
+    Increments the version of an index, to call after the index was re-indexed so cached searches are not served.
+
+    Args:
+        index_name (str): the re-indexed index.
+        directory (Optional[str]): directory of the VERSION file, defaults to `VECTOR_SNAPSHOT_DIR/<index_name>`.
+
+    Returns:
+        int: the new version.
+    """
+    path = os.path.join(directory, "VERSION") if directory else version_path(index_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    version = index_version(index_name, directory) + 1
+    # written to a temporary file and renamed so readers never see a partial version
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".VERSION")
+    with os.fdopen(descriptor, "w") as file:
+        file.write(str(version))
+    os.replace(temporary, path)
+    return version
+
+
+def embedding_hash(vector: Sequence[float]) -> str:
+    return hashlib.sha256(array("f", vector).tobytes()).hexdigest()
+
+
+class RetrievalCache:
+    """
+    LRU of search results per index version.
+
+    Args:
+        max_entries (int): searches kept across all indexes.
+        ttl_seconds (float): age after which an entry is searched again.
+    """
+
+    def __init__(self, max_entries: int = MAX_CACHED_SEARCHES, ttl_seconds: float = RETRIEVAL_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple, Tuple[float, float, List[Document]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def search(
+        self,
+        index_name: str,
+        namespace: Optional[str],
+        vector: Sequence[float],
+        k: int,
+        run: Callable[[], List[Document]]
+    ) -> List[Document]:
+        """
+        Returns the cached documents of a search, or runs it and caches its documents.
+
+        Args:
+            index_name (str): the searched index.
+            namespace (Optional[str]): the searched namespace.
+            vector (Sequence[float]): the query embedding.
+            k (int): documents returned.
+            run (Callable): runs the search on a miss.
+
+        Returns:
+            List[Document]: the documents, shared by every caller, copy them before changing them.
+        """
+        key = (index_name, namespace or "", embedding_hash(vector), k, index_version(index_name))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                record_cache("retrieval", hit=True, saved_seconds=entry[1])
+                return entry[2]
+
+        started = time.perf_counter()
+        documents = run()
+        elapsed = time.perf_counter() - started
+        record_cache("retrieval", hit=False)
+        with self._lock:
+            self._entries[key] = (now, elapsed, documents)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return documents
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+RETRIEVALS = RetrievalCache()
@@ -0,0 +1,140 @@
+import os
+from typing import Sequence, Tuple, Union
+
+import numpy as np
+
+
+"""
+VECTORIZED SIMILARITY
+
+Ranking documents with a pairwise cosine similarity recomputes both norms on every call and loops over the
+catalog in Python. `SimilarityIndex` keeps document embeddings as a float32 matrix normalized once, scores one or
+many queries with a matrix product and selects the top k with `argpartition` instead of sorting every score.
+
+Matrices are scored in blocks of `BLOCK_ROWS` rows so a large catalog memory-mapped from disk with
+`SimilarityIndex.load` never needs a score matrix for every document at once.
+"""
+
+# documents scored per matrix product, bounds the memory of scores to BLOCK_ROWS x queries floats
+BLOCK_ROWS = 262_144
+
+Vectors = Union[Sequence[float], Sequence[Sequence[float]], np.ndarray]
+
+
+def normalize(vectors: Vectors) -> np.ndarray:
+    """Float32 copy of vectors scaled to unit length along the last axis, zero vectors are left as is"""
+    matrix = np.array(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def cosine_similarity(first: Vectors, second: Vectors) -> Union[float, np.ndarray]:
+    """
+    Cosine similarity of two vectors, or of every row of `first` with every row of `second` when either is a
+    matrix.
+    """
+    scores = normalize(first) @ normalize(second).T
+    return float(scores) if np.ndim(scores) == 0 else scores
+
+
+def top_k(scores: np.ndarray, k: int, largest: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Positions and values of the `k` best scores along the last axis, best first, for one row or a batch of rows.
+
+    Args:
+        scores (np.ndarray): scores of shape (n,) or (queries, n).
+        k (int): scores kept, capped at n.
+        largest (bool): best scores are the largest ones, the smallest ones for distances.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: positions and values, of shape (k,) or (queries, k).
+    """
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        empty = np.empty(scores.shape[:-1] + (0,))
+        return empty.astype(np.int64), empty
+    keyed = -scores if largest else scores
+    positions = np.argpartition(keyed, k - 1, axis=-1)[..., :k]
+    order = np.argsort(np.take_along_axis(keyed, positions, axis=-1), axis=-1)
+    positions = np.take_along_axis(positions, order, axis=-1)
+    return positions, np.take_along_axis(scores, positions, axis=-1)
+
+
+def matmul_top_k(
+    matrix: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    block_rows: int = BLOCK_ROWS
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top `k` rows of `matrix` by dot product with each query, scored block by block.
+
+    Args:
+        matrix (np.ndarray): documents of shape (n, dimension), may be memory-mapped.
+        queries (np.ndarray): queries of shape (queries, dimension).
+        k (int): rows returned per query.
+        block_rows (int): rows scored per matrix product.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: row positions and scores of shape (queries, k), best first.
+    """
+    if len(matrix) <= block_rows:
+        return top_k(queries @ matrix.T, k)
+
+    positions, scores = [], []
+    for start in range(0, len(matrix), block_rows):
+        block_positions, block_scores = top_k(queries @ matrix[start:start + block_rows].T, k)
+        positions.append(block_positions + start)
+        scores.append(block_scores)
+    # the best k of every block hold the best k overall
+    best, values = top_k(np.concatenate(scores, axis=-1), k)
+    return np.take_along_axis(np.concatenate(positions, axis=-1), best, axis=-1), values
+
+
+class SimilarityIndex:
+    """
+    Document embeddings ranked by cosine similarity.
+
+    Args:
+        matrix (np.ndarray): embeddings of shape (n, dimension).
+        normalized (bool): rows are already unit length, as written by `save`, otherwise a normalized copy is kept.
+    """
+
+    def __init__(self, matrix: np.ndarray, normalized: bool = False):
+        self.matrix = matrix if normalized else normalize(matrix)
+        if self.matrix.ndim != 2:
+            raise ValueError("Document embeddings must be a matrix with one row per document")
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    @property
+    def dimension(self) -> int:
+        return self.matrix.shape[1]
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "SimilarityIndex":
+        """Loads embeddings written by `save`, memory-mapped so only the pages searches touch are read"""
+        return cls(np.load(path, mmap_mode="r" if mmap else None), normalized=True)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.save(path, np.ascontiguousarray(self.matrix, dtype=np.float32))
+
+    def scores(self, queries: Vectors) -> np.ndarray:
+        """Cosine similarity of every document with one query of shape (n,) or a batch of shape (queries, n)"""
+        return normalize(queries) @ self.matrix.T
+
+    def search(self, queries: Vectors, k: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The `k` documents most similar to one query or to each query of a batch.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: document positions and cosine similarities, best first, of shape (k,)
+            for one query or (queries, k) for a batch.
+        """
+        batch = normalize(queries)
+        if batch.shape[-1] != self.dimension:
+            raise ValueError(f"Queries have dimension {batch.shape[-1]} but documents have dimension {self.dimension}")
+        positions, scores = matmul_top_k(self.matrix, np.atleast_2d(batch), k)
+        return (positions[0], scores[0]) if batch.ndim == 1 else (positions, scores)
@@ -1,13 +1,49 @@
 import os
 import json
 import re
+import time
 import logging
-from typing import Dict, Optional
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 
 from experimental.utilities.vizql_data_service import query_vds, query_vds_metadata
-from experimental.utilities.utils import json_to_markdown_table
-from experimental.utilities.metadata import get_data_dictionary
+from experimental.utilities.utils import SessionExpiredError, json_to_markdown_table
+from experimental.utilities.metadata import get_data_dictionary, list_published_datasources
+from experimental.utilities.metrics import record_cache
+from experimental.utilities.result_cache import query_vds_cached
+from experimental.utilities.vds_chunking import truncation_note
+from experimental.utilities.member_index import MEMBER_INDEXES, resolve_query_members, resolved_members_note
+from experimental.utilities.query_planner import (
+    empty_queries_note,
+    join_results,
+    parse_query_plan,
+    run_query_plan,
+    truncated_queries_note
+)
+from experimental.utilities.telemetry import (
+    span,
+    STAGE_GRAPHQL_METADATA,
+    STAGE_VDS_READ_METADATA,
+    STAGE_VDS_QUERY,
+    STAGE_TABLE_RENDERING
+)
+
+# data source metadata rarely changes, entries are per session so permissions of different users are not mixed
+METADATA_TTL_SECONDS = 10 * 60
+
+# bounds the cache when one tool serves many data sources, least recently used entries are evicted first
+MAX_CACHED_METADATA = 512
+
+_metadata: "OrderedDict[Tuple[str, str, str], Tuple[float, Dict[str, Any], List[Dict[str, Any]]]]" = OrderedDict()
+_metadata_lock = threading.Lock()
+
+# the list of published data sources used to resolve names, per session
+CATALOG_TTL_SECONDS = 10 * 60
+
+_catalogs: Dict[Tuple[str, str], Tuple[float, List[Dict[str, Any]]]] = {}
+_catalogs_lock = threading.Lock()
 
 
 import json
@@ -27,21 +63,35 @@ def get_headlessbi_data(payload, url: str, api_key: str, datasource_luid: str):
             logging.error(f"JSON decoding error in get_headlessbi_data: {je}")
             raise ValueError("Invalid JSON format in the payload")
 
+    # filter values guessed by the query writer are replaced with actual members when the index is ready, the
+    # agent is told about every replacement
+    written = payload
+    payload = resolve_query_members(payload, MEMBER_INDEXES.get(url, api_key, datasource_luid))
+    members_note = resolved_members_note([written], [payload])
+
     # 2) Single call to query_vds
     try:
-        headlessbi_data = query_vds(
-            api_key=api_key,
-            datasource_luid=datasource_luid,
-            url=url,
-            query=payload,    # always a dict now
-        )
+        with span(STAGE_VDS_QUERY, datasource_luid=datasource_luid):
+            # follow-up queries derivable from a recent result of the session are answered locally
+            headlessbi_data = query_vds_cached(
+                api_key=api_key,
+                datasource_luid=datasource_luid,
+                url=url,
+                query=payload,    # always a dict now
+            )
 
         if not headlessbi_data or 'data' not in headlessbi_data:
             raise ValueError("Invalid or empty response from query_vds")
 
         # 3) Convert to markdown and return
-        markdown_table = json_to_markdown_table(headlessbi_data['data'])
-        return markdown_table
+        with span(STAGE_TABLE_RENDERING) as stage:
+            markdown_table = json_to_markdown_table(headlessbi_data['data'])
+            stage.set_attribute("rows", len(headlessbi_data['data']))
+        return markdown_table + truncation_note(headlessbi_data) + members_note
+
+    except SessionExpiredError:
+        # the tool signs in again and retries
+        raise
 
     except ValueError as ve:
         logging.error(f"Value error in get_headlessbi_data: {ve}")
@@ -53,6 +103,37 @@ def get_headlessbi_data(payload, url: str, api_key: str, datasource_luid: str):
 
 
 
+def get_planned_data(payload, url: str, api_key: str, datasource_luid: str):
+    """
+    Runs the queries of a plan written in planner mode concurrently and returns their joined results.
+
+    Args:
+        payload: the query writer output, a single VDS query or a JSON array of queries.
+        url (str): The base URL for the API endpoints.
+        api_key (str): The API key for authentication.
+        datasource_luid (str): The unique identifier of the datasource.
+
+    Returns:
+        str: the combined results as a markdown table.
+    """
+    written = parse_query_plan(payload)
+    if len(written) == 1:
+        return get_headlessbi_data(payload=written[0], url=url, api_key=api_key, datasource_luid=datasource_luid)
+
+    members = MEMBER_INDEXES.get(url, api_key, datasource_luid)
+    queries = [resolve_query_members(query, members) for query in written]
+
+    responses = run_query_plan(queries=queries, api_key=api_key, url=url, datasource_luid=datasource_luid)
+    results = [response["data"] for response in responses]
+    with span(STAGE_TABLE_RENDERING) as stage:
+        rows = join_results(queries, results)
+        markdown_table = json_to_markdown_table(rows) + empty_queries_note(queries, results)
+        markdown_table += truncated_queries_note(responses)
+        markdown_table += resolved_members_note(written, queries)
+        stage.set_attribute("rows", len(rows))
+    return markdown_table
+
+
 def get_payload(output):
     try:
         parsed_output = output.split('JSON_payload')[1]
@@ -85,6 +166,149 @@ def get_values(api_key: str, url: str, datasource_luid: str, caption: str):
     return sample_values
 
 
+def get_datasource_metadata(
+    api_key: str,
+    url: str,
+    datasource_luid: str,
+    ttl_seconds: float = METADATA_TTL_SECONDS
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Fetches the data dictionary (Metadata API) and data model (VDS read-metadata) of a data source, reusing
+    results younger than `ttl_seconds` for the same session.
+
+    Args:
+        api_key (str): The API key for authentication.
+        url (str): The base URL for the API endpoints.
+        datasource_luid (str): The unique identifier of the datasource.
+        ttl_seconds (float): maximum age of cached metadata, defaults to `METADATA_TTL_SECONDS`.
+
+    Returns:
+        Tuple[Dict, List]: the data dictionary and the data model fields without internal names and ids.
+        Both are shared between callers and must not be modified.
+    """
+    key = (url, datasource_luid, api_key)
+    with _metadata_lock:
+        cached = _metadata.get(key)
+        if cached:
+            _metadata.move_to_end(key)
+    if cached and time.monotonic() - cached[0] < ttl_seconds:
+        record_cache("datasource_metadata", hit=True)
+        return cached[1], cached[2]
+
+    record_cache("datasource_metadata", hit=False)
+    with span(STAGE_GRAPHQL_METADATA, datasource_luid=datasource_luid):
+        data_dictionary = get_data_dictionary(
+            api_key=api_key,
+            domain=url,
+            datasource_luid=datasource_luid
+        )
+
+    with span(STAGE_VDS_READ_METADATA, datasource_luid=datasource_luid):
+        datasource_metadata = query_vds_metadata(
+            api_key=api_key,
+            url=url,
+            datasource_luid=datasource_luid
+        )
+
+    for field in datasource_metadata['data']:
+        del field['fieldName']
+        del field['logicalTableId']
+
+    with _metadata_lock:
+        _metadata[key] = (time.monotonic(), data_dictionary, datasource_metadata['data'])
+        _metadata.move_to_end(key)
+        while len(_metadata) > MAX_CACHED_METADATA:
+            _metadata.popitem(last=False)
+    return data_dictionary, datasource_metadata['data']
+
+
+def get_datasource_catalog(
+    api_key: str,
+    url: str,
+    ttl_seconds: float = CATALOG_TTL_SECONDS
+) -> List[Dict[str, Any]]:
+    """
+    Lists the published data sources visible to a session, reusing the list for `ttl_seconds`.
+
+    Args:
+        api_key (str): The API key for authentication.
+        url (str): The base URL for the API endpoints.
+        ttl_seconds (float): maximum age of the cached list, defaults to `CATALOG_TTL_SECONDS`.
+
+    Returns:
+        List[Dict]: the luid, name, description and projectName of each data source, shared between callers.
+    """
+    key = (url, api_key)
+    with _catalogs_lock:
+        cached = _catalogs.get(key)
+    if cached and time.monotonic() - cached[0] < ttl_seconds:
+        record_cache("datasource_catalog", hit=True)
+        return cached[1]
+
+    record_cache("datasource_catalog", hit=False)
+    with span(STAGE_GRAPHQL_METADATA):
+        catalog = list_published_datasources(api_key=api_key, domain=url)
+
+    with _catalogs_lock:
+        # drop lists of expired sessions so the cache does not grow with every sign-in
+        now = time.monotonic()
+        for stale in [k for k, (cached_at, _) in _catalogs.items() if now - cached_at >= ttl_seconds]:
+            del _catalogs[stale]
+        _catalogs[key] = (now, catalog)
+    return catalog
+
+
+def resolve_datasource(
+    api_key: str,
+    url: str,
+    datasource_luid: Optional[str] = None,
+    datasource_name: Optional[str] = None,
+    allowed_luids: Optional[List[str]] = None
+) -> str:
+    """
+    Resolves the data source queried by a tool call from its LUID or name. Names are matched case-insensitively
+    against the catalog, exact matches first and then names containing the requested one.
+
+    Args:
+        api_key (str): The API key for authentication.
+        url (str): The base URL for the API endpoints.
+        datasource_luid (Optional[str]): LUID of the data source, used as is when provided.
+        datasource_name (Optional[str]): name of the data source, resolved through `get_datasource_catalog`.
+        allowed_luids (Optional[List[str]]): restricts the data sources that can be queried, all when None.
+
+    Returns:
+        str: the LUID of the data source.
+
+    Raises:
+        ValueError: when no single data source matches, the message lists the candidates.
+    """
+    if datasource_luid:
+        if allowed_luids is not None and datasource_luid not in allowed_luids:
+            raise ValueError(f"Data source '{datasource_luid}' is not available to this tool, use one of: {allowed_luids}")
+        return datasource_luid
+
+    if not datasource_name:
+        raise ValueError("Provide either the LUID or the name of the data source to query")
+
+    catalog = get_datasource_catalog(api_key=api_key, url=url)
+    if allowed_luids is not None:
+        catalog = [datasource for datasource in catalog if datasource['luid'] in allowed_luids]
+
+    wanted = datasource_name.strip().lower()
+    matches = [datasource for datasource in catalog if (datasource['name'] or '').lower() == wanted]
+    if not matches:
+        matches = [datasource for datasource in catalog if wanted in (datasource['name'] or '').lower()]
+
+    if len(matches) == 1:
+        return matches[0]['luid']
+
+    candidates = matches or catalog
+    names = [f"{datasource['name']} ({datasource['projectName']}, {datasource['luid']})" for datasource in candidates[:20]]
+    if matches:
+        raise ValueError(f"Data source name '{datasource_name}' is ambiguous, it matches: {names}")
+    raise ValueError(f"No data source named '{datasource_name}', available data sources include: {names}")
+
+
 def augment_datasource_metadata(
     task: str,
     api_key: str,
@@ -116,16 +340,23 @@ def augment_datasource_metadata(
         This function relies on external functions `get_data_dictionary` and `query_vds_metadata`
         to retrieve the necessary datasource information.
     """
+    # copy the template so concurrent tool calls don't share prompt data
+    prompt = dict(prompt)
+
     # insert the user input as a task
     prompt['task'] = task
 
-    # get dictionary for the data source from the Metadata API
-    data_dictionary = get_data_dictionary(
+    # get the data dictionary from the Metadata API and the data model from VDS, cached per session
+    data_dictionary, data_model = get_datasource_metadata(
         api_key=api_key,
-        domain=url,
+        url=url,
         datasource_luid=datasource_luid
     )
 
+    # index the members of STRING fields in the background so filter values can be resolved
+    if os.environ.get('MEMBER_INDEX', '1') == '1':
+        MEMBER_INDEXES.ensure(url=url, datasource_luid=datasource_luid, api_key=api_key, data_model=data_model)
+
     # insert data dictionary from Tableau's Data Catalog (using new 'fields' key)
     prompt['data_dictionary'] = data_dictionary['fields']
 
@@ -140,19 +371,8 @@ def augment_datasource_metadata(
         'field_names': data_dictionary['field_names']
     }
 
-    #  get sample values for fields from VDS metadata endpoint
-    datasource_metadata = query_vds_metadata(
-        api_key=api_key,
-        url=url,
-        datasource_luid=datasource_luid
-    )
-
-    for field in datasource_metadata['data']:
-        del field['fieldName']
-        del field['logicalTableId']
-
     # insert the data model with sample values from Tableau's VDS metadata API
-    prompt['data_model'] = datasource_metadata['data']
+    prompt['data_model'] = data_model
 
     # include previous error and query to debug in current run
     if previous_errors:
@@ -195,7 +415,9 @@ def env_vars_simple_datasource_qa(
     tableau_user=None,
     datasource_luid=None,
     model_provider=None,
-    tooling_llm_model=None
+    tooling_llm_model=None,
+    query_planner=None,
+    datasource_required=True
 ):
     """
     Retrieves Tableau configuration from environment variables if not provided as arguments.
@@ -210,6 +432,9 @@ def env_vars_simple_datasource_qa(
         tableau_user (str, optional): Tableau user
         datasource_luid (str, optional): Datasource LUID
         tooling_llm_model (str, optional): Tooling LLM model
+        query_planner (bool, optional): whether the query writer may split questions into several queries
+        datasource_required (bool): whether DATASOURCE_LUID must be set, tools choosing the data source per
+            call leave it optional
 
     Returns:
         dict: A dictionary containing all the configuration values
@@ -225,9 +450,10 @@ def env_vars_simple_datasource_qa(
         'jwt_secret': jwt_secret or os.environ['TABLEAU_JWT_SECRET'],
         'tableau_api_version': tableau_api_version or os.environ['TABLEAU_API_VERSION'],
         'tableau_user': tableau_user or os.environ['TABLEAU_USER'],
-        'datasource_luid': datasource_luid or os.environ['DATASOURCE_LUID'],
+        'datasource_luid': datasource_luid or (os.environ['DATASOURCE_LUID'] if datasource_required else os.environ.get('DATASOURCE_LUID')),
         'model_provider': model_provider or os.environ['MODEL_PROVIDER'],
-        'tooling_llm_model': tooling_llm_model or os.environ['TOOLING_MODEL']
+        'tooling_llm_model': tooling_llm_model or os.environ['TOOLING_MODEL'],
+        'query_planner': query_planner if query_planner is not None else os.environ.get('QUERY_PLANNER', '0') == '1'
     }
 
     return config
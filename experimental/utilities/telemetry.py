@@ -0,0 +1,228 @@
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # OpenTelemetry is optional, spans are still recorded in the local registry
+    otel_trace = None
+
+
+"""
+TELEMETRY
+
+Timing spans for the stages of tool pipelines such as `simple_datasource_qa`. Spans follow the OpenTelemetry
+interface (`set_attribute`, `is_recording`) and are forwarded to an OpenTelemetry tracer when the
+`opentelemetry-api` package is installed. Every span also records its duration in an in-process histogram
+registry that can be scraped with `REGISTRY.collect()`.
+
+Telemetry is disabled unless the `TELEMETRY_ENABLED` environment variable is set to `1` or `enable_telemetry()`
+is called. When disabled, `span()` returns a shared no-op object so instrumentation costs a single boolean check.
+"""
+
+# stage names used by the simple_datasource_qa pipeline
+STAGE_AUTH = "auth"
+STAGE_GRAPHQL_METADATA = "graphql_metadata"
+STAGE_VDS_READ_METADATA = "vds_read_metadata"
+STAGE_PROMPT_RENDERING = "prompt_rendering"
+STAGE_QUERY_WRITER = "query_writer_llm"
+STAGE_VDS_QUERY = "vds_query"
+STAGE_TABLE_RENDERING = "table_rendering"
+STAGE_RESPONSE_FORMATTING = "response_formatting"
+
+# histogram bucket upper bounds in milliseconds
+DEFAULT_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+_enabled = os.environ.get("TELEMETRY_ENABLED", "0") == "1"
+
+
+def enable_telemetry():
+    global _enabled
+    _enabled = True
+
+
+def disable_telemetry():
+    global _enabled
+    _enabled = False
+
+
+def telemetry_enabled() -> bool:
+    return _enabled
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets, compatible with Prometheus histogram semantics"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is the +Inf bucket
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Estimates a percentile (0-100) as the upper bound of the bucket containing it"""
+        with self._lock:
+            if self.count == 0:
+                return None
+            target = self.count * q / 100
+            running = 0
+            for index, bucket_count in enumerate(self.counts):
+                running += bucket_count
+                if running >= target:
+                    return self.buckets[index] if index < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            cumulative = []
+            running = 0
+            for bucket_count in self.counts:
+                running += bucket_count
+                cumulative.append(running)
+            return {
+                "buckets": list(zip(self.buckets + (float("inf"),), cumulative)),
+                "count": self.count,
+                "sum": self.sum,
+            }
+
+
+class HistogramRegistry:
+    """Thread-safe collection of histograms keyed by metric name and label values"""
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        return histogram
+
+    def observe(self, name: str, value: float, **labels: str):
+        self.histogram(name, **labels).observe(value)
+
+    def collect(self) -> List[Dict[str, Any]]:
+        """Returns a snapshot of every histogram: `[{"name", "labels", "buckets", "count", "sum"}]`"""
+        with self._lock:
+            items = list(self._histograms.items())
+        return [
+            {"name": name, "labels": dict(labels), **histogram.snapshot()}
+            for (name, labels), histogram in items
+        ]
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+REGISTRY = HistogramRegistry()
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def is_recording(self) -> bool:
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _TimedSpan:
+    def __init__(self, name: str, otel_span=None):
+        self.name = name
+        self.attributes: Dict[str, Any] = {}
+        self._otel_span = otel_span
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+        if self._otel_span is not None:
+            self._otel_span.set_attribute(key, value)
+
+    def is_recording(self) -> bool:
+        return True
+
+
+@contextmanager
+def _timed_span(name: str, attributes: Dict[str, Any]) -> Iterator[_TimedSpan]:
+    started = time.perf_counter()
+    if otel_trace is not None:
+        tracer = otel_trace.get_tracer("tableau_langchain")
+        with tracer.start_as_current_span(name, attributes=attributes) as otel_span:
+            current = _TimedSpan(name, otel_span)
+            try:
+                yield current
+            finally:
+                REGISTRY.observe("stage_latency_ms", (time.perf_counter() - started) * 1000, stage=name)
+    else:
+        current = _TimedSpan(name)
+        current.attributes.update(attributes)
+        try:
+            yield current
+        finally:
+            REGISTRY.observe("stage_latency_ms", (time.perf_counter() - started) * 1000, stage=name)
+
+
+def span(name: str, **attributes: Any):
+    """
+    Times a block of code as a named stage:
+
+        with span(STAGE_VDS_QUERY, datasource_luid=luid) as s:
+            data = query_vds(...)
+            s.set_attribute("rows", len(data))
+
+    Args:
+        name (str): stage name, used as the span name and the `stage` label of the histogram.
+        **attributes: span attributes forwarded to OpenTelemetry.
+
+    Returns:
+        A context manager yielding a span with `set_attribute` and `is_recording` methods.
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return _timed_span(name, attributes)
+
+
+@lru_cache(maxsize=8)
+def _encoding(model_name: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # encodings are downloaded on first use, fall back to estimates when offline
+        return None
+
+
+def count_tokens(text: str, model_name: str = "gpt-4o-mini") -> int:
+    """Counts tokens with tiktoken when installed, otherwise estimates 4 characters per token"""
+    encoding = _encoding(model_name)
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text))
@@ -1,6 +1,47 @@
 from typing import Dict, Any, Optional
+import threading
+from http.cookiejar import DefaultCookiePolicy
 import aiohttp
 import json
+import requests
+from requests.adapters import HTTPAdapter
+
+# connections kept open per Tableau host, shared by every tool and data source in the process
+HTTP_POOL_SIZE = 32
+
+_http_session: Optional[requests.Session] = None
+_http_session_lock = threading.Lock()
+
+
+class SessionExpiredError(RuntimeError):
+    """Tableau rejected the session token of a request with a 401, the session must be signed in again"""
+
+
+def raise_for_session(response: requests.Response, error_message: str):
+    """Raises `SessionExpiredError` when Tableau answered a request with a 401"""
+    if response.status_code == 401:
+        raise SessionExpiredError(error_message)
+
+
+def http_session() -> requests.Session:
+    """
+    Returns the process-wide `requests.Session` used for Tableau REST, Metadata API and VizQL Data Service calls,
+    so requests reuse pooled keep-alive connections instead of opening a new TLS connection each time. Cookies
+    are never stored, so nothing a response sets leaks into requests made for other users or sites.
+    """
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                session = requests.Session()
+                # the session is shared by every user and site, cookies such as workgroup_session_id set by one
+                # request must never be sent with another, requests authenticate with X-Tableau-Auth instead
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _http_session = session
+    return _http_session
 
 
 async def http_get(endpoint: str, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
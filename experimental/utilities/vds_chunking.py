@@ -0,0 +1,286 @@
+import os
+import copy
+import logging
+import contextvars
+from contextlib import closing
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from experimental.utilities.vizql_data_service import (
+    REAGGREGATE,
+    ResponseTooLargeError,
+    field_column,
+    is_dimension,
+    query_vds,
+    sort_rows
+)
+
+
+"""
+VDS CHUNKING
+
+VizQL Data Service refuses queries whose response would be too large. Instead of asking the query writer to
+aggregate further, `query_vds_chunked` splits such queries and runs the chunks concurrently:
+
+1. by member sets of a dimension of the query, listed with a small VDS query, which is exact for every function
+   since each chunk returns different groups
+2. by date range when the query has a QUANTITATIVE_DATE range filter and only SUM, COUNT, MIN or MAX measures,
+   chunk results are re-aggregated into the query grain
+
+Chunks still too large are split again up to `MAX_SPLIT_DEPTH` times. Rows are merged as chunks complete and
+collection stops at `VDS_MAX_ROWS`, responses cut at the cap are flagged as truncated. Sorted queries collect every
+chunk before sorting and cutting so a truncated result is still the top of the full result, truncated results of
+unsorted queries are flagged as unordered.
+"""
+
+logger = logging.getLogger(__name__)
+
+# rows returned to the agent at most, larger results are truncated
+VDS_MAX_ROWS = int(os.environ.get("VDS_MAX_ROWS", 10_000))
+
+# chunks per split and concurrent chunk queries
+MAX_CHUNKS = 8
+CHUNK_WORKERS = 4
+
+# a chunk still too large is split again, at most this many times
+MAX_SPLIT_DEPTH = 2
+
+
+def _is_measure_filter(query_filter: Dict[str, Any]) -> bool:
+    field = query_filter.get("field", {})
+    return bool(field.get("function") or field.get("calculation"))
+
+
+def _is_sorted(query: Dict[str, Any]) -> bool:
+    return any(field.get("sortDirection") or field.get("sortPriority") for field in query["fields"])
+
+
+def truncation_note(response: Dict[str, Any], result: str = "the result") -> str:
+    """
+    Tells the agent that a response returned by `query_vds_chunked` is missing rows, empty when it is complete.
+
+    Args:
+        response (Dict[str, Any]): the VDS response and its flags.
+        result (str): how the note refers to the response, such as "the result of query 2 of the plan".
+    """
+    rows = len(response.get("data") or [])
+    if response.get("unordered"):
+        return (
+            f"\n\nOnly {rows} rows of {result} are shown and they are in no particular order, they are not the top "
+            f"rows of {result}. Sort, aggregate or filter the query further for a complete answer."
+        )
+    if response.get("truncated"):
+        return (
+            f"\n\nOnly the first {rows} rows of {result} are shown, aggregate or filter the query further for a "
+            "complete answer."
+        )
+    return ""
+
+
+def _partition(values: List[Any], chunks: int) -> List[List[Any]]:
+    size = -(-len(values) // chunks)
+    return [values[start:start + size] for start in range(0, len(values), size)]
+
+
+def split_by_members(
+    query: Dict[str, Any],
+    api_key: str,
+    url: str,
+    datasource_luid: str,
+    chunks: int = MAX_CHUNKS
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Splits a query into queries on member sets of its first dimension having several members.
+
+    Returns:
+        Optional[List[Dict]]: the chunk queries, None when the query cannot be split by members.
+    """
+    filters = query.get("filters") or []
+    # TOP filters rank members across the whole query, chunks would each keep their own top members
+    if any(query_filter.get("filterType") == "TOP" for query_filter in filters):
+        return None
+
+    # members are listed with the dimension filters of the query so chunks only hold members with data
+    member_filters = [query_filter for query_filter in filters if not _is_measure_filter(query_filter)]
+    for field in query["fields"]:
+        if not is_dimension(field) or field.get("function"):
+            continue
+        try:
+            response = query_vds(
+                api_key=api_key,
+                datasource_luid=datasource_luid,
+                url=url,
+                query={"fields": [{"fieldCaption": field["fieldCaption"]}], "filters": member_filters}
+            )
+        except ResponseTooLargeError:
+            # too many members to list, chunks on this dimension would be too many as well
+            continue
+        members = [row.get(field["fieldCaption"]) for row in response.get("data") or []]
+        # null members cannot be selected with a SET filter, their rows would be lost
+        if len(members) < 2 or None in members:
+            continue
+
+        split = []
+        for part in _partition(members, min(chunks, len(members))):
+            chunk = copy.deepcopy(query)
+            chunk["filters"] = (chunk.get("filters") or []) + [{
+                "field": {"fieldCaption": field["fieldCaption"]},
+                "filterType": "SET",
+                "values": part,
+                "exclude": False
+            }]
+            split.append(chunk)
+        return split
+    return None
+
+
+def split_by_date_range(query: Dict[str, Any], chunks: int = MAX_CHUNKS) -> Optional[List[Dict[str, Any]]]:
+    """
+    Splits a query with a QUANTITATIVE_DATE range filter into consecutive date ranges.
+
+    Returns:
+        Optional[List[Dict]]: the chunk queries, None when the query has no such filter or its measures cannot be
+        re-aggregated across ranges.
+    """
+    filters = query.get("filters") or []
+    measures = [field for field in query["fields"] if not is_dimension(field)]
+    if any(field.get("calculation") or field.get("function") not in REAGGREGATE for field in measures):
+        return None
+    # measure and TOP filters are evaluated over the whole range, chunks would evaluate them per range
+    if any(_is_measure_filter(query_filter) or query_filter.get("filterType") == "TOP" for query_filter in filters):
+        return None
+
+    for index, query_filter in enumerate(filters):
+        if query_filter.get("filterType") != "QUANTITATIVE_DATE" or query_filter.get("quantitativeFilterType") != "RANGE":
+            continue
+        try:
+            start = date.fromisoformat(query_filter["minDate"])
+            end = date.fromisoformat(query_filter["maxDate"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        days = (end - start).days + 1
+        if days < 2:
+            continue
+
+        count = min(chunks, days)
+        split = []
+        for part in range(count):
+            part_start = start + timedelta(days=days * part // count)
+            part_end = start + timedelta(days=days * (part + 1) // count - 1)
+            chunk = copy.deepcopy(query)
+            chunk["filters"][index]["minDate"] = part_start.isoformat()
+            chunk["filters"][index]["maxDate"] = part_end.isoformat()
+            split.append(chunk)
+        return split
+    return None
+
+
+def reaggregate_rows(rows: List[Dict[str, Any]], query: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Combines rows of date range chunks sharing the same dimension values into the grain of the query"""
+    dimensions = [field_column(field) for field in query["fields"] if is_dimension(field)]
+    measures = [(field_column(field), field["function"]) for field in query["fields"] if not is_dimension(field)]
+
+    groups: Dict[Tuple, List[Dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault(tuple(row.get(column) for column in dimensions), []).append(row)
+
+    combined = []
+    for key, members in groups.items():
+        row = dict(zip(dimensions, key))
+        for column, function in measures:
+            present = [member[column] for member in members if member.get(column) is not None]
+            row[column] = REAGGREGATE[function](present) if present else None
+        combined.append(row)
+    return combined
+
+
+def stream_vds_chunks(
+    queries: List[Dict[str, Any]],
+    api_key: str,
+    url: str,
+    datasource_luid: str,
+    max_rows: int,
+    depth: int
+) -> Iterator[Dict[str, Any]]:
+    """Runs chunk queries concurrently and yields their responses as they complete, pending chunks are cancelled
+    when the consumer stops early"""
+    executor = ThreadPoolExecutor(max_workers=min(CHUNK_WORKERS, len(queries)), thread_name_prefix="vds-chunk")
+    try:
+        # each chunk runs in a copy of the caller's context so telemetry is recorded under the tool call
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run,
+                query_vds_chunked, api_key, datasource_luid, url, chunk, max_rows, depth + 1
+            )
+            for chunk in queries
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def query_vds_chunked(
+    api_key: str,
+    datasource_luid: str,
+    url: str,
+    query: Dict[str, Any],
+    max_rows: Optional[int] = None,
+    depth: int = 0
+) -> Dict[str, Any]:
+    """
+    Same as `query_vds`, but queries refused for being too large are split into chunks run concurrently.
+
+    Args:
+        api_key (str): The API key for authentication.
+        datasource_luid (str): The unique identifier of the datasource.
+        url (str): The base URL for the API endpoints.
+        query (Dict[str, Any]): the VDS query.
+        max_rows (Optional[int]): rows returned at most, defaults to `VDS_MAX_ROWS`.
+        depth (int): number of splits that produced this query.
+
+    Returns:
+        Dict[str, Any]: the VDS response with its "data" rows, "truncated" is True when rows were cut at `max_rows`
+        and "unordered" is True when the query has no sort and the rows kept are an arbitrary subset.
+
+    Raises:
+        ResponseTooLargeError: when the query cannot be split further.
+    """
+    max_rows = max_rows or VDS_MAX_ROWS
+    try:
+        response = query_vds(api_key=api_key, datasource_luid=datasource_luid, url=url, query=query)
+    except ResponseTooLargeError:
+        if depth >= MAX_SPLIT_DEPTH:
+            raise
+        chunks, reaggregate = split_by_members(query, api_key, url, datasource_luid), False
+        if chunks is None:
+            chunks, reaggregate = split_by_date_range(query), True
+        if chunks is None:
+            raise
+        logger.info(f"VDS response too large, running the query in {len(chunks)} chunks")
+
+        rows, truncated = [], False
+        with closing(stream_vds_chunks(chunks, api_key, url, datasource_luid, max_rows, depth)) as responses:
+            for chunk in responses:
+                rows.extend(chunk.get("data") or [])
+                truncated = truncated or chunk.get("truncated", False)
+                # member chunks hold distinct groups so collection can stop at the cap, date ranges must all merge
+                # and sorted queries need every chunk to know which rows come first
+                if not reaggregate and not _is_sorted(query) and len(rows) >= max_rows:
+                    truncated = True
+                    break
+
+        if reaggregate:
+            rows = reaggregate_rows(rows, query)
+        response = {"data": sort_rows(rows, query["fields"]), "truncated": truncated}
+
+    data = response.get("data") if response else None
+    if isinstance(data, list) and len(data) > max_rows:
+        # rows are cut after the sort of the query so the rows kept are its first ones
+        if _is_sorted(query):
+            data = sort_rows(data, query["fields"])
+        response = {**response, "data": data[:max_rows], "truncated": True}
+    if response and response.get("truncated") and not _is_sorted(query):
+        response = {**response, "unordered": True}
+    return response
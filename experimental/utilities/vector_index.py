@@ -0,0 +1,464 @@
+import os
+import json
+import logging
+import shutil
+import argparse
+import tempfile
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from experimental.utilities.retrieval_cache import bump_index_version, index_version
+from experimental.utilities.similarity import matmul_top_k, normalize, top_k
+
+
+"""
+LOCAL VECTOR INDEX
+
+Serves a vector index in-process instead of querying Pinecone, which removes a network round trip from every
+catalog and metrics search and lets retrieval run offline. Indexes are loaded from snapshots exported from
+Pinecone, one directory per index:
+
+    manifest.json     dimension, metric, number of vectors and the text key of the source index
+    VERSION           bumped on every export, invalidates cached retrieval results and reloads local stores
+    vectors.npy       float32 matrix memory-mapped at load, pages are read from disk as searches touch them
+    documents.jsonl   id, text and metadata of each vector, in the order of the matrix rows
+    hnsw.bin          optional HNSW graph, used when `hnswlib` is installed, searches are exact otherwise
+
+Export a Pinecone index with:
+
+    python -m experimental.utilities.vector_index export superstore-metrics snapshots/superstore-metrics
+
+`LocalVectorStore` wraps an index as a LangChain vector store, `pinecone_retriever_tool` serves indexes from
+snapshots under VECTOR_SNAPSHOT_DIR when VECTOR_BACKEND=local.
+
+Exports are written to a sibling directory and swapped in, files memory-mapped by running processes are never
+rewritten in place. Stores loaded from a directory load the new snapshot on their next search after the swap.
+"""
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("cosine", "dotproduct", "euclidean")
+
+# HNSW graphs are only built for snapshots with more vectors, exact search is fast enough below
+HNSW_MIN_VECTORS = 50_000
+
+# vectors fetched per Pinecone request while exporting
+EXPORT_BATCH_SIZE = 100
+
+
+def _hnsw_space(metric: str) -> str:
+    return {"cosine": "cosine", "dotproduct": "ip", "euclidean": "l2"}[metric]
+
+
+class LocalVectorIndex:
+    """
+    Vectors and documents of one index, searched exactly with a matrix product or through an HNSW graph.
+
+    Args:
+        vectors (np.ndarray): float32 matrix with one row per document, normalized for the cosine metric.
+        documents (List[Dict]): id, text and metadata of each row.
+        metric (str): `cosine`, `dotproduct` or `euclidean`, scores follow Pinecone's conventions.
+        hnsw (Optional[Any]): `hnswlib.Index` over the same rows.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        documents: List[Dict[str, Any]],
+        metric: str = "cosine",
+        hnsw: Optional[Any] = None
+    ):
+        if metric not in METRICS:
+            raise ValueError(f"Unsupported metric '{metric}', expected one of {', '.join(METRICS)}")
+        if len(vectors) != len(documents):
+            raise ValueError(f"The index has {len(vectors)} vectors but {len(documents)} documents")
+        self.vectors = vectors
+        self.documents = documents
+        self.metric = metric
+        self.hnsw = hnsw
+        # hnswlib is not thread safe when the query batch size changes
+        self._hnsw_lock = threading.Lock()
+
+    @property
+    def dimension(self) -> int:
+        return self.vectors.shape[1]
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "LocalVectorIndex":
+        """
+        Loads a snapshot directory written by `write_snapshot`.
+
+        Args:
+            path (str): the snapshot directory.
+            mmap (bool): memory-map the vectors instead of reading them into memory.
+
+        Returns:
+            LocalVectorIndex: the index, with its HNSW graph when the snapshot has one and hnswlib is installed.
+        """
+        with open(os.path.join(path, "manifest.json")) as file:
+            manifest = json.load(file)
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r" if mmap else None)
+        documents = read_documents(path)
+
+        hnsw = None
+        hnsw_path = os.path.join(path, "hnsw.bin")
+        if os.path.exists(hnsw_path):
+            try:
+                import hnswlib
+
+                hnsw = hnswlib.Index(space=_hnsw_space(manifest["metric"]), dim=manifest["dimension"])
+                hnsw.load_index(hnsw_path, max_elements=len(documents))
+                hnsw.set_ef(max(64, manifest.get("ef", 64)))
+            except ImportError:
+                logger.info(f"hnswlib is not installed, searching {path} exactly")
+
+        index = cls(vectors, documents, metric=manifest["metric"], hnsw=hnsw)
+        logger.info(f"Loaded {len(index)} vectors of dimension {index.dimension} from {path}")
+        return index
+
+    def search(self, vector: Sequence[float], k: int = 4) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Returns the `k` documents closest to a vector with their scores, best first. Scores are the cosine
+        similarity, the dot product or the squared euclidean distance depending on the metric.
+        """
+        query = np.asarray(vector, dtype=np.float32)
+        if query.shape != (self.dimension,):
+            raise ValueError(
+                f"Query vector has dimension {query.shape[-1]} but the index has dimension {self.dimension}, "
+                "the snapshot was built with a different embedding model"
+            )
+        k = min(k, len(self))
+        if k <= 0:
+            return []
+        if self.metric == "cosine":
+            query = normalize(query)
+
+        if self.hnsw is not None:
+            with self._hnsw_lock:
+                labels, distances = self.hnsw.knn_query(query, k=k)
+            rows, distances = labels[0], distances[0]
+            # hnswlib returns distances, converted back to Pinecone scores
+            scores = distances if self.metric == "euclidean" else 1.0 - distances
+        elif self.metric == "euclidean":
+            rows, scores = top_k(((self.vectors - query) ** 2).sum(axis=1), k, largest=False)
+        else:
+            # rows of cosine snapshots are normalized, their dot products are cosine similarities
+            rows, scores = matmul_top_k(self.vectors, query[np.newaxis], k)
+            rows, scores = rows[0], scores[0]
+
+        return [(self.documents[row], float(score)) for row, score in zip(rows, scores)]
+
+    def describe_index_stats(self) -> Dict[str, Any]:
+        """Same keys as Pinecone's index stats"""
+        return {"dimension": self.dimension, "total_vector_count": len(self), "metric": self.metric}
+
+
+def write_snapshot(
+    path: str,
+    ids: Sequence[str],
+    vectors: Sequence[Sequence[float]],
+    texts: Sequence[str],
+    metadatas: Sequence[Dict[str, Any]],
+    metric: str = "cosine",
+    text_key: str = "text",
+    hnsw: Optional[bool] = None
+):
+    """
+    Writes vectors and their documents as a snapshot loadable by `LocalVectorIndex.load`.
+
+    Args:
+        path (str): the snapshot directory, replaced as a whole once the new snapshot is written.
+        ids (Sequence[str]): id of each vector.
+        vectors (Sequence[Sequence[float]]): the vectors.
+        texts (Sequence[str]): page content of each vector.
+        metadatas (Sequence[Dict]): metadata of each vector, without the text.
+        metric (str): similarity metric of the source index.
+        text_key (str): metadata key the text was read from, recorded in the manifest.
+        hnsw (Optional[bool]): build an HNSW graph, defaults to snapshots of at least `HNSW_MIN_VECTORS` vectors
+            when hnswlib is installed.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unsupported metric '{metric}', expected one of {', '.join(METRICS)}")
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim != 2:
+        raise ValueError("Vectors must all have the same dimension")
+    if metric == "cosine":
+        matrix = normalize(matrix)
+
+    name = os.path.basename(os.path.normpath(path))
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent, prefix=f".{name}.")
+    try:
+        os.chmod(staging, 0o755)
+        _write_snapshot_files(staging, ids, matrix, texts, metadatas, metric, text_key, hnsw)
+        # the version continues from the snapshot being replaced, retrieval results cached for it are not served
+        # anymore
+        if os.path.exists(os.path.join(path, "VERSION")):
+            shutil.copyfile(os.path.join(path, "VERSION"), os.path.join(staging, "VERSION"))
+        bump_index_version(name, directory=staging)
+        _swap_directory(staging, path)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def _write_snapshot_files(
+    path: str,
+    ids: Sequence[str],
+    matrix: np.ndarray,
+    texts: Sequence[str],
+    metadatas: Sequence[Dict[str, Any]],
+    metric: str,
+    text_key: str,
+    hnsw: Optional[bool]
+):
+    np.save(os.path.join(path, "vectors.npy"), matrix)
+    with open(os.path.join(path, "documents.jsonl"), "w") as file:
+        for vector_id, text, metadata in zip(ids, texts, metadatas):
+            file.write(json.dumps({"id": vector_id, "text": text, "metadata": metadata}) + "\n")
+
+    if hnsw is not False and (hnsw or len(matrix) >= HNSW_MIN_VECTORS):
+        try:
+            import hnswlib
+
+            graph = hnswlib.Index(space=_hnsw_space(metric), dim=matrix.shape[1])
+            graph.init_index(max_elements=len(matrix), ef_construction=200, M=16)
+            graph.add_items(matrix, np.arange(len(matrix)))
+            graph.save_index(os.path.join(path, "hnsw.bin"))
+        except ImportError:
+            if hnsw:
+                raise
+            logger.info("hnswlib is not installed, the snapshot will be searched exactly")
+
+    with open(os.path.join(path, "manifest.json"), "w") as file:
+        json.dump({
+            "dimension": int(matrix.shape[1]),
+            "metric": metric,
+            "count": len(matrix),
+            "text_key": text_key
+        }, file, indent=2)
+
+
+def _swap_directory(staging: str, path: str):
+    """
+    Moves a fully written snapshot to `path`. The previous directory is renamed aside before being removed, its
+    files stay readable by processes that memory-mapped them until they load the new snapshot.
+    """
+    path = os.path.normpath(path)
+    if not os.path.exists(path):
+        os.replace(staging, path)
+        return
+    retired = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(path)), prefix=f".{os.path.basename(path)}.old.")
+    os.replace(path, retired)
+    os.replace(staging, path)
+    shutil.rmtree(retired, ignore_errors=True)
+
+
+def read_documents(path: str) -> List[Dict[str, Any]]:
+    """Documents of a snapshot directory, in the order of its vectors"""
+    with open(os.path.join(path, "documents.jsonl")) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def iter_pinecone_vectors(
+    index_name: str,
+    text_key: str = "text",
+    namespace: Optional[str] = None
+) -> Iterator[Tuple[str, List[float], str, Dict[str, Any]]]:
+    """Yields the id, values, text and remaining metadata of every vector of a Pinecone serverless index"""
+    from experimental.tools.external.retrievers import pinecone_index_handle
+
+    index = pinecone_index_handle(index_name)
+    for page in index.list(namespace=namespace or ""):
+        for start in range(0, len(page), EXPORT_BATCH_SIZE):
+            fetched = index.fetch(ids=page[start:start + EXPORT_BATCH_SIZE], namespace=namespace or "")
+            for vector_id, vector in fetched.vectors.items():
+                metadata = dict(vector.metadata or {})
+                yield vector_id, vector.values, str(metadata.pop(text_key, "")), metadata
+
+
+def export_pinecone_index(
+    index_name: str,
+    path: str,
+    text_key: str = "text",
+    namespace: Optional[str] = None
+) -> int:
+    """
+    Exports every vector of a Pinecone serverless index to a snapshot directory.
+
+    Args:
+        index_name (str): the Pinecone index.
+        path (str): the snapshot directory.
+        text_key (str): metadata holding the page content, as passed to `pinecone_retriever_tool`.
+        namespace (Optional[str]): the namespace to export, the default namespace when None.
+
+    Returns:
+        int: the number of vectors exported.
+    """
+    from experimental.tools.external.retrievers import pinecone_client
+
+    metric = pinecone_client().describe_index(index_name).metric
+    ids, vectors, texts, metadatas = [], [], [], []
+    for vector_id, values, text, metadata in iter_pinecone_vectors(index_name, text_key, namespace):
+        ids.append(vector_id)
+        vectors.append(values)
+        texts.append(text)
+        metadatas.append(metadata)
+
+    write_snapshot(path, ids, vectors, texts, metadatas, metric=metric, text_key=text_key)
+    return len(ids)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Read-only LangChain vector store searching a `LocalVectorIndex`.
+
+    Args:
+        index (LocalVectorIndex): the index.
+        embedding (Embeddings): embeds queries, must be the model the snapshot was built with.
+        path (Optional[str]): snapshot directory of the index, the index is loaded again when its VERSION changes.
+    """
+
+    def __init__(self, index: LocalVectorIndex, embedding: Embeddings, path: Optional[str] = None):
+        self._loaded = index
+        self._embedding = embedding
+        self._path = path
+        self._version = self._snapshot_version()
+        self._reload_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str, embedding: Embeddings) -> "LocalVectorStore":
+        # the version is read before the files so a snapshot swapped in meanwhile is loaded on the next search
+        version = index_version(os.path.basename(os.path.normpath(path)), directory=path)
+        store = cls(LocalVectorIndex.load(path), embedding, path=path)
+        store._version = version
+        return store
+
+    def _snapshot_version(self) -> Optional[int]:
+        if self._path is None:
+            return None
+        return index_version(os.path.basename(os.path.normpath(self._path)), directory=self._path)
+
+    @property
+    def _index(self) -> LocalVectorIndex:
+        """
+        The index, named like PineconeVectorStore's so callers reading index stats work with both stores. Loaded
+        again from the snapshot directory once a new export bumped its version.
+        """
+        self._reload()
+        return self._loaded
+
+    @property
+    def version(self) -> Optional[int]:
+        """Version of the snapshot served, which lags the snapshot directory while a reload fails"""
+        self._reload()
+        return self._version
+
+    def _reload(self):
+        version = self._snapshot_version()
+        if version != self._version:
+            with self._reload_lock:
+                if version != self._version:
+                    try:
+                        self._loaded = LocalVectorIndex.load(self._path)
+                        self._version = version
+                    except (OSError, ValueError) as e:
+                        # the directory is briefly missing while a snapshot is swapped in, retried on next search
+                        logger.warning(f"Reloading the snapshot at {self._path} failed, serving the previous one: {e}")
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError("Local vector stores are read-only, export a new snapshot to update them")
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any
+    ) -> "LocalVectorStore":
+        """Builds an in-memory store, `metric` and `ids` may be passed as keyword arguments"""
+        metadatas = metadatas or [{} for _ in texts]
+        ids = kwargs.get("ids") or [str(position) for position in range(len(texts))]
+        matrix = np.asarray(embedding.embed_documents(list(texts)), dtype=np.float32)
+        metric = kwargs.get("metric", "cosine")
+        if metric == "cosine":
+            matrix = normalize(matrix)
+        documents = [
+            {"id": vector_id, "text": text, "metadata": metadata}
+            for vector_id, text, metadata in zip(ids, texts, metadatas)
+        ]
+        return cls(LocalVectorIndex(matrix, documents, metric=metric), embedding)
+
+    def _to_documents(self, results: List[Tuple[Dict[str, Any], float]]) -> List[Tuple[Document, float]]:
+        return [
+            (Document(id=document["id"], page_content=document["text"], metadata=dict(document["metadata"])), score)
+            for document, score in results
+        ]
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self._to_documents(self._index.search(embedding, k=k))
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k=k)
+
+    async def asimilarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(await self._embedding.aembed_query(query), k=k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_by_vector_with_score(embedding, k=k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score(query, k=k)]
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in await self.asimilarity_search_with_score(query, k=k)]
+
+    def _select_relevance_score_fn(self):
+        if self._index.metric == "euclidean":
+            return self._euclidean_relevance_score_fn
+        # cosine similarities and dot products of normalized vectors are in [-1, 1]
+        return lambda score: (score + 1) / 2
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export Pinecone indexes as local vector index snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write every vector of a Pinecone index to a snapshot directory")
+    export.add_argument("index", help="name of the Pinecone index")
+    export.add_argument("path", help="snapshot directory")
+    export.add_argument("--text-key", default="text", help="metadata holding the page content")
+    export.add_argument("--namespace", default=None)
+    bump = commands.add_parser("bump", help="invalidate cached retrieval results after re-indexing a Pinecone index")
+    bump.add_argument("index", help="name of the Pinecone index")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    if args.command == "bump":
+        print(f"{args.index} is now at version {bump_index_version(args.index)}")
+        return
+    count = export_pinecone_index(args.index, args.path, text_key=args.text_key, namespace=args.namespace)
+    print(f"Exported {count} vectors of {args.index} to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
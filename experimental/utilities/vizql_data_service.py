@@ -1,5 +1,29 @@
-from typing import Dict, Any
-import requests
+import re
+from typing import Any, Callable, Dict, List, Sequence
+
+from experimental.utilities.utils import http_session, raise_for_session
+
+
+# date functions group rows like dimensions, every other function aggregates a measure
+DATE_FUNCTIONS = {
+    "YEAR", "QUARTER", "MONTH", "WEEK", "DAY",
+    "TRUNC_YEAR", "TRUNC_QUARTER", "TRUNC_MONTH", "TRUNC_WEEK", "TRUNC_DAY"
+}
+
+# functions whose values can be combined into coarser grains, and how
+REAGGREGATE: Dict[str, Callable[[List[Any]], Any]] = {
+    "SUM": sum,
+    "COUNT": sum,
+    "MIN": min,
+    "MAX": max,
+}
+
+# VDS rejects queries whose response would exceed its size limits, these errors can be retried in smaller chunks
+RESPONSE_TOO_LARGE = re.compile(r"too large|too many rows|exceed(s|ed)? .*(limit|size|rows)|size limit", re.IGNORECASE)
+
+
+class ResponseTooLargeError(RuntimeError):
+    """VizQL Data Service refused a query because its response is too large"""
 
 
 def query_vds(api_key: str, datasource_luid: str, url: str, query: Dict[str, Any]) -> Dict[str, Any]:
@@ -17,7 +41,7 @@ def query_vds(api_key: str, datasource_luid: str, url: str, query: Dict[str, Any
         'Content-Type': 'application/json'
     }
 
-    response = requests.post(full_url, headers=headers, json=payload)
+    response = http_session().post(full_url, headers=headers, json=payload)
 
     if response.status_code == 200:
         return response.json()
@@ -26,6 +50,9 @@ def query_vds(api_key: str, datasource_luid: str, url: str, query: Dict[str, Any
             f"Failed to query data source via Tableau VizQL Data Service. "
             f"Status code: {response.status_code}. Response: {response.text}"
         )
+        raise_for_session(response, error_message)
+        if response.status_code == 413 or RESPONSE_TOO_LARGE.search(response.text):
+            raise ResponseTooLargeError(error_message)
         raise RuntimeError(error_message)
 
 
@@ -43,7 +70,7 @@ def query_vds_metadata(api_key: str, datasource_luid: str, url: str) -> Dict[str
         'Content-Type': 'application/json'
     }
 
-    response = requests.post(full_url, headers=headers, json=payload)
+    response = http_session().post(full_url, headers=headers, json=payload)
 
     if response.status_code == 200:
         return response.json()
@@ -52,4 +79,36 @@ def query_vds_metadata(api_key: str, datasource_luid: str, url: str) -> Dict[str
             f"Failed to obtain data source metadata from VizQL Data Service. "
             f"Status code: {response.status_code}. Response: {response.text}"
         )
+        raise_for_session(response, error_message)
         raise RuntimeError(error_message)
+
+
+def field_column(field: Dict[str, Any]) -> str:
+    """Name of the column VDS returns for a field of a query"""
+    if field.get("fieldAlias"):
+        return field["fieldAlias"]
+    if field.get("function"):
+        return f"{field['function']}({field['fieldCaption']})"
+    return field["fieldCaption"]
+
+
+def is_dimension(field: Dict[str, Any]) -> bool:
+    """Whether a field groups rows: fields without a function, or truncated to a date part"""
+    return not field.get("calculation") and (not field.get("function") or field["function"] in DATE_FUNCTIONS)
+
+
+def sort_rows(rows: List[Dict[str, Any]], fields: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Sorts result rows locally as VDS would by the sortDirection and sortPriority of the query fields"""
+    # stable sorts from the lowest to the highest priority apply every sort field in order
+    sorted_fields = sorted(
+        (field for field in fields if field.get("sortDirection") or field.get("sortPriority")),
+        key=lambda field: field.get("sortPriority", 0),
+        reverse=True
+    )
+    for field in sorted_fields:
+        column = field_column(field)
+        descending = field.get("sortDirection") == "DESC"
+        present = [row for row in rows if row.get(column) is not None]
+        missing = [row for row in rows if row.get(column) is None]
+        rows = sorted(present, key=lambda row: row[column], reverse=descending) + missing
+    return rows
@@ -1,9 +1,12 @@
 import os
 import asyncio
+from uuid import uuid4
 
 from dotenv import load_dotenv
 from experimental.agents.experimental.agent import analytics_agent
 from experimental.agents.utils.agent_utils import stream_graph_updates, _visualize_graph
+from experimental.utilities.metrics import start_metrics_server
+from experimental.agents.utils.warmup import warm_up
 from langchain_tableau.utilities.auth import jwt_connected_app
 
 
@@ -80,6 +83,20 @@ async def main():
     # initialize one of the repo's custom agents
     agent = analytics_agent
 
+    # exposes Prometheus metrics for the agent at http://localhost:<METRICS_PORT>/metrics
+    if os.environ.get("METRICS_PORT"):
+        start_metrics_server(port=int(os.environ["METRICS_PORT"]))
+
+    # signs in, fetches metadata and builds model and retriever clients concurrently rather than on the first prompt
+    if os.environ.get("PREWARM") == "1":
+        await warm_up()
+
+    # with a checkpointer (CHECKPOINTER in .env) each prompt resumes this conversation instead of starting over
+    thread_id = str(uuid4())
+
+    # `tokens` streams the response as it is generated, `updates` prints whole messages
+    stream_mode = os.environ.get("STREAM_MODE", "updates")
+
     # outputs a mermaid diagram of the graph in png format
     _visualize_graph(agent)
 
@@ -106,7 +123,7 @@ async def main():
                 "agent_inputs": sample_inputs
             }
 
-            await stream_graph_updates(message, agent)
+            await stream_graph_updates(message, agent, stream_mode=stream_mode, thread_id=thread_id)
 
         except Exception as e:
             print(f"An error occurred: {e}")
@@ -119,7 +136,7 @@ async def main():
                 "agent_inputs": sample_inputs
             }
 
-            await stream_graph_updates(message, agent)
+            await stream_graph_updates(message, agent, stream_mode=stream_mode, thread_id=thread_id)
             break
 
 if __name__ == "__main__":
@@ -0,0 +1,84 @@
+from experimental.utilities import member_index
+from experimental.utilities.member_index import MemberIndexes, resolve_query_members, resolved_members_note
+
+
+DATA_MODEL = [{"fieldCaption": "City", "dataType": "STRING"}, {"fieldCaption": "Sales", "dataType": "REAL"}]
+
+# members each session can see under row-level security
+VISIBLE = {
+    "token-a": ["New York City", "Boston"],
+    "token-b": ["New York", "New York City", "Boston"],
+}
+
+
+def city_query(city):
+    return {
+        "fields": [{"fieldCaption": "City"}, {"fieldCaption": "Sales", "function": "SUM"}],
+        "filters": [{"field": {"fieldCaption": "City"}, "filterType": "SET", "values": [city]}],
+    }
+
+
+def test_member_indexes_are_kept_per_session(monkeypatch):
+    monkeypatch.setattr(
+        member_index, "_distinct_members", lambda api_key, url, datasource_luid, field: VISIBLE[api_key]
+    )
+    indexes = MemberIndexes()
+    indexes.build("https://tableau", "ds", "token-a", DATA_MODEL)
+    assert indexes.get("https://tableau", "token-b", "ds") is None
+
+    # a value only the second session can see is kept instead of resolved to a member of the first session
+    indexes.build("https://tableau", "ds", "token-b", DATA_MODEL)
+    query = city_query("New York")
+    assert resolve_query_members(query, indexes.get("https://tableau", "token-b", "ds")) is query
+    resolved = resolve_query_members(query, indexes.get("https://tableau", "token-a", "ds"))
+    assert resolved["filters"][0]["values"] == ["New York City"]
+
+
+def test_member_indexes_evict_least_recently_used_sessions(monkeypatch):
+    monkeypatch.setattr(member_index, "_distinct_members", lambda api_key, url, datasource_luid, field: ["Boston"])
+    indexes = MemberIndexes(max_indexes=2)
+    for token in ("token-a", "token-b"):
+        indexes.build("https://tableau", "ds", token, DATA_MODEL)
+    assert indexes.get("https://tableau", "token-a", "ds") is not None
+    indexes.build("https://tableau", "ds", "token-c", DATA_MODEL)
+    assert indexes.get("https://tableau", "token-b", "ds") is None
+    assert indexes.get("https://tableau", "token-a", "ds") is not None
+
+
+def test_replaced_filter_values_are_reported(monkeypatch):
+    monkeypatch.setattr(
+        member_index, "_distinct_members", lambda api_key, url, datasource_luid, field: VISIBLE[api_key]
+    )
+    indexes = MemberIndexes()
+    indexes.build("https://tableau", "ds", "token-a", DATA_MODEL)
+    members = indexes.get("https://tableau", "token-a", "ds")
+
+    queries = [city_query("New York"), city_query("Boston")]
+    resolved = [resolve_query_members(query, members) for query in queries]
+    note = resolved_members_note(queries, resolved)
+    assert "City 'New York' -> 'New York City'" in note
+    assert "Boston" not in note
+    assert resolved_members_note(queries[1:], resolved[1:]) == ""
+
+
+def test_headlessbi_data_notes_replaced_filter_values(monkeypatch):
+    from experimental.utilities import simple_datasource_qa
+
+    monkeypatch.setattr(
+        member_index, "_distinct_members", lambda api_key, url, datasource_luid, field: VISIBLE[api_key]
+    )
+    indexes = MemberIndexes()
+    indexes.build("https://tableau", "ds", "token-a", DATA_MODEL)
+    sent = []
+    monkeypatch.setattr(simple_datasource_qa, "MEMBER_INDEXES", indexes)
+    monkeypatch.setattr(
+        simple_datasource_qa,
+        "query_vds_cached",
+        lambda query, **kwargs: sent.append(query) or {"data": [{"City": "New York City", "SUM(Sales)": 10}]}
+    )
+
+    table = simple_datasource_qa.get_headlessbi_data(
+        payload=city_query("New York"), url="https://tableau", api_key="token-a", datasource_luid="ds"
+    )
+    assert sent[0]["filters"][0]["values"] == ["New York City"]
+    assert "City 'New York' -> 'New York City'" in table
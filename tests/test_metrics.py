@@ -0,0 +1,114 @@
+import pytest
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import tool
+
+from experimental.utilities import metrics
+from experimental.utilities.metrics import (
+    CACHE_REQUESTS,
+    CACHE_SAVED,
+    ERRORS,
+    IN_FLIGHT,
+    RETRIES,
+    TOOL_INVOCATIONS,
+    MetricsCallbackHandler,
+    cache_hit_ratio,
+    classify_error,
+    record_cache,
+    render_prometheus,
+    reset_metrics,
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    reset_metrics()
+    yield
+    reset_metrics()
+
+
+class RateLimitError(Exception):
+    pass
+
+
+def test_classify_error():
+    assert classify_error(TimeoutError()) == metrics.ERROR_TIMEOUT
+    assert classify_error(RuntimeError("Failed to authenticate to the Tableau site")) == metrics.ERROR_AUTH
+    vds_error = "Failed to query data source via Tableau VizQL Data Service. Status code: {}. Response: ..."
+    assert classify_error(RuntimeError(vds_error.format(503))) == metrics.ERROR_VDS_SERVER
+    assert classify_error(RuntimeError(vds_error.format(400))) == metrics.ERROR_VDS_VALIDATION
+    assert classify_error(RateLimitError("slow down")) == metrics.ERROR_LLM
+    assert classify_error(KeyError("field")) == metrics.ERROR_OTHER
+
+
+def test_record_cache_counts_lookups_and_saved_latency():
+    record_cache("embeddings", hit=True, saved_seconds=0.5, count=3)
+    record_cache("embeddings", hit=False)
+    record_cache("embeddings", hit=False, saved_seconds=2)
+    assert CACHE_REQUESTS.value(cache="embeddings", result="hit") == 3
+    assert CACHE_REQUESTS.value(cache="embeddings", result="miss") == 2
+    assert CACHE_SAVED.value(cache="embeddings") == 0.5
+    assert cache_hit_ratio("embeddings") == 0.6
+    assert cache_hit_ratio("unused") is None
+
+
+def test_render_prometheus():
+    record_cache("vds_results", hit=True, saved_seconds=1.25)
+    TOOL_INVOCATIONS.inc(agent="superstore", tool='say "hi"')
+    metrics.HISTOGRAMS.observe(metrics.TOOL_LATENCY, 12, agent="superstore", tool="search")
+
+    lines = render_prometheus().splitlines()
+    assert "# TYPE agent_cache_requests_total counter" in lines
+    assert "# TYPE agent_in_flight_requests gauge" in lines
+    assert 'agent_cache_requests_total{cache="vds_results",result="hit"} 1' in lines
+    assert 'agent_cache_saved_seconds_total{cache="vds_results"} 1.25' in lines
+    assert 'agent_tool_invocations_total{agent="superstore",tool="say \\"hi\\""} 1' in lines
+    assert "# TYPE agent_tool_latency_ms histogram" in lines
+    assert 'agent_tool_latency_ms_bucket{agent="superstore",tool="search",le="10"} 0' in lines
+    assert 'agent_tool_latency_ms_bucket{agent="superstore",tool="search",le="25"} 1' in lines
+    assert 'agent_tool_latency_ms_bucket{agent="superstore",tool="search",le="+Inf"} 1' in lines
+    assert 'agent_tool_latency_ms_count{agent="superstore",tool="search"} 1' in lines
+
+
+@tool
+def lookup(query: str, previous_call_error: str = "") -> str:
+    """Looks up a query, fails on queries starting with fail"""
+    if query.startswith("fail"):
+        raise TimeoutError("VDS did not answer")
+    return query
+
+
+def test_callback_handler_counts_tool_starts_errors_and_retries():
+    handler = MetricsCallbackHandler("superstore")
+    config = {"callbacks": [handler]}
+    lookup.invoke({"query": "sales"}, config=config)
+    with pytest.raises(TimeoutError):
+        lookup.invoke({"query": "fail"}, config=config)
+    lookup.invoke({"query": "sales", "previous_call_error": "empty result"}, config=config)
+
+    assert TOOL_INVOCATIONS.value(agent="superstore", tool="lookup") == 3
+    assert ERRORS.value(agent="superstore", tool="lookup", type=metrics.ERROR_TIMEOUT) == 1
+    assert RETRIES.value(agent="superstore", tool="lookup") == 1
+    latencies = [h for h in metrics.HISTOGRAMS.collect() if h["name"] == metrics.TOOL_LATENCY]
+    assert [histogram["count"] for histogram in latencies] == [3]
+
+
+def test_callback_handler_tracks_in_flight_requests():
+    handler = MetricsCallbackHandler("superstore")
+    observed = []
+
+    def run(value):
+        observed.append(IN_FLIGHT.value(agent="superstore"))
+        if value == "fail":
+            raise RuntimeError("Failed to authenticate")
+        return value
+
+    agent = RunnableLambda(run).with_config(callbacks=[handler])
+    agent.invoke("sales")
+    with pytest.raises(RuntimeError):
+        agent.invoke("fail")
+
+    assert observed == [1, 1]
+    assert IN_FLIGHT.value(agent="superstore") == 0
+    assert ERRORS.value(agent="superstore", tool="", type=metrics.ERROR_AUTH) == 1
+    requests = [h for h in metrics.HISTOGRAMS.collect() if h["name"] == metrics.REQUEST_LATENCY]
+    assert [histogram["count"] for histogram in requests] == [2]
@@ -0,0 +1,66 @@
+from experimental.utilities import query_planner
+
+
+REGION_SALES = {"fields": [{"fieldCaption": "Region"}, {"fieldCaption": "Sales", "function": "SUM"}]}
+REGION_PROFIT = {"fields": [{"fieldCaption": "Region"}, {"fieldCaption": "Profit", "function": "SUM"}]}
+
+
+def test_planned_data_notes_truncated_queries(monkeypatch):
+    from experimental.utilities import simple_datasource_qa
+
+    responses = {
+        "Sales": {"data": [{"Region": "East", "SUM(Sales)": 10}], "truncated": True, "unordered": True},
+        "Profit": {"data": [{"Region": "East", "SUM(Profit)": 2}]},
+    }
+    monkeypatch.setattr(
+        query_planner, "query_vds_cached", lambda query, **kwargs: responses[query["fields"][1]["fieldCaption"]]
+    )
+    table = simple_datasource_qa.get_planned_data(
+        payload=[REGION_SALES, REGION_PROFIT], url="https://tableau", api_key="token", datasource_luid="ds"
+    )
+    assert "Only 1 rows of the result of query 1 of the plan are shown and they are in no particular order" in table
+    assert "query 2 of the plan" not in table
+
+
+def test_join_results_combines_totals_without_dimensions_into_one_row():
+    this_year = {"fields": [{"fieldCaption": "Sales", "function": "SUM", "fieldAlias": "Sales 2024"}]}
+    last_year = {"fields": [{"fieldCaption": "Sales", "function": "SUM", "fieldAlias": "Sales 2023"}]}
+    rows = query_planner.join_results([this_year, last_year], [[{"Sales 2024": 120}], [{"Sales 2023": 100}]])
+    assert rows == [{"Sales 2024": 120, "Sales 2023": 100}]
+
+
+def test_join_results_repeats_coarser_results_on_matching_rows():
+    by_region_category = {
+        "fields": [{"fieldCaption": "Region"}, {"fieldCaption": "Category"}, *REGION_SALES["fields"][1:]]
+    }
+    rows = query_planner.join_results([by_region_category, REGION_PROFIT], [
+        [
+            {"Region": "East", "Category": "Furniture", "SUM(Sales)": 100},
+            {"Region": "East", "Category": "Technology", "SUM(Sales)": 300},
+            {"Region": "West", "Category": "Furniture", "SUM(Sales)": 200},
+        ],
+        [{"Region": "East", "SUM(Profit)": 60}, {"Region": "South", "SUM(Profit)": 12}],
+    ])
+    assert rows == [
+        {"Region": "East", "Category": "Furniture", "SUM(Sales)": 100, "SUM(Profit)": 60},
+        {"Region": "East", "Category": "Technology", "SUM(Sales)": 300, "SUM(Profit)": 60},
+        {"Region": "West", "Category": "Furniture", "SUM(Sales)": 200, "SUM(Profit)": None},
+        {"Region": "South", "Category": None, "SUM(Sales)": None, "SUM(Profit)": 12},
+    ]
+
+
+def test_join_results_renames_conflicting_measures_and_appends_unrelated_results():
+    by_segment = {"fields": [{"fieldCaption": "Segment"}, REGION_SALES["fields"][1]]}
+    rows = query_planner.join_results([REGION_SALES, by_segment], [
+        [{"Region": "East", "SUM(Sales)": 400}],
+        [{"Segment": "Consumer", "SUM(Sales)": 250}],
+    ])
+    assert rows == [
+        {"Region": "East", "SUM(Sales)": 400, "Segment": None, "SUM(Sales) (query 2)": None},
+        {"Region": None, "SUM(Sales)": None, "Segment": "Consumer", "SUM(Sales) (query 2)": 250},
+    ]
+
+
+def test_join_results_skips_empty_results():
+    rows = query_planner.join_results([REGION_SALES, REGION_PROFIT], [[{"Region": "East", "SUM(Sales)": 400}], []])
+    assert rows == [{"Region": "East", "SUM(Sales)": 400}]
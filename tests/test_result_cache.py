@@ -0,0 +1,126 @@
+from experimental.utilities.result_cache import CachedResult, ResultCache, derive
+
+
+REGION = {"fieldCaption": "Region"}
+CATEGORY = {"fieldCaption": "Category"}
+SALES = {"fieldCaption": "Sales", "function": "SUM"}
+PROFIT = {"fieldCaption": "Profit", "function": "SUM"}
+DISCOUNT = {"fieldCaption": "Discount", "function": "AVG"}
+
+ROWS = [
+    {"Region": "East", "Category": "Furniture", "SUM(Sales)": 100, "SUM(Profit)": 10, "AVG(Discount)": 0.1},
+    {"Region": "East", "Category": "Technology", "SUM(Sales)": 300, "SUM(Profit)": 50, "AVG(Discount)": 0.2},
+    {"Region": "West", "Category": "Furniture", "SUM(Sales)": 200, "SUM(Profit)": -20, "AVG(Discount)": 0.3},
+    {"Region": "West", "Category": "Technology", "SUM(Sales)": 50, "SUM(Profit)": 5, "AVG(Discount)": 0.0},
+    {"Region": "South", "Category": "Furniture", "SUM(Sales)": 120, "SUM(Profit)": 12, "AVG(Discount)": 0.1},
+]
+
+
+def cached(filters=None):
+    query = {"fields": [REGION, CATEGORY, SALES, PROFIT, DISCOUNT]}
+    if filters:
+        query["filters"] = filters
+    return CachedResult(query, ROWS)
+
+
+def furniture():
+    return {"field": {"fieldCaption": "Category"}, "filterType": "SET", "values": ["Furniture"], "exclude": False}
+
+
+def top_regions(count):
+    return {
+        "field": {"fieldCaption": "Region"},
+        "filterType": "TOP",
+        "howMany": count,
+        "fieldToMeasure": {"fieldCaption": "Sales", "function": "SUM"},
+        "direction": "TOP",
+    }
+
+
+def min_sales(low):
+    return {
+        "field": {"fieldCaption": "Sales", "function": "SUM"},
+        "filterType": "QUANTITATIVE_NUMERICAL",
+        "quantitativeFilterType": "MIN",
+        "min": low,
+    }
+
+
+def test_coarser_grain_reaggregates_and_sorts():
+    rows = derive(cached(), {"fields": [REGION, {**SALES, "sortDirection": "DESC", "sortPriority": 1}]})
+    assert rows == [
+        {"Region": "East", "SUM(Sales)": 400},
+        {"Region": "West", "SUM(Sales)": 250},
+        {"Region": "South", "SUM(Sales)": 120},
+    ]
+
+
+def test_dimension_filter_is_applied_locally():
+    rows = derive(cached(), {"fields": [REGION, CATEGORY, SALES], "filters": [furniture()]})
+    assert [row["Region"] for row in rows] == ["East", "West", "South"]
+    assert all(row["Category"] == "Furniture" for row in rows)
+
+
+def test_top_filter_ranks_members_over_the_whole_result():
+    rows = derive(cached(), {"fields": [REGION, CATEGORY, SALES], "filters": [top_regions(2)]})
+    assert {row["Region"] for row in rows} == {"East", "West"}
+    assert len(rows) == 4
+
+
+def test_measure_filter_applies_after_aggregation():
+    # West Technology alone is under 200, the West total is not
+    rows = derive(cached(), {"fields": [REGION, SALES], "filters": [min_sales(200)]})
+    assert sorted(row["Region"] for row in rows) == ["East", "West"]
+
+
+def test_unknown_dimension_is_not_derivable():
+    assert derive(cached(), {"fields": [REGION, {"fieldCaption": "Segment"}, SALES]}) is None
+
+
+def test_average_at_a_coarser_grain_is_not_derivable():
+    assert derive(cached(), {"fields": [REGION, DISCOUNT]}) is None
+    assert derive(cached(), {"fields": [REGION, CATEGORY, DISCOUNT]}) is not None
+
+
+def test_filters_of_the_cached_query_must_be_repeated():
+    result = cached(filters=[furniture()])
+    assert derive(result, {"fields": [REGION, CATEGORY, SALES]}) is None
+    assert derive(result, {"fields": [REGION, CATEGORY, SALES], "filters": [furniture()]}) is not None
+
+
+def test_top_filter_with_other_filters_is_not_derivable():
+    # Tableau computes TOP before dimension filters, applying both locally would rank the filtered members
+    assert derive(cached(), {"fields": [REGION, CATEGORY, SALES], "filters": [top_regions(2), furniture()]}) is None
+    assert derive(cached(filters=[furniture()]), {
+        "fields": [REGION, CATEGORY, SALES], "filters": [furniture(), top_regions(2)]
+    }) is None
+
+
+def test_cached_measure_filter_does_not_hold_at_a_coarser_grain():
+    assert derive(cached(filters=[min_sales(100)]), {"fields": [REGION, SALES], "filters": [min_sales(100)]}) is None
+
+
+def test_date_filters_are_not_derivable():
+    date_filter = {
+        "field": {"fieldCaption": "Order Date"},
+        "filterType": "QUANTITATIVE_DATE",
+        "quantitativeFilterType": "RANGE",
+        "minDate": "2024-01-01",
+        "maxDate": "2024-12-31",
+    }
+    assert derive(cached(), {"fields": [REGION, SALES], "filters": [date_filter]}) is None
+
+
+def test_lookup_prefers_the_result_of_the_same_query():
+    cache = ResultCache()
+    session = ("https://tableau", "token", "ds")
+    query = {"fields": [REGION, SALES]}
+    cache.store(session, query, [{"Region": "East", "SUM(Sales)": 401}])
+    # a more recent result the query is also derivable from
+    cache.store(session, {"fields": [REGION, CATEGORY, SALES, PROFIT, DISCOUNT]}, ROWS)
+    assert cache.lookup(session, query) == [{"Region": "East", "SUM(Sales)": 401}]
+    assert cache.lookup(session, {"fields": [CATEGORY, SALES]}) == [
+        {"Category": "Furniture", "SUM(Sales)": 420},
+        {"Category": "Technology", "SUM(Sales)": 350},
+    ]
+    assert cache.lookup(("https://tableau", "other-token", "ds"), query) is None
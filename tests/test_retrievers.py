@@ -0,0 +1,173 @@
+import asyncio
+import threading
+from typing import Any, List, Optional, Tuple
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.vectorstores import VectorStore
+
+from experimental.tools.external import retrievers
+from experimental.tools.external.retrievers import IndexRetriever, pinecone_retriever_tool, search_index
+from experimental.utilities import models
+from experimental.utilities.hybrid_search import BM25Index, HybridRetriever
+from experimental.utilities.lazy import Lazy
+from experimental.utilities.vector_index import write_snapshot
+
+
+DOCUMENTS = [
+    Document(id="sales", page_content="Sales by region and segment"),
+    Document(id="profit", page_content="Profit ratio by category"),
+    Document(id="orders", page_content="Order dates and ship modes"),
+]
+
+
+class ScoredOnlyStore(VectorStore):
+    """Like PineconeVectorStore, only implements the search by vector returning scores"""
+
+    def __init__(self):
+        self.embedding = DeterministicFakeEmbedding(size=8)
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Any, metadatas: Optional[List[dict]] = None, **kwargs: Any):
+        raise NotImplementedError
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k=k)
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return [(document, 1.0 - position / 10) for position, document in enumerate(DOCUMENTS[:k])]
+
+
+def test_search_index_uses_scored_search(monkeypatch):
+    monkeypatch.setenv("RETRIEVAL_CACHE", "0")
+    store = ScoredOnlyStore()
+    documents = search_index("stub-index", store.as_retriever(), "sales", [0.1] * 8, k=2)
+    assert [document.id for document in documents] == ["sales", "profit"]
+
+
+def test_hybrid_search_by_vector_uses_scored_search():
+    store = ScoredOnlyStore()
+    retriever = HybridRetriever(
+        vector_retriever=store.as_retriever(),
+        lexical_index=BM25Index(DOCUMENTS),
+        k=2
+    )
+    documents = retriever.search_by_vector("ship modes", [0.1] * 8)
+    assert len(documents) == 2
+    assert all(isinstance(document, Document) for document in documents)
+
+
+class StubPineconeIndex:
+    """Answers queries like a Pinecone index handle, without the network"""
+
+    def __init__(self):
+        self.queries = []
+
+    def query(self, vector, top_k, include_metadata, namespace=None, filter=None):
+        self.queries.append(top_k)
+        return {"matches": [
+            {"id": document.id, "score": 0.9, "metadata": {"text": document.page_content}}
+            for document in DOCUMENTS[:top_k]
+        ]}
+
+
+def test_pinecone_retriever_tool_searches_pinecone_vector_store(monkeypatch):
+    index = StubPineconeIndex()
+    monkeypatch.setenv("RETRIEVAL_CACHE", "0")
+    monkeypatch.setattr(models, "select_embeddings", lambda provider, model_name: DeterministicFakeEmbedding(size=8))
+    monkeypatch.setattr(retrievers, "pinecone_index_handle", lambda index_name: index)
+
+    tool = pinecone_retriever_tool(
+        name="stub_metrics",
+        description="stub",
+        pinecone_index="stub-pinecone-index",
+        model_provider="stub",
+        embedding_model="stub-embedding",
+        search_k=2,
+        backend="pinecone",
+        hybrid=False
+    )
+    result = tool.invoke({"query": "sales by region"})
+    assert "Sales by region and segment" in result and "Profit ratio by category" in result
+    assert index.queries == [2]
+
+
+def test_hybrid_pinecone_retriever_without_snapshot_searches_vectors_only(monkeypatch, tmp_path):
+    index = StubPineconeIndex()
+    index.list = lambda **kwargs: pytest.fail("the Pinecone index must not be listed within a tool call")
+    monkeypatch.setenv("RETRIEVAL_CACHE", "0")
+    monkeypatch.setenv("VECTOR_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(models, "select_embeddings", lambda provider, model_name: DeterministicFakeEmbedding(size=8))
+    monkeypatch.setattr(retrievers, "pinecone_index_handle", lambda index_name: index)
+
+    tool = pinecone_retriever_tool(
+        name="stub_hybrid",
+        description="stub",
+        pinecone_index="stub-hybrid-index",
+        model_provider="stub",
+        embedding_model="stub-embedding",
+        search_k=2,
+        backend="pinecone",
+        hybrid=True
+    )
+    assert "Sales by region and segment" in tool.invoke({"query": "sales"})
+    assert index.queries == [2]
+
+
+def export(path, texts):
+    write_snapshot(
+        path,
+        ids=[text.lower().replace(" ", "-") for text in texts],
+        vectors=DeterministicFakeEmbedding(size=8).embed_documents(texts),
+        texts=texts,
+        metadatas=[{} for _ in texts],
+        hnsw=False
+    )
+
+
+def test_hybrid_local_retriever_rebuilds_bm25_after_export(monkeypatch, tmp_path):
+    monkeypatch.setenv("RETRIEVAL_CACHE", "0")
+    monkeypatch.setenv("VECTOR_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(models, "select_embeddings", lambda provider, model_name: DeterministicFakeEmbedding(size=8))
+    path = str(tmp_path / "stub-local-index")
+    export(path, ["Sales by region", "Profit ratio by category"])
+
+    tool = pinecone_retriever_tool(
+        name="stub_local_hybrid",
+        description="stub",
+        pinecone_index="stub-local-index",
+        model_provider="stub",
+        embedding_model="stub-embedding",
+        search_k=2,
+        backend="local",
+        hybrid=True
+    )
+    assert "Profit ratio by category" in tool.invoke({"query": "profit"})
+
+    # documents of the previous snapshot are not returned by the BM25 search anymore
+    export(path, ["Order dates", "Ship modes"])
+    result = tool.invoke({"query": "profit"})
+    assert "Profit" not in result and "Sales" not in result
+    assert "Order dates" in result and "Ship modes" in result
+
+
+def test_index_retriever_builds_cold_indexes_off_the_event_loop(monkeypatch):
+    monkeypatch.setenv("RETRIEVAL_CACHE", "0")
+    monkeypatch.setattr(models, "select_embeddings", lambda provider, model_name: DeterministicFakeEmbedding(size=8))
+    built_in = []
+
+    def build():
+        built_in.append(threading.current_thread())
+        return ScoredOnlyStore().as_retriever()
+
+    retriever = IndexRetriever(
+        provider="stub",
+        model_name="stub-embedding",
+        sources={"metrics": ("stub-cold-index", Lazy("retriever:stub-cold-index", build), 2)}
+    )
+    documents = asyncio.run(retriever.ainvoke("sales"))
+    assert [document.id for document in documents] == ["sales", "profit"]
+    assert built_in and built_in[0] is not threading.main_thread()
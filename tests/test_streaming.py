@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from experimental.agents.utils.streaming import BufferedSink, StreamSink
+
+
+class FailingSink(StreamSink):
+    """Blocks on the first event until released, then fails like a client that disconnected"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.closed = False
+
+    async def send(self, event):
+        await self.release.wait()
+        raise ConnectionResetError("client disconnected")
+
+    async def close(self):
+        self.closed = True
+
+
+def test_buffered_sink_raises_when_drain_stops_during_send():
+    async def run():
+        sink = FailingSink()
+        buffered = BufferedSink(sink, max_pending=1)
+        await buffered.send({"type": "token", "content": "a"})
+        # the drain task takes the first event and blocks on the client, the second one fills the queue
+        await asyncio.sleep(0)
+        await buffered.send({"type": "token", "content": "b"})
+
+        asyncio.get_running_loop().call_soon(sink.release.set)
+        with pytest.raises(ConnectionResetError):
+            await asyncio.wait_for(buffered.send({"type": "token", "content": "c"}), timeout=1)
+        with pytest.raises(ConnectionResetError):
+            await buffered.close()
+        assert sink.closed
+
+    asyncio.run(run())
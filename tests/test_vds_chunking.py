@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+
+from experimental.utilities.vds_chunking import reaggregate_rows, split_by_date_range
+
+
+def query(measures, extra_filters=()):
+    return {
+        "fields": [{"fieldCaption": "Region"}] + measures,
+        "filters": [{
+            "field": {"fieldCaption": "Order Date"},
+            "filterType": "QUANTITATIVE_DATE",
+            "quantitativeFilterType": "RANGE",
+            "minDate": "2024-01-01",
+            "maxDate": "2024-12-31",
+        }, *extra_filters],
+    }
+
+
+SALES = {"fieldCaption": "Sales", "function": "SUM"}
+
+
+def test_date_ranges_cover_the_filter_without_gaps_or_overlaps():
+    chunks = split_by_date_range(query([SALES]), chunks=4)
+    ranges = [
+        (date.fromisoformat(chunk["filters"][0]["minDate"]), date.fromisoformat(chunk["filters"][0]["maxDate"]))
+        for chunk in chunks
+    ]
+    assert len(ranges) == 4
+    assert ranges[0][0] == date(2024, 1, 1) and ranges[-1][1] == date(2024, 12, 31)
+    assert all(end + timedelta(days=1) == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+
+
+def test_date_ranges_are_not_used_for_measures_that_cannot_be_reaggregated():
+    assert split_by_date_range(query([{"fieldCaption": "Discount", "function": "AVG"}])) is None
+    assert split_by_date_range(query([SALES, {"fieldCaption": "Sales", "calculation": "SUM([Sales]) / 2"}])) is None
+
+
+def test_date_ranges_are_not_used_with_top_or_measure_filters():
+    top = {"field": {"fieldCaption": "Region"}, "filterType": "TOP", "howMany": 3, "fieldToMeasure": SALES}
+    measure = {"field": SALES, "filterType": "QUANTITATIVE_NUMERICAL", "quantitativeFilterType": "MIN", "min": 0}
+    assert split_by_date_range(query([SALES], [top])) is None
+    assert split_by_date_range(query([SALES], [measure])) is None
+
+
+def test_a_single_day_is_not_split():
+    single_day = query([SALES])
+    single_day["filters"][0]["maxDate"] = "2024-01-01"
+    assert split_by_date_range(single_day) is None
+
+
+def test_reaggregate_rows_combines_chunks_into_the_query_grain():
+    measures = [
+        SALES,
+        {"fieldCaption": "Order ID", "function": "COUNT"},
+        {"fieldCaption": "Profit", "function": "MIN"},
+        {"fieldCaption": "Discount", "function": "MAX"},
+    ]
+    rows = reaggregate_rows([
+        {"Region": "East", "SUM(Sales)": 100, "COUNT(Order ID)": 3, "MIN(Profit)": -5, "MAX(Discount)": 0.2},
+        {"Region": "West", "SUM(Sales)": 50, "COUNT(Order ID)": 1, "MIN(Profit)": 2, "MAX(Discount)": None},
+        {"Region": "East", "SUM(Sales)": 20, "COUNT(Order ID)": 2, "MIN(Profit)": 1, "MAX(Discount)": 0.4},
+    ], query(measures))
+    assert rows == [
+        {"Region": "East", "SUM(Sales)": 120, "COUNT(Order ID)": 5, "MIN(Profit)": -5, "MAX(Discount)": 0.4},
+        {"Region": "West", "SUM(Sales)": 50, "COUNT(Order ID)": 1, "MIN(Profit)": 2, "MAX(Discount)": None},
+    ]
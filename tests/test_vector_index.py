@@ -0,0 +1,38 @@
+import os
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from experimental.utilities.retrieval_cache import index_version
+from experimental.utilities.vector_index import LocalVectorStore, write_snapshot
+
+
+def export(path, texts):
+    embedding = DeterministicFakeEmbedding(size=8)
+    write_snapshot(
+        path,
+        ids=[f"id{position}" for position in range(len(texts))],
+        vectors=embedding.embed_documents(texts),
+        texts=texts,
+        metadatas=[{} for _ in texts],
+        hnsw=False
+    )
+    return embedding
+
+
+def test_export_swaps_snapshot_and_store_reloads(tmp_path):
+    path = str(tmp_path / "superstore-metrics")
+    embedding = export(path, [f"metric {position}" for position in range(50)])
+    store = LocalVectorStore.load(path, embedding)
+    previous_vectors = store._index.vectors
+    previous_last = previous_vectors[-1].copy()
+    assert len(store.similarity_search("metric 3", k=50)) == 50
+
+    # a smaller export replaces the directory, the previous memory-mapped vectors stay readable
+    export(path, ["sales", "profit"])
+    assert (previous_vectors[-1] == previous_last).all()
+    assert index_version("superstore-metrics", directory=path) == 2
+    assert sorted(os.listdir(tmp_path)) == ["superstore-metrics"]
+
+    documents = store.similarity_search("sales", k=50)
+    assert sorted(document.page_content for document in documents) == ["profit", "sales"]
+    assert store.similarity_search("sales", k=1)[0].page_content == "sales"
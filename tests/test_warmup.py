@@ -0,0 +1,28 @@
+import asyncio
+
+from experimental.agents.utils import warmup
+from experimental.agents.utils.warmup import WarmupState, graph_modules, warm_up
+
+
+def test_graph_modules_resolves_config_against_project_root(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    assert all(module.startswith("experimental.") for module in graph_modules().values())
+
+
+def test_warm_up_is_ready_when_config_is_missing(tmp_path):
+    state = asyncio.run(warm_up(config_path=str(tmp_path / "missing.json"), state=WarmupState()))
+    assert state.ready.is_set() and state.finished is not None
+    assert "config" in state.errors
+
+
+def test_warm_up_is_ready_when_prewarm_raises(monkeypatch, tmp_path):
+    config = tmp_path / "langgraph.json"
+    config.write_text('{"graphs": {}}')
+
+    def prewarm(names, max_workers):
+        raise RuntimeError("registry failed")
+
+    monkeypatch.setattr(warmup, "prewarm", prewarm)
+    state = asyncio.run(warm_up(config_path=str(config), state=WarmupState()))
+    assert state.ready.is_set()
+    assert state.errors == {"registry": "registry failed"}